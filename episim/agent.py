@@ -0,0 +1,581 @@
+"""
+Agent-based counterpart of `SEIaIpIsRD`.
+
+Each agent is in one of the leaves of the ontology (susceptible, exposed,
+asymptomatic, presymptomatic, symptomatic, recovered, deceased), belongs to
+a household and wears a mask or not. The agents are stored as a structure
+of arrays (`Agents`) and each day is simulated by a few vectorized
+operations over them, so that millions of agents can be simulated:
+
+    model = AgentBasedModel.factory(state, SARSCoV2Th(), PopulationBehavior(),
+                                    p_mask=.75, mask_clustering=.8)
+    outcome = Outcome.from_model(model, 100)
+
+Contrary to the compartmental models:
+
+ - the infectious agents infect the members of their household with a
+   higher probability than the rest of the population, where the share of
+   the contacts made within the household saturates;
+ - masks are worn by individuals, possibly by whole households (clusters
+   of non-wearers, see `WearingMask`); a mask filters what its wearer emits
+   (`out_protection`) and, to a lesser extent, breathes (`in_protection`);
+ - the time spent in the exposed and infectious stages follows an Erlang
+   distribution (instead of an exponential one), through the number of
+   days each agent has spent in its stage.
+"""
+import datetime
+
+import numpy as np
+from scipy import stats
+
+from . import profiling
+from .data import State, ArrayHistory
+from .model import Model
+
+
+# Distribution of the sizes of the households (1, 2, ... persons)
+HOUSEHOLD_SIZES = (.35, .33, .14, .12, .06)
+
+
+class Agents(object):
+    """
+    Structure of arrays, one entry per agent.
+
+    Attributes
+    ----------
+    state: np.ndarray [n] of int8
+        Index of the agent's leaf in `AgentBasedModel.variable_names`
+    days: np.ndarray [n] of int16
+        Number of days spent in the current state
+    household: np.ndarray [n] of int32
+        Household of the agent (the members of a household are contiguous)
+    mask: np.ndarray [n] of bool
+        Whether the agent wears a mask
+    """
+    @classmethod
+    def generate(cls, counts, household_sizes=HOUSEHOLD_SIZES, p_mask=0.,
+                 mask_clustering=0., random_state=None):
+        """
+        counts: sequence of int
+            Number of agents in each state
+        household_sizes: sequence of float
+            Probability of the households of 1, 2, ... persons
+        p_mask: float
+            Probability of wearing a mask
+        mask_clustering: float
+            Probability that an agent follows the habit of its household
+            rather than its own (the proportion of wearers is unchanged)
+        """
+        if not isinstance(random_state, np.random.RandomState):
+            random_state = np.random.RandomState(random_state)
+        counts = np.asarray(counts, dtype=np.int64)
+        n = int(counts.sum())
+
+        # Households: draw sizes until everyone is housed
+        p = np.asarray(household_sizes, dtype=float)
+        p = p / p.sum()
+        mean_size = np.dot(p, np.arange(1, len(p) + 1))
+        values = np.arange(1, len(p) + 1)
+        sizes = random_state.choice(values, p=p,
+                                    size=int(n / mean_size * 1.1) + 10)
+        while sizes.sum() < n:
+            sizes = np.concatenate([sizes, random_state.choice(
+                values, p=p, size=len(sizes))])
+        n_households = int(np.searchsorted(np.cumsum(sizes), n)) + 1
+        household = np.repeat(np.arange(n_households, dtype=np.int32),
+                              sizes[:n_households])[:n]
+
+        # Masks: habit of the household or individual habit
+        household_mask = random_state.random_sample(n_households) < p_mask
+        own_mask = random_state.random_sample(n) < p_mask
+        clustered = random_state.random_sample(n) < mask_clustering
+        mask = np.where(clustered, household_mask[household], own_mask)
+
+        state = np.repeat(np.arange(len(counts), dtype=np.int8), counts)
+        random_state.shuffle(state)
+        return cls(state, np.zeros(n, dtype=np.int16), household, mask)
+
+    def __init__(self, state, days, household, mask):
+        self.state = state
+        self.days = days
+        self.household = household
+        self.mask = mask
+        self.household_size = np.bincount(household)
+
+    def __len__(self):
+        return len(self.state)
+
+    def __repr__(self):
+        return "{}(n_agents={}, n_households={})".format(
+            self.__class__.__name__, len(self), self.n_households)
+
+    @property
+    def n_households(self):
+        return len(self.household_size)
+
+    def counts(self, n_states):
+        """Number of agents in each state"""
+        return np.bincount(self.state, minlength=n_states)
+
+    def copy(self):
+        # The households and the masks do not change, they are shared
+        return self.__class__(self.state.copy(), self.days.copy(),
+                              self.household, self.mask)
+
+
+def erlang_hazards(mean, shape=4, max_days=None):
+    """
+    Daily probability of leaving a stage whose duration follows an Erlang
+    distribution of mean `mean` (days), given the number of days already
+    spent in it (the last entry is 1)
+    """
+    if max_days is None:
+        max_days = int(np.ceil(5 * mean)) + 1
+    days = np.arange(max_days + 1)
+    survival = stats.gamma.sf(days, shape, scale=float(mean) / shape)
+    hazards = np.ones(max_days)
+    alive = survival[:-1] > 0
+    hazards[alive] = 1. - survival[1:][alive] / survival[:-1][alive]
+    hazards[-1] = 1.
+    return hazards
+
+
+class IndividualModel(Model):
+    """
+    Base of the models simulating individuals (`individuals`, e.g.
+    `Agents`) rather than numbers of individuals, one day at a time. The
+    numbers of individuals per state (`variable_names`) and the daily
+    numbers of some transitions (`counters`) make the `State`s.
+
+    Subclasses implement `generate` (individuals drawn from a `State`),
+    `counts` and `step` (one day, in place), drawing from the
+    `np.random.RandomState` they are given: that of the model for `run`,
+    a generator of its own for each `simulate`.
+
+    A `Snapshot` of the model carries its individuals
+    (`snapshot.individuals`), so that a model restored from it goes on with
+    the same individuals. Without them, the individuals are drawn again from
+    the numbers of the state.
+    """
+    counters = ("n_infection",)
+
+    @classmethod
+    def factory(cls, initial_state, virus, population, resolution=1.,
+                backend=None, **kwargs):
+        """
+        As `Model.factory`; `kwargs` are the settings of the individuals
+        (see the class documentation)
+        """
+        t = cls.compute_parameters(virus, population)
+        model = cls(*t, resolution=resolution, **kwargs)
+        return model.set_backend(backend).start_from(initial_state)
+
+    def __init__(self, random_state=None):
+        # The individuals change state once a day
+        super().__init__(resolution=1.)
+        if not isinstance(random_state, np.random.RandomState):
+            random_state = np.random.RandomState(random_state)
+        self.random_state = random_state
+        self.simulator = None
+        self.individuals = None
+
+    def generate(self, state, random_state):
+        """Individuals whose numbers per state are those of `state`"""
+        raise NotImplementedError()
+
+    def counts(self, individuals):
+        """Number of individuals in each state (array [n_variables])"""
+        raise NotImplementedError()
+
+    def step(self, individuals, random_state):
+        """
+        Simulate one day of `individuals` (in place)
+
+        Return
+        ------
+        transitions: tuple of int
+            The number of transitions of the day, for each counter
+        """
+        raise NotImplementedError()
+
+    # ------------------------------------------------------------------ State
+    @property
+    def counter_names(self):
+        return list(self.counters)
+
+    def prepare_state(self, state):
+        state = super().prepare_state(state)
+        for name in self.counter_names:
+            if getattr(state, name) is None:
+                setattr(state, name, 0)
+        return state
+
+    def _split(self, name, children, amount):
+        """
+        Distribution of `amount` individuals of the entry `name` of the
+        ontology, not detailed in the state, among its `children`
+        """
+        return [amount] + [0] * (len(children) - 1)
+
+    def _state2variables(self, state):
+        """
+        Number of individuals in each state. The individuals of an entry of
+        the state which are not detailed in its sub-entries are distributed
+        by `_split`.
+        """
+        names = list(self.variable_names)
+        counts = np.zeros(len(names))
+        queryable = self.ontology(state)
+
+        def distribute(name, amount):
+            if name in names:
+                counts[names.index(name)] += amount
+                return
+            children = list(self.ontology.children_names(name))
+            if len(children) == 0:
+                return
+            known = [getattr(queryable, child) for child in children]
+            for child, k in zip(children, known):
+                if k > 0:
+                    distribute(child, k)
+            rest = amount - sum(known)
+            if rest > 0:
+                for child, part in zip(children,
+                                       self._split(name, children, rest)):
+                    if part > 0:
+                        distribute(child, part)
+
+        distribute("population", queryable.population)
+        return tuple(np.round(counts).astype(int))
+
+    def _variables2state(self, date, *values, previous=None):
+        counts = values[:len(self.variable_names)]
+        counters = values[len(self.variable_names):]
+        state = State(date)
+        for name, value in zip(self.variable_names, counts):
+            setattr(state, name, int(value))
+        for name, value in zip(self.counter_names, counters):
+            setattr(state, name, getattr(previous, name) + int(value))
+        return state
+
+    def set_state(self, state):
+        super().set_state(state)
+        with profiling.timer("IndividualModel.generate"):
+            self.individuals = self.generate(self.current_state,
+                                             self.random_state)
+        return self
+
+    def snapshot(self):
+        snapshot = super().snapshot()
+        snapshot.individuals = self.individuals.copy()
+        return snapshot
+
+    def restore(self, snapshot):
+        if snapshot.model_name != self.__class__.__name__:
+            raise ValueError("Cannot restore a snapshot of {} into {}"
+                             "".format(snapshot.model_name,
+                                       self.__class__.__name__))
+        individuals = getattr(snapshot, "individuals", None)
+        if individuals is None:
+            return self.set_state(snapshot.state())
+        self.current_state = self.prepare_state(snapshot.state())
+        self.individuals = individuals.copy()
+        return self
+
+    # ------------------------------------------------------------- Dynamics
+    def _days(self, individuals, n_steps, random_state):
+        """Yield the counts per state followed by the transitions of the day"""
+        for _ in range(n_steps):
+            with profiling.timer("IndividualModel.step"):
+                transitions = self.step(individuals, random_state)
+                counts = self.counts(individuals)
+            profiling.count("IndividualModel.individual_days",
+                            len(individuals))
+            yield tuple(counts) + tuple(transitions)
+
+    def simulate(self, state, n_steps=1, random_state=None):
+        """
+        As `Model.simulate`, on a copy of the individuals of the model if
+        `state` is its current state, on individuals drawn from `state`
+        otherwise. The draws come from `random_state` (int,
+        `np.random.RandomState` or None: a copy of the generator of the
+        model, which is left unchanged).
+        """
+        if random_state is None:
+            random_state = np.random.RandomState()
+            random_state.set_state(self.random_state.get_state())
+        elif not isinstance(random_state, np.random.RandomState):
+            random_state = np.random.RandomState(random_state)
+        if state is self.current_state:
+            individuals = self.individuals.copy()
+        else:
+            individuals = self.generate(state, random_state)
+        return self._simulate(individuals, state, n_steps, random_state)
+
+    def _simulate(self, individuals, state, n_steps, random_state):
+        date = state.date
+        plus_one = datetime.timedelta(days=1)
+        for values in self._days(individuals, n_steps, random_state):
+            date = date + plus_one
+            state = self._variables2state(date, *values, previous=state)
+            yield self.prepare_state(state)
+
+    def run(self, n_steps=1):
+        """Simulate from (and update) the current state and individuals"""
+        for state in self._simulate(self.individuals, self.current_state,
+                                    n_steps, self.random_state):
+            self.current_state = state
+            yield state
+
+    @profiling.timed("Model.run_array")
+    def run_array(self, n_steps, record_every=1, fields=None):
+        """See `Model.run_array`"""
+        if fields is None:
+            fields = self.fields
+        initial = self.current_state
+        n_states = len(self.variable_names)
+        counters = self.counter_names
+        record = np.empty((n_steps // record_every + 1,
+                           n_states + len(counters) + 1))
+        record[0, :n_states] = self.counts(self.individuals)
+        record[0, n_states:-1] = [getattr(initial, c) for c in counters]
+        cumulated = np.zeros(len(counters))
+        values = record[0, :n_states]
+        row = 1
+        for day, values in enumerate(self._days(self.individuals, n_steps,
+                                                self.random_state), 1):
+            cumulated += values[n_states:]
+            if day % record_every == 0:
+                record[row, :n_states] = values[:n_states]
+                record[row, n_states:-1] = record[0, n_states:-1] + cumulated
+                row += 1
+
+        history = ArrayHistory(record, list(self.variable_names) + counters
+                               + ["reproduction_number"], None)
+        record[:, -1] = self._compute_reproduction_number(
+            self._susceptible(lambda name: history.column(name,
+                                                          self.ontology)),
+            history.column("population", self.ontology)
+        )
+        if n_steps > 0:
+            date = initial.date + datetime.timedelta(days=n_steps)
+            state = self._variables2state(date, *values[:n_states],
+                                          *cumulated, previous=initial)
+            self.current_state = self.prepare_state(state)
+
+        columns = [history.fields.index(field) for field in fields]
+        return record[:, columns]
+
+
+class AgentBasedModel(IndividualModel):
+    """
+    Parameters (as `SEIaIpIsRD`)
+    ----------------------------
+    beta: float
+        Daily number of contacts times the probability of transmission
+    kappa, delta, gamma_a, gamma_s: float
+        Inverse of the exposed, presymptomatic, asymptomatic and symptomatic
+        durations
+    alpha: float
+        Probability of an infection being asymptomatic
+    epsilon: float
+        Relative infectiousness of the asymptomatic agents
+    mu_a, mu_s: float
+        Fatality rates of the asymptomatic and symptomatic agents
+    ksi: float
+        Daily rate of loss of immunity
+
+    Agents
+    ------
+    household_sizes: sequence of float
+        See `Agents.generate`
+    household_contacts: float
+        Fraction of the contacts made within the household
+    p_mask, mask_clustering: float
+        See `Agents.generate`
+    out_protection, in_protection: float
+        Fraction of the emission and of the inhalation filtered by a mask
+    shape: int
+        Shape of the Erlang distributions of the durations of the stages
+    random_state: int, `np.random.RandomState` or None
+        Seed of the random generator
+
+    The agents are `individuals` (see `IndividualModel`).
+    """
+    variable_names = ("susceptible", "exposed", "asymptomatic",
+                      "presymptomatic", "symptomatic", "recovered",
+                      "deceased")
+    counters = ("n_infection", "n_symptomatic", "n_death")
+
+    @classmethod
+    def compute_parameters(cls, virus, population):
+        return (population.contact_frequency * virus.transmission_rate,
+                1. / virus.exposed_duration,
+                virus.asymptomatic_ratio,
+                virus.asymptomatic_infectiousness,
+                1. / virus.presymptomatic_duration,
+                1. / virus.infectious_duration,
+                1. / virus.symptomatic_duration,
+                virus.asymptomatic_fatality_rate,
+                virus.symptomatic_fatality_rate,
+                virus.immunity_drop_rate)
+
+    def __init__(self, beta, kappa, alpha, epsilon, delta, gamma_a, gamma_s,
+                 mu_a, mu_s, ksi, resolution=1.,
+                 household_sizes=HOUSEHOLD_SIZES, household_contacts=.3,
+                 p_mask=0., mask_clustering=0., out_protection=.8,
+                 in_protection=.3, shape=4, random_state=None):
+        super().__init__(random_state)
+        self.beta = beta
+        self.kappa = kappa
+        self.alpha = alpha
+        self.epsilon = epsilon
+        self.delta = delta
+        self.gamma_a = gamma_a
+        self.gamma_s = gamma_s
+        self.mu_a = mu_a
+        self.mu_s = mu_s
+        self.ksi = ksi
+        self.household_sizes = tuple(household_sizes)
+        self.household_contacts = household_contacts
+        self.p_mask = p_mask
+        self.mask_clustering = mask_clustering
+        self.out_protection = out_protection
+        self.in_protection = in_protection
+        self.shape = shape
+        self._tables()
+
+    def __repr__(self):
+        return "{}(beta={}, kappa={}, alpha={}, epsilon={}, delta={}, " \
+               "gamma_a={}, gamma_s={}, mu_a={}, mu_s={}, ksi={}, " \
+               "household_contacts={}, p_mask={}, mask_clustering={})" \
+               "".format(self.__class__.__name__, repr(self.beta),
+                         repr(self.kappa), repr(self.alpha),
+                         repr(self.epsilon), repr(self.delta),
+                         repr(self.gamma_a), repr(self.gamma_s),
+                         repr(self.mu_a), repr(self.mu_s), repr(self.ksi),
+                         repr(self.household_contacts), repr(self.p_mask),
+                         repr(self.mask_clustering))
+
+    def __str__(self):
+        return "{}(beta={:.2e}, household_contacts={:.2f}, p_mask={:.2f}, " \
+               "mask_clustering={:.2f})".format(self.__class__.__name__,
+                                                self.beta,
+                                                self.household_contacts,
+                                                self.p_mask,
+                                                self.mask_clustering)
+
+    def _tables(self):
+        """Per-state lookup tables of the daily transitions"""
+        S, E, Ia, Ip, Is, R, D = range(len(self.variable_names))
+        n = len(self.variable_names)
+        self.infectiousness = np.zeros(n)
+        self.infectiousness[[Ia, Ip, Is]] = self.epsilon, 1., 1.
+
+        # Hazard of leaving the state given the days spent in it
+        hazards = {
+            E: erlang_hazards(1. / self.kappa, self.shape),
+            Ia: erlang_hazards(1. / self.gamma_a, self.shape),
+            Ip: erlang_hazards(1. / self.delta, self.shape),
+            Is: erlang_hazards(1. / self.gamma_s, self.shape),
+            R: np.full(1, 1. - np.exp(-self.ksi)),
+        }
+        self.max_days = max(len(h) for h in hazards.values())
+        self.hazards = np.zeros((n, self.max_days))
+        for state, h in hazards.items():
+            self.hazards[state, :len(h)] = h
+            self.hazards[state, len(h):] = h[-1]
+        self.progressing = self.hazards.max(axis=1) > 0
+
+        # When leaving: `alternative` with probability `p_alternative`,
+        # `destination` otherwise
+        self.destination = np.arange(n, dtype=np.int8)
+        self.alternative = np.arange(n, dtype=np.int8)
+        self.p_alternative = np.zeros(n)
+        self.destination[[E, Ia, Ip, Is, R]] = Ip, R, Is, R, S
+        self.alternative[[E, Ia, Is]] = Ia, D, D
+        self.p_alternative[[E, Ia, Is]] = self.alpha, self.mu_a, self.mu_s
+
+    # ------------------------------------------------------------------ State
+    @property
+    def agents(self):
+        return self.individuals
+
+    def _compute_reproduction_number(self, n_susceptible, n_total):
+        # Of the homogeneous mixing with the same rates
+        R0 = self.beta * (self.alpha * self.epsilon / self.gamma_a +
+                          (1 - self.alpha) * (1 / self.delta +
+                                              1 / self.gamma_s))
+        return R0 * n_susceptible / n_total
+
+    def _split(self, name, children, amount):
+        if name == "infectious":
+            # Infectious agents at the start of their course
+            return [self.alpha * amount if child == "asymptomatic" else
+                    (1 - self.alpha) * amount if child == "presymptomatic"
+                    else 0 for child in children]
+        return super()._split(name, children, amount)
+
+    def generate(self, state, random_state):
+        return Agents.generate(self._state2variables(state),
+                               self.household_sizes, self.p_mask,
+                               self.mask_clustering, random_state)
+
+    def counts(self, agents):
+        return agents.counts(len(self.variable_names))
+
+    # ------------------------------------------------------------- Dynamics
+    def step(self, agents, random_state):
+        """
+        Simulate one day of `agents` (in place)
+
+        Return
+        ------
+        n_infection, n_symptomatic, n_death: int
+            The transitions of the day
+        """
+        state, days, household = agents.state, agents.days, agents.household
+        S, E, Is, D = 0, 1, 4, 6
+
+        with profiling.timer("AgentBasedModel.infections"):
+            infectious = np.flatnonzero(self.infectiousness[state] > 0)
+            emitted = self.infectiousness[state[infectious]]
+            # Community: homogeneous mixing of what passes the masks
+            community = np.sum(np.where(agents.mask[infectious],
+                                        1. - self.out_protection, 1.)
+                               * emitted)
+            n_living = len(state) - np.count_nonzero(state == D)
+            # Household: shared among the other members
+            pressure = np.bincount(household[infectious], weights=emitted,
+                                   minlength=agents.n_households)
+            pressure /= np.maximum(agents.household_size - 1, 1)
+
+            susceptible = np.flatnonzero(state == S)
+            force = (1. - self.household_contacts) * self.beta * \
+                community / max(n_living, 1) * \
+                np.where(agents.mask[susceptible], 1. - self.in_protection, 1.)
+            force += self.household_contacts * self.beta * \
+                pressure[household[susceptible]]
+            draws = random_state.random_sample(len(susceptible))
+            infected = susceptible[draws < -np.expm1(-force)]
+
+        with profiling.timer("AgentBasedModel.progression"):
+            active = np.flatnonzero(self.progressing[state])
+            current = state[active]
+            elapsed = np.minimum(days[active], self.max_days - 1)
+            leaving = random_state.random_sample(len(active)) < \
+                self.hazards[current, elapsed]
+            moving = active[leaving]
+            origin = current[leaving]
+            destination = np.where(
+                random_state.random_sample(len(moving)) <
+                self.p_alternative[origin],
+                self.alternative[origin], self.destination[origin])
+            days[active[~leaving]] += 1
+
+        state[moving] = destination
+        days[moving] = 0
+        state[infected] = E
+        days[infected] = 0
+        return (len(infected), int(np.count_nonzero(destination == Is)),
+                int(np.count_nonzero(destination == D)))
@@ -0,0 +1,967 @@
+"""
+Reproducible throughput benchmarks.
+
+Each benchmark runs a fixed workload (no randomness, fixed parameters) a few
+times and reports the median throughput. Results are dumped as JSON and can
+be compared against a previous dump so as to gate upgrades on them:
+
+    python -m episim.bench -o bench.json
+    python -m episim.bench --baseline bench.json --tolerance .1
+
+The exit code is non-zero if any benchmark is slower than its baseline by
+more than the tolerance.
+"""
+import argparse
+import datetime
+import json
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+
+class BenchmarkResult(object):
+    """
+    Timings of a benchmark, or the `error` (message) it raised: a failed
+    benchmark has no timing and a null throughput
+    """
+    def __init__(self, name, unit, work, timings, error=None):
+        self.name = name
+        self.unit = unit
+        self.work = work
+        self.timings = list(timings)
+        self.error = error
+
+    @classmethod
+    def failure(cls, benchmark, exception):
+        return cls(benchmark.name, benchmark.unit, 0, (), repr(exception))
+
+    @property
+    def failed(self):
+        return self.error is not None
+
+    @property
+    def median_time(self):
+        if len(self.timings) == 0:
+            return float("nan")
+        return float(np.median(self.timings))
+
+    @property
+    def throughput(self):
+        if self.failed:
+            return 0.
+        t = self.median_time
+        if t <= 0:
+            return float("inf")
+        return self.work / t
+
+    def to_dict(self):
+        return {
+            "unit": self.unit,
+            "work": self.work,
+            "timings": self.timings,
+            "median_time": self.median_time,
+            "throughput": self.throughput,
+            "error": self.error,
+        }
+
+    @classmethod
+    def from_dict(cls, name, d):
+        return cls(name, d["unit"], d["work"], d["timings"], d.get("error"))
+
+    def __repr__(self):
+        return "{}({}, {}, {}, {}, error={})" \
+               "".format(self.__class__.__name__, repr(self.name),
+                         repr(self.unit), repr(self.work),
+                         repr(self.timings), repr(self.error))
+
+    def __str__(self):
+        if self.failed:
+            return "{:<40} failed: {}".format(self.name, self.error)
+        return "{:<40} {:>14.2f} {:<10} (median {:.4f}s)" \
+               "".format(self.name, self.throughput, self.unit,
+                         self.median_time)
+
+
+class Benchmark(object):
+    """
+    Base class of benchmarks. Subclasses prepare the workload in `setup`
+    (not timed) and execute it in `run` (timed), which returns the amount of
+    work done, expressed in `unit`.
+    """
+    unit = "op/s"
+
+    @property
+    def name(self):
+        return self.__class__.__name__
+
+    def setup(self):
+        pass
+
+    def run(self):
+        return 1
+
+    def teardown(self):
+        pass
+
+    def __call__(self, repeat=5):
+        timings = []
+        work = 0
+        for _ in range(repeat):
+            self.setup()
+            start = time.perf_counter()
+            work = self.run()
+            timings.append(time.perf_counter() - start)
+            self.teardown()
+        return BenchmarkResult(self.name, self.unit, work, timings)
+
+
+# ---------------------------------------------------------------------------- #
+#                                  Simulation                                  #
+# ---------------------------------------------------------------------------- #
+def _default_initial_state(population_size=int(7 * 1e6), n_infectious=20):
+    from .data import State
+    N = population_size
+    I = n_infectious
+    return State(datetime.date(2020, 1, 1), susceptible=N-I, infectious=I,
+                 n_infection=I)
+
+
+class EulerSimulatorBenchmark(Benchmark):
+    """Raw integration steps of the `SEIRS` dynamic, without any `State`"""
+    unit = "steps/s"
+
+    def __init__(self, n_days=100, resolution=0.1):
+        self.n_days = n_days
+        self.resolution = resolution
+
+    @property
+    def name(self):
+        return "EulerSimulator[res={}]".format(self.resolution)
+
+    def setup(self):
+        from .model import SEIRS, EulerSimulator
+        from .parameters import PopulationBehavior
+        from .virus import SARSCoV2Th
+        t = SEIRS.compute_parameters(SARSCoV2Th(), PopulationBehavior())
+        model = SEIRS(*t, resolution=self.resolution)
+        self.simulator = EulerSimulator(*iter(model.dynamic),
+                                        step_size=self.resolution)
+        self.x0 = model._state2variables(_default_initial_state())
+
+    def run(self):
+        for _ in self.simulator(*self.x0, dt=self.n_days):
+            pass
+        return self.n_days * int(1. / self.resolution)
+
+
+class ModelRunBenchmark(Benchmark):
+    """Days simulated per second through `Model.run`"""
+    unit = "days/s"
+
+    def __init__(self, model_cls, resolution, n_days=100,
+                 infectious_compartment="infectious", **factory_kwargs):
+        self.model_cls = model_cls
+        self.resolution = resolution
+        self.n_days = n_days
+        self.infectious_compartment = infectious_compartment
+        self.factory_kwargs = factory_kwargs
+
+    @property
+    def name(self):
+        options = "".join(", {}={}".format(k, v) for k, v in
+                          sorted(self.factory_kwargs.items()))
+        return "{}.run[res={}{}]".format(self.model_cls.__name__,
+                                         self.resolution, options)
+
+    def setup(self):
+        from .parameters import PopulationBehavior
+        from .virus import SARSCoV2Th
+        state = _default_initial_state()
+        if self.infectious_compartment != "infectious":
+            setattr(state, self.infectious_compartment, state.infectious)
+            state.infectious = None
+        self.model = self.model_cls.factory(state,
+                                            SARSCoV2Th(),
+                                            PopulationBehavior(),
+                                            self.resolution,
+                                            **self.factory_kwargs)
+
+    def run(self):
+        for _ in self.model.run(self.n_days):
+            pass
+        return self.n_days
+
+
+class RunArrayBenchmark(ModelRunBenchmark):
+    """Days simulated per second through `Model.run_array`"""
+    @property
+    def name(self):
+        return super().name.replace(".run[", ".run_array[", 1)
+
+    def run(self):
+        self.model.run_array(self.n_days)
+        return self.n_days
+
+
+class SteadyStateBenchmark(ModelRunBenchmark):
+    """Equilibria (and their stability) found per second"""
+    unit = "solves/s"
+
+    @property
+    def name(self):
+        return "{}.steady_state".format(self.model_cls.__name__)
+
+    def run(self):
+        n = 10
+        for _ in range(n):
+            self.model.steady_state()
+        return n
+
+
+class ParticleFilterBenchmark(Benchmark):
+    """Days assimilated per second by a `ParticleFilter` on `SEIRS`"""
+    unit = "days/s"
+
+    def __init__(self, n_particles=10000, n_days=30):
+        self.n_particles = n_particles
+        self.n_days = n_days
+
+    @property
+    def name(self):
+        return "ParticleFilter[{:d}]".format(self.n_particles)
+
+    def setup(self):
+        from .filtering import ParticleFilter
+        from .model import SEIRS
+        from .parameters import PopulationBehavior
+        from .virus import SARSCoV2Th
+        model = SEIRS.factory(_default_initial_state(), SARSCoV2Th(),
+                              PopulationBehavior())
+        self.filter = ParticleFilter(model, self.n_particles, random_state=0)
+
+    def run(self):
+        self.filter.filter([10] * self.n_days)
+        return self.n_days
+
+
+class EnsembleSamplerBenchmark(Benchmark):
+    """
+    Iterations per second of the `EnsembleSampler` on the posterior of the
+    reproduction number and the loss of immunity of `SEIRS`
+    """
+    unit = "it/s"
+
+    def __init__(self, n_walkers=64, n_days=100, n_iterations=10):
+        self.n_walkers = n_walkers
+        self.n_days = n_days
+        self.n_iterations = n_iterations
+
+    @property
+    def name(self):
+        return "EnsembleSampler[{:d}]".format(self.n_walkers)
+
+    def setup(self):
+        from .inference import CaseLikelihood, Posterior, Uniform, \
+            EnsembleSampler
+        from .model import SEIRS
+        from .parameters import PopulationBehavior
+        from .virus import SARSCoV2Th
+        model = SEIRS.factory(_default_initial_state(), SARSCoV2Th(),
+                              PopulationBehavior())
+        names = ("R_0", "immunity_drop_rate")
+        daily_cases = CaseLikelihood(model, np.zeros(self.n_days), names)\
+            .simulate([[3., .002]])[:, 0].round()
+        posterior = Posterior({"R_0": Uniform(1, 6),
+                               "immunity_drop_rate": Uniform(0, .01)},
+                              CaseLikelihood(model, daily_cases, names))
+        self.sampler = EnsembleSampler(
+            posterior, posterior.sample_prior(self.n_walkers, 0),
+            random_state=0)
+
+    def run(self):
+        self.sampler.run(self.n_iterations)
+        return self.n_iterations
+
+
+class AgentBasedModelBenchmark(Benchmark):
+    """Simulated days per second of an `AgentBasedModel`"""
+    unit = "days/s"
+
+    def __init__(self, n_agents=int(7 * 1e6), n_days=5):
+        self.n_agents = n_agents
+        self.n_days = n_days
+
+    @property
+    def name(self):
+        return "AgentBasedModel[{:.0e}]".format(self.n_agents)
+
+    def setup(self):
+        from .agent import AgentBasedModel
+        from .data import State
+        from .parameters import PopulationBehavior
+        from .virus import SARSCoV2Th
+        N = self.n_agents
+        I = N // 1000
+        state = State(datetime.date(2020, 1, 1), susceptible=N - I,
+                      presymptomatic=I, n_infection=I)
+        self.model = AgentBasedModel.factory(state, SARSCoV2Th(),
+                                             PopulationBehavior(), p_mask=.5,
+                                             mask_clustering=.5,
+                                             random_state=0)
+
+    def run(self):
+        self.model.run_array(self.n_days)
+        return self.n_days
+
+
+class NetworkSEIRSBenchmark(Benchmark):
+    """Simulated days per second of `NetworkSEIRS` on a small-world graph"""
+    unit = "days/s"
+
+    def __init__(self, n_nodes=int(1e6), k=20, n_days=10):
+        self.n_nodes = n_nodes
+        self.k = k
+        self.n_days = n_days
+
+    @property
+    def name(self):
+        return "NetworkSEIRS[{:.0e}x{:d}]".format(self.n_nodes, self.k)
+
+    def setup(self):
+        from .data import State
+        from .network import ContactGraph, NetworkSEIRS
+        from .parameters import PopulationBehavior
+        from .virus import SARSCoV2Th
+        N = self.n_nodes
+        I = N // 100
+        graph = ContactGraph.watts_strogatz(N, self.k, .1, random_state=0)
+        state = State(datetime.date(2020, 1, 1), susceptible=N - I,
+                      infectious=I, n_infection=I)
+        self.model = NetworkSEIRS.factory(state, SARSCoV2Th(),
+                                          PopulationBehavior(), graph=graph,
+                                          random_state=0)
+
+    def run(self):
+        self.model.run_array(self.n_days)
+        return self.n_days
+
+
+class RolloutComparisonBenchmark(Benchmark):
+    """
+    Vaccination rollouts compared per second by `compare_rollouts` (all of
+    them integrated in a single batch)
+    """
+    unit = "rollouts/s"
+
+    def __init__(self, n_rollouts=100, n_days=365, resolution=0.1):
+        self.n_rollouts = n_rollouts
+        self.n_days = n_days
+        self.resolution = resolution
+
+    @property
+    def name(self):
+        return "compare_rollouts[{:d}x{:d}]".format(self.n_rollouts,
+                                                   self.n_days)
+
+    def setup(self):
+        from .data import State
+        from .parameters import PopulationBehavior
+        from .vaccination import Stratum, Rollout, vaccination_model
+        from .virus import SARSCoV2Th
+        strata = [Stratum("young", .6, .0005), Stratum("adult", .25, .005),
+                  Stratum("old", .15, .05)]
+        N, I = int(7 * 1e6), 20
+        start = datetime.date(2020, 1, 1)
+        state = State(start, susceptible=N - I, infectious=I, n_infection=I)
+        self.model = vaccination_model(strata).factory(
+            state, SARSCoV2Th(), PopulationBehavior(), self.resolution)
+        priorities = [(), ("old", "adult"), ("young",), ("adult",)]
+        self.rollouts = [
+            Rollout([1000. * (i + 1)], priorities[i % len(priorities)],
+                    start + datetime.timedelta(days=i % 90))
+            for i in range(self.n_rollouts)
+        ]
+
+    def run(self):
+        from .vaccination import compare_rollouts
+        compare_rollouts(self.model, self.rollouts, self.n_days)
+        return self.n_rollouts
+
+
+class MultiStrainBenchmark(Benchmark):
+    """
+    Days simulated per second by `MultiStrainSEIRS` with `n_strains`
+    strains (the variants being seeded every ten days)
+    """
+    unit = "days/s"
+
+    def __init__(self, n_strains=2, resolution=0.1, n_days=365):
+        self.n_strains = n_strains
+        self.resolution = resolution
+        self.n_days = n_days
+
+    @property
+    def name(self):
+        return "MultiStrainSEIRS[{:d}].run_array[res={}]" \
+               "".format(self.n_strains, self.resolution)
+
+    def setup(self):
+        from .strain import MultiStrainSEIRS, Strain
+        from .parameters import PopulationBehavior
+        from .virus import SARSCoV2Th
+        state = _default_initial_state()
+        variants = [Strain(SARSCoV2Th(), "variant_{:d}".format(i),
+                           [(state.date + datetime.timedelta(days=10 * i),
+                             10)])
+                    for i in range(1, self.n_strains)]
+        self.model = MultiStrainSEIRS.factory(state, SARSCoV2Th(),
+                                              PopulationBehavior(),
+                                              self.resolution,
+                                              variants=variants,
+                                              cross_immunity=.5)
+        self.initial = self.model.snapshot()
+
+    def run(self):
+        self.model.restore(self.initial)
+        self.model.run_array(self.n_days)
+        return self.n_days
+
+
+class HealthcareLoadBenchmark(Benchmark):
+    """
+    Ensemble members per second turned into hospital and ICU loads by
+    `HealthcareLoad` (FFT convolutions of the daily infections)
+    """
+    unit = "members/s"
+
+    def __init__(self, n_members=1000, n_days=365):
+        self.n_members = n_members
+        self.n_days = n_days
+
+    @property
+    def name(self):
+        return "HealthcareLoad[{:d}x{:d}]".format(self.n_members,
+                                                 self.n_days)
+
+    def setup(self):
+        from .healthcare import HealthcareLoad
+        rs = np.random.RandomState(0)
+        self.healthcare = HealthcareLoad(beds=5000, icu_beds=600)
+        self.incidence = rs.gamma(2., 500., (self.n_members, self.n_days))
+
+    def run(self):
+        self.healthcare(self.incidence)
+        return self.n_members
+
+
+class ReportedCasesBenchmark(Benchmark):
+    """
+    Synthetic reported series per second drawn by `ReportedCases` (reporting
+    delay, weekday effects and negative binomial noise)
+    """
+    unit = "series/s"
+
+    def __init__(self, n_series=1000, n_days=365):
+        self.n_series = n_series
+        self.n_days = n_days
+
+    @property
+    def name(self):
+        return "ReportedCases.sample[{:d}x{:d}]".format(self.n_series,
+                                                       self.n_days)
+
+    def setup(self):
+        from .healthcare import Delay
+        from .observation import ReportedCases
+        self.random_state = np.random.RandomState(0)
+        self.reporting = ReportedCases(.2, Delay(7, 3),
+                                       (1.2, 1.1, 1, 1, 1, .8, .6), 10)
+        self.infections = self.random_state.gamma(
+            2., 500., (self.n_series, self.n_days))
+        self.start_date = datetime.date(2020, 1, 1)
+
+    def run(self):
+        self.reporting.sample(self.infections, self.start_date,
+                              random_state=self.random_state)
+        return self.n_series
+
+
+class RenewalBenchmark(Benchmark):
+    """
+    Days simulated per second by `RenewalModel` (the convolution with the
+    generation interval being computed by divide and conquer with FFTs)
+    """
+    unit = "days/s"
+
+    def __init__(self, n_days=10000):
+        self.n_days = n_days
+
+    @property
+    def name(self):
+        return "RenewalModel.run_array[{:d}]".format(self.n_days)
+
+    def setup(self):
+        from .renewal import RenewalModel
+        from .parameters import PopulationBehavior
+        from .virus import SARSCoV2Th
+        self.model = RenewalModel.factory(_default_initial_state(),
+                                          SARSCoV2Th(), PopulationBehavior())
+        self.initial = self.model.snapshot()
+
+    def run(self):
+        self.model.restore(self.initial)
+        self.model.run_array(self.n_days)
+        return self.n_days
+
+
+class RenewalEnsembleBenchmark(Benchmark):
+    """
+    Ensemble members per second simulated together by `renewal_ensemble`
+    """
+    unit = "members/s"
+
+    def __init__(self, n_members=1000, n_days=365):
+        self.n_members = n_members
+        self.n_days = n_days
+
+    @property
+    def name(self):
+        return "renewal_ensemble[{:d}x{:d}]".format(self.n_members,
+                                                   self.n_days)
+
+    def setup(self):
+        from .renewal import RenewalModel
+        from .parameters import PopulationBehavior
+        from .virus import SARSCoV2Th
+        self.model = RenewalModel.factory(_default_initial_state(),
+                                          SARSCoV2Th(), PopulationBehavior())
+        self.reproduction_numbers = np.linspace(.8, 4., self.n_members)
+
+    def run(self):
+        from .renewal import renewal_ensemble
+        renewal_ensemble(self.model, self.n_days, self.reproduction_numbers)
+        return self.n_members
+
+
+class ConfinementRunsBenchmark(Benchmark):
+    """
+    `Confinement` runs per second integrated together by `ConfinementRuns`
+    (the training runs of an `Emulator`)
+    """
+    unit = "runs/s"
+
+    def __init__(self, n_runs=1024, n_days=243):
+        self.n_runs = n_runs
+        self.n_days = n_days
+
+    @property
+    def name(self):
+        return "ConfinementRuns[{:d}x{:d}]".format(self.n_runs, self.n_days)
+
+    def setup(self):
+        from .emulator import ConfinementRuns, latin_hypercube
+        from .model import SEIRS
+        from .parameters import PopulationBehavior
+        from .virus import SARSCoV2Th
+        model = SEIRS.factory(_default_initial_state(), SARSCoV2Th(),
+                              PopulationBehavior(), 0.1)
+        self.runs = ConfinementRuns(model, self.n_days)
+        u = latin_hypercube(self.n_runs, 3, 0)
+        self.values = {"confinement_effect": .05 + .55 * u[:, 0],
+                       "n_days_before_confinement": 10 + 80 * u[:, 1],
+                       "n_days_confinement": 15 + 105 * u[:, 2]}
+
+    def run(self):
+        self.runs(self.values)
+        return self.n_runs
+
+
+class EmulatorQueryBenchmark(Benchmark):
+    """
+    Single queries per second answered by an `Emulator` of the confinement
+    (trained once, on `n_runs` runs)
+    """
+    unit = "query/s"
+
+    def __init__(self, n_queries=10000, n_runs=1024):
+        self.n_queries = n_queries
+        self.n_runs = n_runs
+
+    @property
+    def name(self):
+        return "Emulator.query[{:d}]".format(self.n_runs)
+
+    def setup(self):
+        from .emulator import ConfinementRuns, Emulator
+        from .model import SEIRS
+        from .parameters import PopulationBehavior
+        from .virus import SARSCoV2Th
+        if not hasattr(self, "emulator"):
+            model = SEIRS.factory(_default_initial_state(), SARSCoV2Th(),
+                                  PopulationBehavior(), 0.1)
+            bounds = {"confinement_effect": (.05, .6),
+                      "n_days_before_confinement": (10, 90),
+                      "n_days_confinement": (15, 120)}
+            self.emulator = Emulator.train(ConfinementRuns(model), bounds,
+                                           self.n_runs, random_state=0)
+
+    def run(self):
+        query = self.emulator.query
+        for _ in range(self.n_queries):
+            query("total", confinement_effect=.3,
+                  n_days_before_confinement=25, n_days_confinement=60)
+        return self.n_queries
+
+
+class BuiltModelBenchmark(Benchmark):
+    """
+    Days simulated per second by a model generated by `ModelBuilder`: an
+    infection followed by a chain of `n_compartments` - 1 stages
+    """
+    unit = "days/s"
+
+    def __init__(self, n_compartments=24, resolution=0.1, n_days=100):
+        self.n_compartments = n_compartments
+        self.resolution = resolution
+        self.n_days = n_days
+
+    @property
+    def name(self):
+        return "ModelBuilder[{}].run[res={}]".format(self.n_compartments,
+                                                     self.resolution)
+
+    def setup(self):
+        from .builder import ModelBuilder
+        from .ontology import Ontology, WithShort
+        from .data import State
+
+        leaves = {WithShort("c{}".format(i), "C{}".format(i)): None
+                  for i in range(self.n_compartments)}
+        tree = {WithShort("population", "N"): leaves}
+        builder = ModelBuilder(ontology=lambda: Ontology(tree))
+        C = builder.variables
+        N = builder.total()
+        beta = builder.parameter("beta", lambda v, p: .5)
+        rate = builder.parameter("rate", lambda v, p: .2)
+        builder.transition(C[0], C[1], beta * C[0] * C[1] / N,
+                           track="n_infection")
+        for i in range(1, self.n_compartments - 1):
+            builder.transition(C[i], C[i+1], rate * C[i])
+
+        state = State(datetime.date(2020, 1, 1), c0=int(7 * 1e6) - 20, c1=20,
+                      n_infection=20)
+        self.model = builder.build().factory(state, None, None,
+                                             self.resolution)
+
+    def run(self):
+        for _ in self.model.run(self.n_days):
+            pass
+        return self.n_days
+
+
+class OutcomeConcatBenchmark(Benchmark):
+    unit = "concat/s"
+
+    def __init__(self, n_concat=200, n_days=365):
+        self.n_concat = n_concat
+        self.n_days = n_days
+
+    def setup(self):
+        from .data import State, Outcome
+        start = datetime.date(2020, 1, 1)
+        one_day = datetime.timedelta(days=1)
+        history = [State(start + i * one_day, susceptible=1, infectious=0)
+                   for i in range(self.n_days + 1)]
+        self.outcome = Outcome(history, start)
+        self.other = Outcome(history, start + self.n_days * one_day)
+
+    def run(self):
+        for _ in range(self.n_concat):
+            self.outcome.concat(self.other)
+        return self.n_concat
+
+
+class OntologyQueryBenchmark(Benchmark):
+    """Aggregated queries (`infected`, `population`) through the ontology"""
+    unit = "query/s"
+
+    def __init__(self, n_queries=20000):
+        self.n_queries = n_queries
+
+    def setup(self):
+        from .ontology import Ontology
+        self.ontology = Ontology.default_ontology()
+        state = _default_initial_state()
+        state.exposed = 10
+        state.recovered = 0
+        self.state = state
+
+    def run(self):
+        for _ in range(self.n_queries // 2):
+            queryable = self.ontology(self.state)
+            queryable.infected
+            queryable.population
+        return 2 * (self.n_queries // 2)
+
+
+class ImportBenchmark(Benchmark):
+    """
+    Cold import of a module in a fresh interpreter (as in a process-pool
+    worker). Fails if that import loads one of the `forbidden` modules.
+    """
+    unit = "import/s"
+
+    def __init__(self, module="episim.model",
+                 forbidden=("matplotlib", "scipy", "numba")):
+        self.module = module
+        self.forbidden = forbidden
+
+    @property
+    def name(self):
+        return "import[{}]".format(self.module)
+
+    def run(self):
+        code = "import sys; import {}; " \
+               "loaded = [m for m in {} if m in sys.modules]; " \
+               "sys.exit(', '.join(loaded) or None)" \
+               "".format(self.module, repr(tuple(self.forbidden)))
+        process = subprocess.run([sys.executable, "-c", code],
+                                 stderr=subprocess.PIPE,
+                                 universal_newlines=True)
+        if process.returncode != 0:
+            raise RuntimeError("Importing {} loads: {}"
+                               "".format(self.module, process.stderr.strip()))
+        return 1
+
+
+# ---------------------------------------------------------------------------- #
+#                                   Scenarios                                  #
+# ---------------------------------------------------------------------------- #
+class ScenarioBenchmark(Benchmark):
+    """
+    The three scenarios of `mains/strategy_comparison.py` with their default
+    arguments
+    """
+    unit = "scenario/s"
+
+    def __init__(self, model_cls, n_days=243, population_size=int(7 * 1e6),
+                 n_infectious=20, resolution=0.1):
+        self.model_cls = model_cls
+        self.n_days = n_days
+        self.population_size = population_size
+        self.n_infectious = n_infectious
+        self.resolution = resolution
+
+    @property
+    def name(self):
+        return "strategy_comparison[{}]".format(self.model_cls.__name__)
+
+    def setup(self):
+        from .scenario import NoIntervention, SanityMeasure, Confinement
+        T, N = self.n_days, self.population_size
+        I, res = self.n_infectious, self.resolution
+        self.scenarios = [
+            NoIntervention(T, N, I, res),
+            SanityMeasure(.5, 30, T - 30, N, I, res),
+            Confinement(.1, 30, 60, T - 90, N, I, res),
+        ]
+
+    def run(self):
+        for scenario in self.scenarios:
+            scenario.run_model(self.model_cls.factory)
+        return len(self.scenarios)
+
+
+# ---------------------------------------------------------------------------- #
+#                                   Plotting                                   #
+# ---------------------------------------------------------------------------- #
+class FullDashboardBenchmark(Benchmark):
+    """Building and rendering (Agg) a `FullDashboard`"""
+    unit = "render/s"
+
+    def __init__(self, n_days=243):
+        self.n_days = n_days
+
+    def setup(self):
+        import matplotlib
+        matplotlib.use("Agg")
+        from .model import SEIRS
+        from .scenario import NoIntervention
+        if not hasattr(self, "outcome"):
+            scenario = NoIntervention(self.n_days, int(7 * 1e6), 20, 0.1)
+            self.outcome = scenario.run_model(SEIRS.factory)
+
+    def run(self):
+        from .plot import FullDashboard
+        dashboard = FullDashboard()(self.outcome)
+        dashboard.figure.canvas.draw()
+        dashboard.close()
+        return 1
+
+
+def default_benchmarks():
+    from .model import SEIRS, SIR, ErlangSEIRS
+    from .compartmental import SEIaIpIsRD
+    benchmarks = [
+        EulerSimulatorBenchmark(resolution=1.),
+        EulerSimulatorBenchmark(resolution=0.1),
+    ]
+    for model_cls in SEIRS, SIR:
+        for resolution in 1., 0.1, 0.01:
+            benchmarks.append(ModelRunBenchmark(model_cls, resolution))
+    benchmarks.append(ModelRunBenchmark(SEIaIpIsRD, 0.1,
+                                        infectious_compartment="presymptomatic"))
+    for resolution in 1., 0.1:
+        benchmarks.append(RunArrayBenchmark(SEIRS, resolution))
+    benchmarks.append(RunArrayBenchmark(SEIRS, 0.01, backend="auto"))
+    benchmarks.append(SteadyStateBenchmark(SEIRS, 0.1))
+    benchmarks.append(ModelRunBenchmark(ErlangSEIRS, 0.1))
+    benchmarks.append(ModelRunBenchmark(ErlangSEIRS, 0.01, n_exposed_stages=20,
+                                        n_infectious_stages=20))
+    benchmarks.extend([
+        BuiltModelBenchmark(4),
+        BuiltModelBenchmark(24),
+        ParticleFilterBenchmark(),
+        EnsembleSamplerBenchmark(),
+        AgentBasedModelBenchmark(),
+        NetworkSEIRSBenchmark(),
+        RolloutComparisonBenchmark(),
+        MultiStrainBenchmark(2),
+        MultiStrainBenchmark(32),
+        HealthcareLoadBenchmark(),
+        RenewalBenchmark(),
+        RenewalEnsembleBenchmark(),
+        ReportedCasesBenchmark(),
+        ConfinementRunsBenchmark(),
+        EmulatorQueryBenchmark(),
+        ImportBenchmark(),
+        OutcomeConcatBenchmark(),
+        OntologyQueryBenchmark(),
+        ScenarioBenchmark(SEIRS),
+        FullDashboardBenchmark(),
+    ])
+    return benchmarks
+
+
+# ---------------------------------------------------------------------------- #
+#                                    Suite                                     #
+# ---------------------------------------------------------------------------- #
+class Suite(object):
+    def __init__(self, benchmarks=None, repeat=5):
+        if benchmarks is None:
+            benchmarks = default_benchmarks()
+        self.benchmarks = benchmarks
+        self.repeat = repeat
+
+    def filter(self, pattern):
+        if pattern is None:
+            return self
+        benchmarks = [b for b in self.benchmarks if pattern in b.name]
+        return self.__class__(benchmarks, self.repeat)
+
+    def __call__(self, verbose=False):
+        """
+        Results of the benchmarks, those which raised being recorded as
+        failures (see `BenchmarkResult.failed`)
+        """
+        results = []
+        for benchmark in self.benchmarks:
+            try:
+                result = benchmark(self.repeat)
+            except Exception as exception:
+                result = BenchmarkResult.failure(benchmark, exception)
+                print(result, file=sys.stderr)
+            else:
+                if verbose:
+                    print(result)
+            results.append(result)
+        return results
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "date": datetime.datetime.now().isoformat(),
+    }
+
+
+def dump(results, fpath):
+    content = {
+        "environment": environment(),
+        "results": {r.name: r.to_dict() for r in results},
+    }
+    with open(fpath, "w") as hdl:
+        json.dump(content, hdl, indent=2, sort_keys=True)
+
+
+def load(fpath):
+    with open(fpath) as hdl:
+        content = json.load(hdl)
+    return [BenchmarkResult.from_dict(name, d)
+            for name, d in content["results"].items()]
+
+
+def compare(results, baseline, tolerance=.1):
+    """
+    Compare `results` against `baseline` (both lists of `BenchmarkResult`).
+
+    Return
+    ------
+    comparison: list of (name, ratio, is_regression)
+        `ratio` is the current throughput divided by the baseline one
+        (> 1 is faster). Benchmarks absent from the baseline (or which
+        failed there) are skipped; those which failed now are regressions.
+    """
+    name2base = {r.name: r for r in baseline}
+    comparison = []
+    for result in results:
+        base = name2base.get(result.name)
+        if base is None or base.failed:
+            continue
+        ratio = result.throughput / base.throughput
+        comparison.append((result.name, ratio, ratio < 1 - tolerance))
+    return comparison
+
+
+def main(argv=sys.argv[1:]):
+    parser = argparse.ArgumentParser(description="episim benchmarks")
+    parser.add_argument("-o", "--output", default=None,
+                        help="Path of the JSON file where to dump the results")
+    parser.add_argument("-b", "--baseline", default=None,
+                        help="JSON file of a previous run to compare against")
+    parser.add_argument("-t", "--tolerance", default=.1, type=float,
+                        help="Relative slowdown tolerated before flagging a "
+                             "regression")
+    parser.add_argument("-k", "--filter", default=None,
+                        help="Only run benchmarks whose name contains this")
+    parser.add_argument("-r", "--repeat", default=5, type=int)
+
+    args = parser.parse_args(argv)
+
+    results = Suite(repeat=args.repeat).filter(args.filter)(verbose=True)
+
+    if args.output is not None:
+        dump(results, args.output)
+
+    n_failures = sum(int(r.failed) for r in results)
+    if args.baseline is None:
+        return 1 if n_failures > 0 else 0
+
+    n_regressions = 0
+    print()
+    for name, ratio, is_regression in compare(results, load(args.baseline),
+                                              args.tolerance):
+        flag = "REGRESSION" if is_regression else ""
+        print("{:<40} x{:>6.2f} {}".format(name, ratio, flag))
+        n_regressions += int(is_regression)
+
+    return 1 if n_regressions + n_failures > 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
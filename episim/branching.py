@@ -0,0 +1,157 @@
+"""
+Branching simulations.
+
+Variants of a scenario which only differ after some day (e.g. interventions
+starting at different days) share the run up to that day. Instead of
+re-simulating it for every variant, the variants are forked from the state
+of the common run at that day, and their outcomes share its history:
+
+    root = Branch(model, n_days=40)
+    for day in 20, 30, 40:
+        confinement = root.fork(day, confined_model, n_days=90)
+        for duration in 30, 60, 90:
+            confinement.fork(duration, deconfined_model,
+                             n_days=243 - day - duration)
+    outcomes = root.outcomes()
+
+where `confined_model(snapshot)` returns the model of the confinement,
+restored from the `Snapshot` of the common run at the day of the fork.
+Sweeping `n` variants over a horizon `T` costs the total length of the
+branches instead of `n T`.
+"""
+from . import profiling
+from .data import Outcome
+
+
+class Branch(object):
+    """
+    A run of `n_days` from the current state of `model`, from which other
+    runs can be forked.
+
+    Parameters
+    ----------
+    model: `Model`
+        The model, set to the starting state of the branch
+    n_days: int
+        Number of days simulated in the branch
+    description: str or callable
+        Description of the branch (see `Outcome.date2descr`), or a callable
+        computing it from the model of the branch
+    name: str or None
+        Name of the outcome(s)
+    """
+    def __init__(self, model, n_days, description="", name=None):
+        self.model = model
+        self.n_days = n_days
+        self.description = description
+        self.name = name
+        self.parent = None
+        self.day = 0
+        self.children = []
+        self._make_model = None
+        self._outcome = None
+        self._checkpoints = {}
+
+    def __repr__(self):
+        return "{}(day={}, n_days={}, name={}, n_children={})".format(
+            self.__class__.__name__, repr(self.day), repr(self.n_days),
+            repr(self.name), len(self.children))
+
+    def fork(self, day, make_model, n_days=None, description="", name=None):
+        """
+        Declare a branch starting at `day` (counted from the start of this
+        branch).
+
+        make_model: callable
+            `make_model(snapshot)` returns the `Model` of the new branch,
+            restored from `snapshot` (the `Snapshot` of the model of this
+            branch at `day`), typically `factory(snapshot, virus, ...)`
+        n_days: int or None
+            Number of days of the new branch (default: until the end of this
+            branch)
+
+        Return
+        ------
+        branch: `Branch`
+            The new branch, from which other branches can be forked
+        """
+        if not 0 <= day <= self.n_days:
+            raise ValueError("Cannot fork at day {} a branch of {} days"
+                             "".format(day, self.n_days))
+        if n_days is None:
+            n_days = self.n_days - day
+        branch = self.__class__(None, n_days, description, name)
+        branch.parent = self
+        branch.day = day
+        branch._make_model = make_model
+        self.children.append(branch)
+        return branch
+
+    @property
+    def start(self):
+        """Number of days between the start of the root and of the branch"""
+        return 0 if self.parent is None else self.parent.start + self.day
+
+    @property
+    def depth(self):
+        return 0 if self.parent is None else self.parent.depth + 1
+
+    def __iter__(self):
+        """Depth-first iteration over the branches of the tree"""
+        yield self
+        for child in self.children:
+            for branch in child:
+                yield branch
+
+    def leaves(self):
+        return [branch for branch in self if len(branch.children) == 0]
+
+    def run(self):
+        """Simulate the branch (once) and then its children"""
+        if self._outcome is None:
+            if self.model is None:
+                self.model = self._make_model(
+                    self.parent._checkpoints[self.day])
+            description = self.description
+            if callable(description):
+                description = description(self.model)
+            self._simulate(description)
+        for child in self.children:
+            child.run()
+        return self
+
+    @profiling.timed("Branch.simulate")
+    def _simulate(self, description):
+        # `Snapshot` of the model at each day where a child starts
+        fork_days = set(child.day for child in self.children)
+        self._checkpoints = {}
+        model = self.model
+        history = [model.current_state]
+        if 0 in fork_days:
+            self._checkpoints[0] = model.snapshot()
+        for day, state in enumerate(model.run(self.n_days), 1):
+            history.append(state)
+            if day in fork_days:
+                self._checkpoints[day] = model.snapshot()
+        self._outcome = Outcome(history, history[0].date, description,
+                                model.ontology)
+
+    def outcome(self):
+        """
+        The outcome from the root to the end of this branch. The states of
+        the ancestors are shared, not copied.
+        """
+        self.run()
+        if self.parent is None:
+            outcome = self._outcome
+        else:
+            head = self.parent.outcome().head(self.start + 1)
+            outcome = head.concat(self._outcome, copy=False)
+        outcome.name = self.name
+        return outcome
+
+    def outcomes(self, leaves_only=True):
+        """Outcomes of the leaves (or of all the branches), depth first"""
+        self.run()
+        branches = self.leaves() if leaves_only else list(self)
+        return [branch.outcome() for branch in branches]
@@ -0,0 +1,293 @@
+"""
+Declarative definition of compartmental models.
+
+The compartments are entries (by default the leaves) of an `Ontology`, the
+transitions are given as (source, destination, rate expression) and the
+parameters are bound to the `VirusParameter` and `PopulationParameter`. The
+builder generates a `Model` class whose dynamic is a fused `Kernel`. For
+instance, `SEIRS` is
+
+    builder = ModelBuilder(["susceptible", "exposed", "infectious",
+                            "recovered"])
+    S, E, I, R = builder.variables
+    N = builder.total()
+    beta = builder.parameter(
+        "beta", lambda v, p: p.contact_frequency * v.transmission_rate)
+    kappa = builder.parameter("kappa", lambda v, p: 1. / v.exposed_duration)
+    gamma = builder.parameter("gamma",
+                              lambda v, p: 1. / v.infectious_duration)
+    ksi = builder.parameter("ksi", lambda v, p: v.immunity_drop_rate)
+
+    builder.transition(S, E, beta * S * I / N, track="n_infection")
+    builder.transition(E, I, kappa * E)
+    builder.transition(I, R, gamma * I)
+    builder.transition(R, S, ksi * R)
+    builder.reproduction_number(beta / gamma)
+
+    SEIRSKernel = builder.build("SEIRSKernel")
+    model = SEIRSKernel.factory(initial_state, virus, population)
+
+The cumulated value of every transition is integrated alongside the state;
+tracked transitions are reported (cumulated since the beginning) as an
+attribute of the states.
+"""
+import sys
+
+from .data import State
+from .kernel import Flow, Kernel, KernelSimulator
+from .model import Model
+from .modeling import Variable, Parameter, Addition
+from .ontology import Ontology
+
+
+class CompartmentalModel(Model):
+    """
+    Base class of the models generated by `ModelBuilder`. Subclasses are
+    configured through class attributes.
+    """
+    kernel = None
+    compartments = ()
+    parameter_names = ()
+    bindings = ()
+    flow_names = ()
+    tracked = ()  # (flow index, state attribute)
+    reproduction_kernel = None
+    ontology_factory = Ontology.default_ontology
+
+    @classmethod
+    def compute_parameters(cls, virus, population):
+        return tuple(binding(virus, population) for binding in cls.bindings)
+
+    def __init__(self, *parameters, resolution=0.1):
+        super().__init__(resolution=resolution)
+        if len(parameters) != len(self.parameter_names):
+            raise TypeError("{} expects {} parameters ({}), got {}"
+                            "".format(self.__class__.__name__,
+                                      len(self.parameter_names),
+                                      ", ".join(self.parameter_names),
+                                      len(parameters)))
+        self.ontology = self.__class__.ontology_factory()
+        self.parameters = tuple(parameters)
+        self.simulator = KernelSimulator(self.kernel, self.parameters,
+                                         step_size=resolution)
+
+    def __getattr__(self, item):
+        # Parameters can be accessed by name (e.g. `model.beta`)
+        if item in self.__class__.parameter_names:
+            return self.parameters[self.__class__.parameter_names.index(item)]
+        raise AttributeError(item)
+
+    def __repr__(self):
+        s = "{}({}, resolution={})".format(
+            self.__class__.__name__,
+            ", ".join(repr(p) for p in self.parameters),
+            repr(self.resolution),
+        )
+        if self.current_state is None:
+            return s
+
+        return s + ".set_state({})".format(repr(self.current_state))
+
+    def __str__(self):
+        return "{}({})".format(self.__class__.__name__,
+                               ", ".join("{}={:.2e}".format(n, v) for n, v in
+                                         zip(self.parameter_names,
+                                             self.parameters)))
+
+    def prepare_state(self, state):
+        state = super().prepare_state(state)
+        for _, attribute in self.tracked:
+            if getattr(state, attribute) is None:
+                setattr(state, attribute, 0)
+        return state
+
+    def _compute_reproduction_number(self, n_susceptible, n_total):
+        if self.reproduction_kernel is None:
+            return 0
+        r0 = self.reproduction_kernel.rhs((), self.parameters)[1][0]
+        return r0 * n_susceptible / n_total
+
+    def _state2variables(self, state):
+        zero = lambda x: 0 if x is None else x
+        return tuple(zero(getattr(state, c)) for c in self.compartments)
+
+    def _variables2state(self, date, *values, previous=None):
+        n = len(self.compartments)
+        state = State(date)
+        for compartment, value in zip(self.compartments, values[:n]):
+            setattr(state, compartment, value)
+
+        flows = values[n:]
+        for j, attribute in self.tracked:
+            # Several transitions can be tracked under the same attribute
+            value = getattr(state, attribute)
+            if value is None:
+                value = getattr(previous, attribute)
+            value = 0 if value is None else value
+            setattr(state, attribute, value + flows[j])
+        return state
+
+
+class ModelBuilder(object):
+    """
+    Parameters
+    ----------
+    compartments: list of str or None
+        Names (long or short) of the compartments, which must be entries of
+        the ontology. None for all the leaves.
+    ontology: callable or None
+        Factory of the `Ontology` (default: `Ontology.default_ontology`)
+    """
+    def __init__(self, compartments=None, ontology=None):
+        if ontology is None:
+            ontology = Ontology.default_ontology
+        self.ontology_factory = ontology
+        self.ontology = ontology()
+        if compartments is None:
+            compartments = self.ontology.leaves()
+
+        self.compartments = []
+        for name in compartments:
+            long_name = self.ontology.longest_name(name)
+            if long_name not in self.ontology.entries:
+                raise ValueError("'{}' is not in the ontology".format(name))
+            self.compartments.append(long_name)
+
+        # An aggregate (e.g. "infectious") can be a compartment if the model
+        # does not detail it, but not together with its sub-compartments
+        for name in self.compartments:
+            overlap = set(self._descendants(name)) & set(self.compartments)
+            if len(overlap) > 0:
+                raise ValueError("'{}' cannot be a compartment together with "
+                                 "{}".format(name, ", ".join(sorted(overlap))))
+
+        self.variables = [Variable(self.ontology.shortest_name(c), i)
+                          for i, c in enumerate(self.compartments)]
+        self.parameters = []
+        self.bindings = []
+        self.flows = []
+        self.tracked = []
+        self._reproduction_number = None
+
+    def _descendants(self, name):
+        for child in self.ontology.children_names(name):
+            yield child
+            for descendant in self._descendants(child):
+                yield descendant
+
+    def variable(self, name):
+        """The `Variable` of the compartment `name` (long or short)"""
+        long_name = self.ontology.longest_name(name)
+        try:
+            return self.variables[self.compartments.index(long_name)]
+        except ValueError:
+            raise KeyError(name)
+
+    def _index(self, compartment):
+        if compartment is None:
+            return None
+        if isinstance(compartment, Variable):
+            return compartment.index
+        return self.variable(compartment).index
+
+    def total(self, *compartments, name="N"):
+        """Sum of the compartments (all but the deceased by default)"""
+        if len(compartments) == 0:
+            variables = [v for v, c in zip(self.variables, self.compartments)
+                         if c != "deceased"]
+        else:
+            variables = [self.variables[self._index(c)] for c in compartments]
+        node = Addition.create(*variables)
+        if len(variables) > 1:
+            node.override_name(name)
+        return node
+
+    def parameter(self, name, binding):
+        """
+        Declare a parameter.
+
+        binding: callable
+            `binding(virus, population)` computes the value of the parameter
+            from a `VirusParameter` and a `PopulationParameter`
+
+        Return
+        ------
+        parameter: `Parameter`
+            The node to use in the rate expressions
+        """
+        if name in [p.name for p in self.parameters]:
+            raise ValueError("Parameter '{}' already declared".format(name))
+        parameter = Parameter(name, len(self.parameters))
+        self.parameters.append(parameter)
+        self.bindings.append(binding)
+        return parameter
+
+    def transition(self, src, dst, rate, name=None, track=None):
+        """
+        Declare a transition.
+
+        src, dst: `Variable`, compartment name or None
+            Source and destination compartments (None for outside of the
+            system: births, imports, ...)
+        rate: `Node`
+            Flow of individuals per unit of time
+        name: str or None
+            Name of the transition (default: "<src>_to_<dst>")
+        track: str or None
+            If not None, the number of individuals having gone through the
+            transition since the beginning is reported as this attribute of
+            the states (e.g. "n_infection"). Several transitions can share
+            the same attribute.
+        """
+        src_idx, dst_idx = self._index(src), self._index(dst)
+        if name is None:
+            name = "{}_to_{}".format(
+                "out" if src_idx is None else self.compartments[src_idx],
+                "out" if dst_idx is None else self.compartments[dst_idx])
+        self.flows.append(Flow(src_idx, dst_idx, rate, name))
+        if track is not None:
+            self.tracked.append((len(self.flows) - 1, track))
+        return self
+
+    def reproduction_number(self, r0):
+        """
+        Expression (in terms of the parameters) of the basic reproduction
+        number. The effective one is `R_0 S/N`.
+        """
+        self._reproduction_number = r0
+        return self
+
+    def build_kernel(self):
+        return Kernel(self.variables, self.parameters, self.flows)
+
+    def build(self, name="CompartmentalModel", base=CompartmentalModel,
+              module=None):
+        """
+        Generate the `Model` class.
+
+        module: str or None
+            Module the class is attributed to (by default, the caller's),
+            so that it can be pickled if it is bound to `name` there
+        """
+        if module is None:
+            module = sys._getframe(1).f_globals.get("__name__", "__main__")
+        reproduction_kernel = None
+        if self._reproduction_number is not None:
+            reproduction_kernel = Kernel(
+                [], self.parameters, [Flow(None, None,
+                                           self._reproduction_number)]
+            )
+
+        attributes = {
+            "kernel": self.build_kernel(),
+            "compartments": tuple(self.compartments),
+            "variable_names": tuple(self.compartments),
+            "parameter_names": tuple(p.name for p in self.parameters),
+            "bindings": tuple(self.bindings),
+            "flow_names": tuple(f.name for f in self.flows),
+            "tracked": tuple(self.tracked),
+            "reproduction_kernel": reproduction_kernel,
+            "ontology_factory": staticmethod(self.ontology_factory),
+            "__module__": module,
+        }
+        return type(name, (base,), attributes)
@@ -0,0 +1,61 @@
+"""
+Compartmental models generated with `ModelBuilder`.
+"""
+from .builder import ModelBuilder
+
+
+def seiaipisrd_builder():
+    """
+    Susceptible, Exposed, Infectious (asymptomatic, presymptomatic and
+    symptomatic), Recovered and Deceased.
+
+    Exposed individuals become either asymptomatic (with probability alpha)
+    or presymptomatic, then symptomatic. Infectious individuals recover or
+    die (with a probability depending on the path). Asymptomatic individuals
+    are less infectious (factor epsilon). Recovered individuals can lose
+    their immunity (rate ksi).
+
+    Tracked transitions: `n_infection` (S -> E), `n_symptomatic`
+    (symptom onsets, Ip -> Is) and `n_death` (Ia, Is -> D).
+    """
+    builder = ModelBuilder(["susceptible", "exposed", "asymptomatic",
+                            "presymptomatic", "symptomatic", "recovered",
+                            "deceased"])
+    S, E, Ia, Ip, Is, R, D = builder.variables
+    N = builder.total()
+
+    beta = builder.parameter(
+        "beta", lambda v, p: p.contact_frequency * v.transmission_rate)
+    kappa = builder.parameter("kappa", lambda v, p: 1. / v.exposed_duration)
+    alpha = builder.parameter("alpha", lambda v, p: v.asymptomatic_ratio)
+    epsilon = builder.parameter("epsilon",
+                                lambda v, p: v.asymptomatic_infectiousness)
+    delta = builder.parameter("delta",
+                              lambda v, p: 1. / v.presymptomatic_duration)
+    gamma_a = builder.parameter("gamma_a",
+                                lambda v, p: 1. / v.infectious_duration)
+    gamma_s = builder.parameter("gamma_s",
+                                lambda v, p: 1. / v.symptomatic_duration)
+    mu_a = builder.parameter("mu_a", lambda v, p: v.asymptomatic_fatality_rate)
+    mu_s = builder.parameter("mu_s", lambda v, p: v.symptomatic_fatality_rate)
+    ksi = builder.parameter("ksi", lambda v, p: v.immunity_drop_rate)
+
+    force = epsilon * Ia + Ip + Is
+    builder.transition(S, E, beta * S * force / N, track="n_infection")
+    builder.transition(E, Ia, alpha * kappa * E)
+    builder.transition(E, Ip, (1 - alpha) * kappa * E)
+    builder.transition(Ip, Is, delta * Ip, track="n_symptomatic")
+    builder.transition(Ia, R, (1 - mu_a) * gamma_a * Ia)
+    builder.transition(Ia, D, mu_a * gamma_a * Ia, track="n_death")
+    builder.transition(Is, R, (1 - mu_s) * gamma_s * Is)
+    builder.transition(Is, D, mu_s * gamma_s * Is, track="n_death")
+    builder.transition(R, S, ksi * R)
+
+    builder.reproduction_number(
+        beta * (alpha * epsilon / gamma_a
+                + (1 - alpha) * (1 / delta + 1 / gamma_s))
+    )
+    return builder
+
+
+SEIaIpIsRD = seiaipisrd_builder().build("SEIaIpIsRD")
@@ -1,6 +1,11 @@
+import datetime
 from copy import copy as shallow_clone
 from collections import OrderedDict
+from itertools import islice
 
+import numpy as np
+
+from episim import profiling
 from episim.ontology import Ontology
 
 
@@ -11,6 +16,9 @@ class State(object):
             setattr(self, key, val)
 
     def __getattr__(self, key):
+        if key.startswith("__") and key.endswith("__"):
+            # Keep the protocols (pickle, copy, ...) working
+            raise AttributeError(key)
         return None
 
 #
@@ -75,8 +83,88 @@ class StateDelta(State):
 
 
 
+class History(object):
+    """
+    Sequence of states made of the first `length` states of `prefix` (shared,
+    not copied) followed by its own states. Forked runs share the history of
+    their common part this way.
+    """
+    def __init__(self, prefix=(), length=None, states=None):
+        self.prefix = prefix
+        self.length = len(prefix) if length is None else length
+        self.states = [] if states is None else list(states)
+
+    def __len__(self):
+        return self.length + len(self.states)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self[i] for i in range(*item.indices(len(self)))]
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError(item)
+        if item < self.length:
+            return self.prefix[item]
+        return self.states[item - self.length]
+
+    def __iter__(self):
+        for state in islice(self.prefix, self.length):
+            yield state
+        for state in self.states:
+            yield state
+
+    def append(self, state):
+        self.states.append(state)
+
+    def extend(self, states):
+        self.states.extend(states)
+
+
+class ArrayHistory(object):
+    """
+    States stored column-wise (e.g. by `Model.run_array`): `array[t, j]` is
+    the value of `fields[j]` at `dates[t]`. `State`s are only created when
+    accessed; `column` avoids them altogether.
+    """
+    def __init__(self, array, fields, dates):
+        self.array = array
+        self.fields = list(fields)
+        self.dates = dates
+        self._index = {field: j for j, field in enumerate(self.fields)}
+
+    def __len__(self):
+        return len(self.array)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self[i] for i in range(*item.indices(len(self)))]
+        row = self.array[item]
+        return State(self.dates[item],
+                     **{f: float(v) for f, v in zip(self.fields, row)})
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def column(self, name, ontology):
+        """
+        Values of `name` over time. As with `Queryable`, an entry of the
+        ontology missing from the fields is the sum of its children (0 if it
+        has none).
+        """
+        j = self._index.get(name)
+        if j is not None:
+            return self.array[:, j]
+        values = np.zeros(len(self.array))
+        for child in ontology.children_names(name):
+            values = values + self.column(child, ontology)
+        return values
+
+
 class Outcome(object):
     @classmethod
+    @profiling.timed("Outcome.from_model")
     def from_model(cls, model, steps, description=""):
         history = [model.current_state]
         start_date = model.current_state.date
@@ -84,6 +172,24 @@ class Outcome(object):
             history.append(state)
         return cls(history, start_date, description, model.ontology)
 
+    @classmethod
+    @profiling.timed("Outcome.from_run_array")
+    def from_run_array(cls, model, steps, description="", record_every=1,
+                       fields=None):
+        """
+        As `from_model` but the run is stored column-wise (see
+        `Model.run_array`), without creating a `State` per day. The plots
+        expect daily records (`record_every=1`).
+        """
+        start_date = model.current_state.date
+        if fields is None:
+            fields = model.fields
+        array = model.run_array(steps, record_every, fields)
+        dates = [start_date + datetime.timedelta(days=i * record_every)
+                 for i in range(len(array))]
+        history = ArrayHistory(array, fields, dates)
+        return cls(history, start_date, description, model.ontology)
+
     def __init__(self, state_history, start_date, description="",
                  ontology=None):
         self.state_history = state_history
@@ -114,16 +220,49 @@ class Outcome(object):
     def population_size(self):
         return self.ontology(self.state_history[0]).population
 
+    @profiling.timed("Outcome.concat")
     def concat(self, outcome, copy=True):
         o = self
         if copy:
+            # The states of `self` are shared, not copied
             o = shallow_clone(o)
-            o.state_history = shallow_clone(o.state_history)
-        o.state_history.extend(outcome.state_history[1:])
+            o.state_history = History(o.state_history)
+            o.date2descr = shallow_clone(o.date2descr)
+        o.state_history.extend(islice(outcome.state_history, 1, None))
         for date, descr in outcome.date2descr.items():
             o.date2descr[date] = descr
         return o
 
+    def head(self, n_steps):
+        """
+        Outcome restricted to the first `n_steps` states, sharing them with
+        `self`
+        """
+        o = shallow_clone(self)
+        o.state_history = History(self.state_history, min(n_steps, len(self)))
+        last_date = o.state_history[-1].date
+        o.date2descr = OrderedDict((date, descr) for date, descr in
+                                   self.date2descr.items()
+                                   if date <= last_date)
+        return o
+
+    def column(self, name):
+        """
+        Values of attribute `name` (queried through the ontology) over time,
+        as a float array (missing values are NaN).
+        """
+        if isinstance(self.state_history, ArrayHistory):
+            return self.state_history.column(name, self.ontology).copy()
+        return np.array([getattr(state, name) for state in self], dtype=float)
+
+    def daily(self, name):
+        """
+        Day-to-day increments of the cumulated attribute `name` (e.g.
+        `n_death` gives the daily deaths). The first value is 0.
+        """
+        values = self.column(name)
+        return np.diff(values, prepend=values[:1])
+
     def get_dated_descriptions(self):
         import os
         # TODO datetime + move
@@ -138,4 +277,40 @@ class Outcome(object):
         return len(self.state_history)
 
 
+class Ensemble(object):
+    """
+    Collection of outcomes (e.g. replicates or a parameter sweep) queried
+    column-wise: `column` returns an array [n_outcomes, n_steps]. Shorter
+    outcomes are padded with NaN.
+    """
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+
+    def __len__(self):
+        return len(self.outcomes)
+
+    def __iter__(self):
+        return iter(self.outcomes)
+
+    def __getitem__(self, item):
+        return self.outcomes[item]
+
+    @property
+    def n_steps(self):
+        return max(len(o) for o in self.outcomes)
+
+    @property
+    def population_size(self):
+        return np.array([o.population_size for o in self.outcomes],
+                        dtype=float)
+
+    def column(self, name):
+        values = np.full((len(self.outcomes), self.n_steps), np.nan)
+        for i, outcome in enumerate(self.outcomes):
+            y = outcome.column(name)
+            values[i, :len(y)] = y
+        return values
 
+    def quantiles(self, name, q):
+        """Quantiles `q` of `name` across the outcomes: [len(q), n_steps]"""
+        return np.nanquantile(self.column(name), q, axis=0)
@@ -0,0 +1,428 @@
+"""
+Emulator (surrogate) of the outcome of a confinement, for interactive
+what-if queries.
+
+The parameters of `scenario.Confinement` (and optionally those of the virus,
+see `inference.seirs_parameters`) are sampled by a Latin hypercube; all the
+runs are integrated together by the fused kernel of the model, one column
+per run. A Gaussian process per quantity (peak of infectious, day of that
+peak, total number of infections) is then trained on them. A query costs a
+few microseconds:
+
+    runs = ConfinementRuns(model, n_days=243)
+    emulator = Emulator.train(runs, {"confinement_effect": (.05, .6),
+                                     "n_days_before_confinement": (10, 90),
+                                     "n_days_confinement": (15, 120)})
+    emulator.accuracy(runs)       # against the model, on other runs
+    emulator.query("total", confinement_effect=.3,
+                   n_days_before_confinement=25, n_days_confinement=60)
+    emulator.save("emulator.npz")   # Emulator.load("emulator.npz")
+"""
+import os
+
+import numpy as np
+from scipy import linalg, optimize
+
+from . import profiling
+from .inference import seirs_parameters
+
+
+CONFINEMENT = {
+    "confinement_effect": .1,
+    "n_days_before_confinement": 30,
+    "n_days_confinement": 60,
+}
+
+QUANTITIES = ("peak", "peak_day", "total")
+
+# Quantities regressed in log scale (positive, spanning orders of magnitude)
+_LOG_QUANTITIES = ("peak", "total")
+
+
+def latin_hypercube(n, n_dim, random_state=None):
+    """`n` points in [0, 1]^n_dim, one in each of the `n` slices of each axis"""
+    if not isinstance(random_state, np.random.RandomState):
+        random_state = np.random.RandomState(random_state)
+    slices = np.argsort(random_state.random_sample((n_dim, n)), axis=1).T
+    return (slices + random_state.random_sample((n, n_dim))) / n
+
+
+# ---------------------------------------------------------------------------- #
+#                                     Runs                                     #
+# ---------------------------------------------------------------------------- #
+class ConfinementRuns(object):
+    """
+    `Confinement` runs for many values of the parameters at once (the
+    transmission rate being multiplied by "confinement_effect" during the
+    "n_days_confinement" days following the first "n_days_before_confinement"
+    ones).
+
+    Parameters
+    ----------
+    model: `Model`
+        Model on a `KernelSimulator` with a "beta" parameter, an "infectious"
+        variable and an "n_infection" counter (e.g. `SEIRS`), set to the
+        initial state
+    n_days: int
+        Duration of the runs
+    parametrization: callable
+        `parametrization(values, reference)` returns the parameters of the
+        kernel (see `inference.seirs_parameters`). The confinement parameters
+        missing from `values` take the values of `CONFINEMENT`.
+    """
+    def __init__(self, model, n_days=243, parametrization=seirs_parameters):
+        self.model = model
+        self.n_days = n_days
+        self.parametrization = parametrization
+
+        simulator = model.simulator
+        self.kernel = simulator.kernel
+        self.step_size = simulator.step_size
+        self.reference = tuple(float(p) for p in simulator.parameters)
+        self.x0 = tuple(float(v) for v in
+                        model._state2variables(model.current_state))
+        names = [p.name for p in self.kernel.parameters]
+        self._beta_index = names.index("beta")
+        self._infectious = list(model.variable_names).index("infectious")
+        self._infection_flows = [j for j, attribute in model.tracked
+                                 if attribute == "n_infection"]
+
+    def __repr__(self):
+        return "{}({}, n_days={})".format(self.__class__.__name__,
+                                          repr(self.model), self.n_days)
+
+    @profiling.timed("ConfinementRuns")
+    def __call__(self, values):
+        """
+        Quantities of the runs.
+
+        Parameters
+        ----------
+        values: dict
+            name -> array [n] of the confinement parameters (see
+            `CONFINEMENT`) and of those of `parametrization`. Fractional
+            numbers of days confine the boundary days partially.
+
+        Return
+        ------
+        quantities: dict
+            name (see `QUANTITIES`) -> array [n]: maximum number of
+            infectious, day of that maximum, number of infections over the
+            run
+        """
+        n = len(next(iter(values.values())))
+        confinement = {name: np.broadcast_to(np.asarray(values.get(name, d),
+                                                        dtype=float), (n,))
+                       for name, d in CONFINEMENT.items()}
+        effect = confinement["confinement_effect"]
+        start = confinement["n_days_before_confinement"]
+        end = start + confinement["n_days_confinement"]
+        others = {name: np.asarray(v, dtype=float)
+                  for name, v in values.items() if name not in CONFINEMENT}
+        p = [np.broadcast_to(np.asarray(q, dtype=float), (n,))
+             for q in self.parametrization(others, self.reference)]
+        beta = p[self._beta_index]
+
+        x = tuple(np.full(n, v) for v in self.x0)
+        zeros = (0.,) * self.kernel.n_flows
+        n_steps = int(1. / self.step_size)
+        peak = x[self._infectious].copy()
+        peak_day = np.zeros(n)
+        total = np.zeros(n)
+        for day in range(self.n_days):
+            confined = np.clip(np.minimum(day + 1, end) -
+                               np.maximum(day, start), 0., 1.)
+            p[self._beta_index] = beta * (1 - confined * (1 - effect))
+            x, acc = self.kernel.integrate(x, zeros, tuple(p),
+                                           self.step_size, n_steps)
+            total += sum(acc[j] for j in self._infection_flows)
+            higher = x[self._infectious] > peak
+            peak = np.where(higher, x[self._infectious], peak)
+            peak_day[higher] = day + 1
+        profiling.count("ConfinementRuns.runs", n)
+        return {"peak": peak, "peak_day": peak_day, "total": total}
+
+
+# ---------------------------------------------------------------------------- #
+#                               Gaussian process                               #
+# ---------------------------------------------------------------------------- #
+class GaussianProcess(object):
+    """
+    Gaussian process regression with a squared exponential covariance (one
+    length scale per input), the targets being standardized
+
+    Parameters
+    ----------
+    X: array [n, n_dim]
+        Training inputs
+    y: array [n]
+        Training targets
+    length_scales: array [n_dim]
+    amplitude: float
+        Standard deviation of the (standardized) process
+    noise: float
+        Standard deviation of the (standardized) noise
+    """
+    def __init__(self, X, y, length_scales, amplitude=1., noise=1e-3):
+        self.X = np.asarray(X, dtype=float)
+        self.y = y = np.asarray(y, dtype=float)
+        self.length_scales = np.asarray(length_scales, dtype=float)
+        self.amplitude = float(amplitude)
+        self.noise = float(noise)
+        self.y_mean = y.mean()
+        self.y_std = y.std() if y.std() > 0 else 1.
+        self._scaled = self.X / self.length_scales
+        K = self._covariance(self._scaled, self._scaled)
+        K[np.diag_indices_from(K)] += self.noise ** 2
+        self._cholesky = linalg.cho_factor(K, lower=True)
+        self.alpha = linalg.cho_solve(self._cholesky,
+                                      (y - self.y_mean) / self.y_std)
+        # For `__call__`
+        self._inverse_scales = 1. / self.length_scales
+        self._weights = self.y_std * self.amplitude ** 2 * self.alpha
+
+    def __repr__(self):
+        return "{}(n={}, length_scales={}, amplitude={:.3g}, noise={:.3g})" \
+               "".format(self.__class__.__name__, len(self.X),
+                         np.array2string(self.length_scales, precision=3),
+                         self.amplitude, self.noise)
+
+    def _covariance(self, A, B):
+        squared = (A ** 2).sum(axis=1)[:, np.newaxis] + \
+            (B ** 2).sum(axis=1)[np.newaxis, :] - 2 * A.dot(B.T)
+        return self.amplitude ** 2 * np.exp(-.5 * np.maximum(squared, 0.))
+
+    @classmethod
+    def fit(cls, X, y, length_scales=(.1, .3, 1.), n_fit=256):
+        """
+        Process whose hyperparameters maximize the marginal likelihood of
+        `y` given `X`, the optimization starting from each of the (common)
+        `length_scales`. Only the first `n_fit` points are used to choose
+        the hyperparameters (the cost being cubic), all of them being then
+        conditioned on.
+        """
+        X_all = np.asarray(X, dtype=float)
+        y_all = np.asarray(y, dtype=float)
+        X, y = X_all[:n_fit], y_all[:n_fit]
+        z = (y - y.mean()) / (y.std() if y.std() > 0 else 1.)
+        n, n_dim = X.shape
+        # [n_dim, n, n]
+        squared = (X.T[:, :, np.newaxis] - X.T[:, np.newaxis, :]) ** 2
+        identity = np.eye(n)
+
+        def negative_log_likelihood(log_params):
+            params = np.exp(log_params)
+            scaled = squared / params[:n_dim, np.newaxis, np.newaxis] ** 2
+            correlation = params[n_dim] ** 2 * np.exp(-.5 * scaled.sum(axis=0))
+            K = correlation + params[n_dim + 1] ** 2 * identity
+            try:
+                cholesky = linalg.cho_factor(K, lower=True)
+            except linalg.LinAlgError:
+                return np.inf, np.zeros_like(log_params)
+            alpha = linalg.cho_solve(cholesky, z)
+            value = .5 * z.dot(alpha) + np.log(np.diag(cholesky[0])).sum()
+            # d value / d K
+            W = .5 * (linalg.cho_solve(cholesky, identity) -
+                      np.outer(alpha, alpha))
+            gradient = np.empty_like(log_params)
+            gradient[:n_dim] = ((W * correlation)[np.newaxis] *
+                                scaled).sum(axis=(1, 2))
+            gradient[n_dim] = 2 * (W * correlation).sum()
+            gradient[n_dim + 1] = 2 * params[n_dim + 1] ** 2 * np.trace(W)
+            return value, gradient
+
+        bounds = [(np.log(1e-2), np.log(1e2))] * n_dim + \
+            [(np.log(1e-1), np.log(1e1)), (np.log(1e-5), np.log(1.))]
+        best = None
+        with profiling.timer("GaussianProcess.fit"):
+            for length_scale in length_scales:
+                x0 = np.log(np.concatenate([np.full(n_dim, length_scale),
+                                            [1., 1e-2]]))
+                result = optimize.minimize(negative_log_likelihood, x0,
+                                           jac=True, method="L-BFGS-B",
+                                           bounds=bounds)
+                if best is None or result.fun < best.fun:
+                    best = result
+        params = np.exp(best.x)
+        return cls(X_all, y_all, params[:n_dim], params[n_dim],
+                   params[n_dim + 1])
+
+    def predict(self, X, return_std=False):
+        """
+        Mean [n] (and standard deviation [n] if `return_std`) of the process
+        at `X` [n, n_dim]
+        """
+        scaled = np.atleast_2d(np.asarray(X, dtype=float)) / \
+            self.length_scales
+        k = self._covariance(scaled, self._scaled)
+        mean = self.y_mean + self.y_std * k.dot(self.alpha)
+        if not return_std:
+            return mean
+        v = linalg.cho_solve(self._cholesky, k.T)
+        variance = self.amplitude ** 2 - (k * v.T).sum(axis=1)
+        return mean, self.y_std * np.sqrt(np.maximum(variance, 0.))
+
+    def __call__(self, x):
+        """Mean of the process at the point `x` [n_dim] (float)"""
+        d = self._scaled - x * self._inverse_scales
+        return self.y_mean + \
+            np.exp(-.5 * np.einsum("ij,ij->i", d, d)).dot(self._weights)
+
+
+# ---------------------------------------------------------------------------- #
+#                                   Emulator                                   #
+# ---------------------------------------------------------------------------- #
+class Accuracy(object):
+    """
+    Errors of an emulator against the model on test runs
+
+    errors: dict
+        quantity -> (RMSE, maximum absolute error, median relative error, R^2)
+    n_test: int
+    """
+    def __init__(self, errors, n_test):
+        self.errors = errors
+        self.n_test = n_test
+
+    def __repr__(self):
+        return "{}(n_test={})".format(self.__class__.__name__, self.n_test)
+
+    def __str__(self):
+        lines = ["{:<12} {:>12} {:>12} {:>12} {:>8}   ({:d} test runs)"
+                 "".format("", "RMSE", "max error", "median rel.", "R^2",
+                           self.n_test)]
+        for quantity, (rmse, max_error, relative, r2) in self.errors.items():
+            lines.append("{:<12} {:>12.4g} {:>12.4g} {:>11.2%} {:>8.4f}"
+                         "".format(quantity, rmse, max_error, relative, r2))
+        return os.linesep.join(lines)
+
+
+class Emulator(object):
+    """
+    Gaussian processes, one per quantity, regressing the quantities of runs
+    on their parameters (rescaled to [0, 1] within `bounds`)
+
+    Parameters
+    ----------
+    bounds: dict
+        name -> (low, high) of each parameter
+    processes: dict
+        quantity -> `GaussianProcess`
+    """
+    def __init__(self, bounds, processes):
+        self.bounds = bounds
+        self.names = tuple(bounds)
+        self.processes = processes
+        self._low = np.array([bounds[name][0] for name in self.names],
+                             dtype=float)
+        self._width = np.array([bounds[name][1] - bounds[name][0]
+                                for name in self.names], dtype=float)
+        self._inverse_width = 1. / self._width
+
+    def __repr__(self):
+        return "{}(bounds={}, quantities={})" \
+               "".format(self.__class__.__name__, repr(self.bounds),
+                         repr(tuple(self.processes)))
+
+    def _scale(self, theta):
+        return (theta - self._low) / self._width
+
+    def sample(self, n, random_state=None):
+        """`n` sets of parameters [n, n_dim] spread over `bounds`"""
+        return self._low + self._width * latin_hypercube(n, len(self.names),
+                                                         random_state)
+
+    @classmethod
+    def train(cls, runs, bounds, n_runs=1024, quantities=QUANTITIES,
+              random_state=None):
+        """
+        Emulator of the `quantities` of `runs` (`ConfinementRuns`), trained
+        on `n_runs` runs spread over `bounds` (the Latin hypercube being
+        shuffled, the hyperparameters are fitted on a representative subset)
+        """
+        emulator = cls(bounds, {})
+        theta = emulator.sample(n_runs, random_state)
+        with profiling.timer("Emulator.runs"):
+            simulated = runs(dict(zip(emulator.names, theta.T)))
+        X = emulator._scale(theta)
+        for quantity in quantities:
+            y = simulated[quantity]
+            if quantity in _LOG_QUANTITIES:
+                y = np.log(y)
+            emulator.processes[quantity] = GaussianProcess.fit(X, y)
+        return emulator
+
+    def predict(self, theta, quantity, return_std=False):
+        """
+        Emulated `quantity` [n] (and standard deviation [n] of the
+        regression, in log scale for "peak" and "total", if `return_std`)
+        for each row of `theta` [n, n_dim]
+        """
+        process = self.processes[quantity]
+        result = process.predict(self._scale(np.atleast_2d(theta)),
+                                 return_std)
+        mean = result[0] if return_std else result
+        if quantity in _LOG_QUANTITIES:
+            mean = np.exp(mean)
+        return (mean, result[1]) if return_std else mean
+
+    def query(self, quantity, **values):
+        """Emulated `quantity` for one set of parameters (float)"""
+        x = (np.array([values[name] for name in self.names]) - self._low) * \
+            self._inverse_width
+        y = self.processes[quantity](x)
+        return float(np.exp(y) if quantity in _LOG_QUANTITIES else y)
+
+    def accuracy(self, runs, n_runs=100, random_state=None):
+        """
+        `Accuracy` of the emulator against `runs` (`ConfinementRuns`) on
+        `n_runs` new runs
+        """
+        if not isinstance(random_state, np.random.RandomState):
+            random_state = np.random.RandomState(random_state)
+        theta = self.sample(n_runs, random_state)
+        simulated = runs(dict(zip(self.names, theta.T)))
+        errors = {}
+        for quantity in self.processes:
+            truth = simulated[quantity]
+            error = self.predict(theta, quantity) - truth
+            with np.errstate(divide="ignore", invalid="ignore"):
+                relative = np.abs(error) / np.abs(truth)
+            errors[quantity] = (
+                float(np.sqrt((error ** 2).mean())),
+                float(np.abs(error).max()),
+                float(np.nanmedian(relative)),
+                float(1 - (error ** 2).sum() /
+                      ((truth - truth.mean()) ** 2).sum()),
+            )
+        return Accuracy(errors, n_runs)
+
+    # ------------------------------------------------------------- Persistence
+    def save(self, path):
+        """Save the emulator (`.npz`)"""
+        content = {"names": np.array(self.names, dtype=str),
+                   "bounds": np.array([self.bounds[name]
+                                       for name in self.names], dtype=float),
+                   "quantities": np.array(tuple(self.processes), dtype=str)}
+        for quantity, process in self.processes.items():
+            content[quantity + ".X"] = process.X
+            content[quantity + ".y"] = process.y
+            content[quantity + ".params"] = np.concatenate(
+                [process.length_scales, [process.amplitude, process.noise]])
+        np.savez(path, **content)
+        return self
+
+    @classmethod
+    def load(cls, path):
+        """The emulator saved at `path`"""
+        with np.load(path) as data:
+            bounds = {str(name): tuple(float(b) for b in bound)
+                      for name, bound in zip(data["names"], data["bounds"])}
+            processes = {}
+            for quantity in data["quantities"]:
+                quantity = str(quantity)
+                params = data[quantity + ".params"]
+                processes[quantity] = GaussianProcess(
+                    data[quantity + ".X"], data[quantity + ".y"], params[:-2],
+                    params[-2], params[-1])
+        return cls(bounds, processes)
@@ -0,0 +1,163 @@
+"""
+Steady states of the models.
+
+Instead of simulating years to reach the endemic regime, the equilibria are
+found directly by Newton's method on the right-hand side of the dynamic,
+the conserved quantities (e.g. the population) being kept at their initial
+value:
+
+    equilibrium = model.steady_state()
+    equilibrium.state           # `State` at the equilibrium
+    equilibrium.stable          # from the eigenvalues of the Jacobian
+
+The Jacobian is computed by complex-step differentiation (the right-hand
+sides only use arithmetic), which is exact up to rounding.
+"""
+import numpy as np
+
+
+class Equilibrium(object):
+    """
+    Attributes
+    ----------
+    variables: np.ndarray [n_variables]
+        The equilibrium
+    jacobian: np.ndarray [n_variables, n_variables]
+    eigenvalues: np.ndarray
+        Eigenvalues of the Jacobian restricted to the directions in which
+        the state can move (the conserved quantities are excluded)
+    residual: float
+        Norm of the right-hand side at `variables`
+    n_iterations: int
+    state: `State` or None
+        The equilibrium as a state (set by `Model.steady_state`)
+    """
+    def __init__(self, variables, jacobian, eigenvalues, residual,
+                 n_iterations, state=None):
+        self.variables = variables
+        self.jacobian = jacobian
+        self.eigenvalues = eigenvalues
+        self.residual = residual
+        self.n_iterations = n_iterations
+        self.state = state
+
+    @property
+    def stable(self):
+        """Whether the equilibrium is (linearly) asymptotically stable"""
+        return bool(np.all(self.eigenvalues.real < 0))
+
+    @property
+    def feasible(self):
+        """Whether no compartment is negative"""
+        scale = max(np.abs(self.variables).max(), 1.)
+        return bool(np.all(self.variables >= -1e-9 * scale))
+
+    @property
+    def growth_rate(self):
+        """Largest real part of the eigenvalues (per day)"""
+        return float(np.max(self.eigenvalues.real))
+
+    def __repr__(self):
+        return "{}({}, stable={}, feasible={}, residual={:.2e}, " \
+               "n_iterations={})".format(self.__class__.__name__,
+                                         repr(self.variables), self.stable,
+                                         self.feasible, self.residual,
+                                         self.n_iterations)
+
+
+def jacobian(rhs, x, h=1e-30):
+    """
+    Jacobian of `rhs` (a function of an array [n] or [n, m] returning an
+    array of the same shape) at `x` by complex step: all the columns are
+    evaluated in one batched call.
+    """
+    x = np.asarray(x, dtype=float)
+    n = len(x)
+    X = x[:, np.newaxis] + 1j * h * np.eye(n)
+    return np.asarray(rhs(X)).imag / h
+
+
+def conservation_laws(stoichiometry, tol=1e-10):
+    """
+    Orthonormal basis (rows) of the quantities `w . x` left unchanged by the
+    dynamic, i.e. of the left null space of `stoichiometry` (whose columns
+    span the directions of `dx/dt`).
+    """
+    S = np.asarray(stoichiometry, dtype=float)
+    U, s, _ = np.linalg.svd(S)
+    rank = int(np.sum(s > tol * max(1., s.max() if len(s) > 0 else 0.)))
+    return U[:, rank:].T
+
+
+def find_equilibrium(rhs, x0, stoichiometry, tol=1e-10, max_iter=50):
+    """
+    Equilibrium of `dx/dt = rhs(x)` with the same conserved quantities as
+    `x0`, by (Gauss-)Newton iterations starting from `x0`.
+
+    tol: float
+        Stop when the norm of `rhs` is below `tol` times the norm of `x`
+
+    Raise
+    -----
+    ValueError if the iterations do not converge
+    """
+    x = np.array(x0, dtype=float)
+    W = conservation_laws(stoichiometry)
+    conserved = W.dot(x)
+    scale = max(np.linalg.norm(x), 1.)
+
+    residual = np.inf
+    for iteration in range(1, max_iter + 1):
+        F = np.asarray(rhs(x), dtype=float)
+        residual = np.linalg.norm(F)
+        if residual <= tol * scale:
+            break
+        J = jacobian(rhs, x)
+        # The conservation laws make the system square (and regular)
+        A = np.vstack([J, W])
+        b = -np.concatenate([F, W.dot(x) - conserved])
+        x = x + np.linalg.lstsq(A, b, rcond=None)[0]
+    else:
+        raise ValueError("Newton did not converge in {} iterations "
+                         "(residual {:.2e})".format(max_iter, residual))
+
+    J = jacobian(rhs, x)
+    # Restriction of the Jacobian to the space where the state moves
+    Q = conservation_laws(W.T).T if len(W) > 0 else np.eye(len(x))
+    eigenvalues = np.linalg.eigvals(Q.T.dot(J).dot(Q))
+    return Equilibrium(x, J, eigenvalues, residual, iteration - 1)
+
+
+# ---------------------------------------------------------------------------- #
+#                                 Closed forms                                 #
+# ---------------------------------------------------------------------------- #
+def seirs_endemic_equilibrium(N, beta, kappa, gamma, ksi):
+    """
+    (S, E, I, R) at the endemic equilibrium of SEIRS, where the infections
+    balance the recoveries (`S = N / R_0`) and the losses of immunity. None
+    if there is none (`R_0 <= 1` or lasting immunity).
+    """
+    if ksi <= 0 or kappa <= 0 or beta <= gamma:
+        return None
+    S = N * gamma / beta
+    I = (N - S) / (1. + gamma / kappa + gamma / ksi)
+    return S, gamma / kappa * I, I, gamma / ksi * I
+
+
+def final_susceptible(S, R, N, reproduction_number):
+    """
+    Number of susceptible individuals left at the end of an epidemic without
+    loss of immunity (SIR, SEIR), starting from `S` susceptible and `R`
+    recovered among `N`:
+
+        S_inf = S exp(-R_0 (N - R - S_inf) / N)
+
+    whose solution is given by the Lambert W function.
+    """
+    # Imported here: scipy is slow to import, and `model` imports this module
+    from scipy.special import lambertw
+    r0 = reproduction_number
+    if r0 <= 0:
+        return S
+    w = lambertw(-r0 * S / N * np.exp(-r0 * (N - R) / N))
+    return float(-N / r0 * w.real)
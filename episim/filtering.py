@@ -0,0 +1,231 @@
+"""
+Sequential Monte Carlo (particle filter) nowcasting.
+
+The particles are copies of a kernel model (e.g. `SEIRS`) whose state and
+transmission parameter `beta` differ. They are propagated together, as one
+array per variable, by the fused kernel; each day, they are weighted by the
+likelihood of the number of reported cases and resampled when the weights
+degenerate:
+
+    pf = ParticleFilter(model, n_particles=10000, ascertainment=.2)
+    for n_cases in daily_cases:
+        pf.step(n_cases)
+        pf.quantiles("infectious", (.05, .5, .95))
+    outcome = pf.outcome()   # daily posterior means
+
+The transmission parameter follows a random walk (in log scale) so that its
+estimate can track changes of behavior.
+"""
+import datetime
+
+import numpy as np
+from scipy.special import gammaln
+
+from . import profiling
+from .data import State, Outcome
+
+
+def poisson_log_likelihood(n_cases, expected):
+    """log P(n_cases) for a Poisson distribution of mean `expected`"""
+    expected = np.maximum(expected, 1e-12)
+    return n_cases * np.log(expected) - expected - gammaln(n_cases + 1)
+
+
+def systematic_resampling(weights, random_state):
+    """Indices of the particles to keep (normalized `weights`)"""
+    n = len(weights)
+    positions = (random_state.random_sample() + np.arange(n)) / n
+    indices = np.searchsorted(np.cumsum(weights), positions)
+    return np.minimum(indices, n - 1)
+
+
+def weighted_quantiles(values, weights, q):
+    order = np.argsort(values)
+    cumulated = np.cumsum(weights[order])
+    cumulated /= cumulated[-1]
+    return np.interp(q, cumulated, values[order])
+
+
+class ParticleFilter(object):
+    """
+    Parameters
+    ----------
+    model: `Model`
+        Model on a `KernelSimulator` with a parameter named `parameter` and
+        an "n_infection" counter (e.g. `SEIRS`). Its current state and
+        parameters are the center of the prior.
+    n_particles: int
+    ascertainment: float
+        Fraction of the new infections which are reported as cases
+    parameter_spread: float
+        Standard deviation of the prior of the log of the parameter
+    state_spread: float
+        Standard deviation of the (log-normal) prior factor of each
+        non-susceptible compartment
+    volatility: float
+        Daily standard deviation of the random walk of the log-parameter
+    log_likelihood: callable or None
+        `log_likelihood(n_cases, expected_cases)` (vectorized over the
+        particles). Default: Poisson.
+    resample_threshold: float
+        Resample when the effective sample size falls below this fraction
+        of the number of particles
+    parameter: str
+        Name of the kernel parameter which is estimated
+    random_state: int, `np.random.RandomState` or None
+    """
+    def __init__(self, model, n_particles=10000, ascertainment=1.,
+                 parameter_spread=.2, state_spread=.5, volatility=.05,
+                 log_likelihood=None, resample_threshold=.5,
+                 parameter="beta", random_state=None):
+        if not isinstance(random_state, np.random.RandomState):
+            random_state = np.random.RandomState(random_state)
+        self.random_state = random_state
+        self.model = model
+        self.n_particles = n_particles
+        self.ascertainment = ascertainment
+        self.volatility = volatility
+        self.log_likelihood = poisson_log_likelihood \
+            if log_likelihood is None else log_likelihood
+        self.resample_threshold = resample_threshold
+
+        simulator = model.simulator
+        self.kernel = simulator.kernel
+        self.step_size = simulator.step_size
+        self.parameter = parameter
+        names = [p.name for p in self.kernel.parameters]
+        self._parameter_index = names.index(parameter)
+        self._infection_flows = [j for j, attribute in model.tracked
+                                 if attribute == "n_infection"]
+
+        # Prior
+        rs = random_state
+        n = n_particles
+        x0 = model._state2variables(model.current_state)
+        population = float(sum(x0))
+        x = [np.full(n, float(v)) for v in x0]
+        for i, name in enumerate(model.variable_names):
+            if name != "susceptible":
+                x[i] = x[i] * rs.lognormal(0, state_spread, n)
+        # Keep the population, the susceptible take the rest
+        susceptible = list(model.variable_names).index("susceptible")
+        x[susceptible] = population - sum(x[i] for i in range(len(x))
+                                          if i != susceptible)
+        self.x = np.array(x)
+        value = simulator.parameters[self._parameter_index]
+        self.theta = value * rs.lognormal(0, parameter_spread, n)
+        self._reference = value
+        self.log_weights = np.full(n, -np.log(n))
+        self.n_cases = np.zeros(n)
+        self.n_infection = np.full(n, float(model.current_state.n_infection
+                                            or 0))
+        self.date = model.current_state.date
+        self.history = [self.state()]
+
+    @property
+    def weights(self):
+        w = np.exp(self.log_weights - self.log_weights.max())
+        return w / w.sum()
+
+    @property
+    def effective_sample_size(self):
+        w = self.weights
+        return 1. / np.sum(w ** 2)
+
+    def _parameters(self):
+        p = list(self.model.simulator.parameters)
+        p[self._parameter_index] = self.theta
+        return tuple(p)
+
+    def predict(self):
+        """Propagate the particles by one day"""
+        with profiling.timer("ParticleFilter.predict"):
+            n_steps = int(1. / self.step_size)
+            if self.volatility > 0:
+                self.theta = self.theta * self.random_state.lognormal(
+                    0, self.volatility, self.n_particles)
+            zeros = (0.,) * self.kernel.n_flows
+            x, acc = self.kernel.integrate(tuple(self.x), zeros,
+                                           self._parameters(),
+                                           self.step_size, n_steps)
+            self.x = np.array(x)
+            n_infection = sum(acc[j] for j in self._infection_flows)
+            self.n_infection = self.n_infection + n_infection
+            self.n_cases = self.ascertainment * n_infection
+            self.date += datetime.timedelta(days=1)
+        return self
+
+    def update(self, n_cases):
+        """Weight the particles by the likelihood of `n_cases`"""
+        with profiling.timer("ParticleFilter.update"):
+            self.log_weights = self.log_weights + \
+                self.log_likelihood(n_cases, self.n_cases)
+            self.log_weights -= self.log_weights.max()
+            if self.effective_sample_size < \
+                    self.resample_threshold * self.n_particles:
+                self.resample()
+        return self
+
+    def resample(self):
+        indices = systematic_resampling(self.weights, self.random_state)
+        self.x = self.x[:, indices]
+        self.theta = self.theta[indices]
+        self.n_cases = self.n_cases[indices]
+        self.n_infection = self.n_infection[indices]
+        self.log_weights = np.full(self.n_particles, -np.log(self.n_particles))
+        profiling.count("ParticleFilter.resample")
+        return self
+
+    def step(self, n_cases):
+        """Assimilate the number of cases of the next day"""
+        self.predict().update(n_cases)
+        self.history.append(self.state())
+        return self
+
+    def filter(self, daily_cases):
+        for n_cases in daily_cases:
+            self.step(n_cases)
+        return self
+
+    # ------------------------------------------------------------- Estimates
+    def values(self, name):
+        """
+        Value of `name` per particle: a variable, the parameter, "n_cases",
+        "n_infection" or "reproduction_number" (assumed proportional to the
+        parameter)
+        """
+        if name == self.parameter:
+            return self.theta
+        if name == "n_cases":
+            return self.n_cases
+        if name == "n_infection":
+            return self.n_infection
+        if name == "reproduction_number":
+            names = list(self.model.variable_names)
+            R = self.model._compute_reproduction_number(
+                self.x[names.index("susceptible")], self.x.sum(axis=0))
+            return R * self.theta / self._reference
+        return self.x[list(self.model.variable_names).index(name)]
+
+    def mean(self, name):
+        return float(np.dot(self.weights, self.values(name)))
+
+    def quantiles(self, name, q):
+        return weighted_quantiles(self.values(name), self.weights, q)
+
+    def state(self):
+        """`State` of the posterior means"""
+        state = State(self.date)
+        for name in self.model.variable_names:
+            setattr(state, name, self.mean(name))
+        setattr(state, self.parameter, self.mean(self.parameter))
+        for name in "n_cases", "n_infection", "reproduction_number":
+            setattr(state, name, self.mean(name))
+        return state
+
+    def outcome(self, description="Particle filter"):
+        """`Outcome` of the daily posterior means"""
+        outcome = Outcome(list(self.history), self.history[0].date,
+                          description, self.model.ontology)
+        outcome.name = "Nowcast"
+        return outcome
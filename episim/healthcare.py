@@ -0,0 +1,224 @@
+"""
+Load of the healthcare system: hospital admissions, bed occupancy and ICU
+demand derived from the daily infections of outcomes.
+
+Each quantity is the daily incidence convolved with a kernel combining the
+probabilities (of hospitalization, of intensive care) and the distributions
+of the delays and lengths of stay. All the kernels are applied at once in
+the Fourier domain, the incidences of an ensemble being transformed
+together:
+
+    healthcare = HealthcareLoad(p_hospitalization=.03, beds=5000,
+                                icu_beds=600)
+    load = healthcare.of(outcomes)  # Outcome, Ensemble or list of them
+    load.occupancy                  # [n_outcomes, n_steps]
+    load.over_capacity("icu").any(axis=1)
+"""
+import numpy as np
+from scipy import fft, stats
+
+from . import profiling
+from .data import Ensemble
+
+
+def _add(*kernels):
+    """Sum of kernels of different lengths (zero-padded)"""
+    total = np.zeros(max(len(k) for k in kernels))
+    for kernel in kernels:
+        total[:len(kernel)] += kernel
+    return total
+
+
+class Delay(object):
+    """
+    Duration (days) following a gamma distribution of mean `mean` (an
+    Erlang distribution if `shape` is an integer), rounded to the day
+
+    max_days: int or None
+        Support of the discretized distribution (by default, up to the
+        quantile 1 - 1e-6)
+    """
+    def __init__(self, mean, shape=2., max_days=None):
+        self.mean = mean
+        self.shape = shape
+        if max_days is None:
+            max_days = int(np.ceil(stats.gamma.ppf(1 - 1e-6, shape,
+                                                   scale=mean / shape)))
+        self.max_days = max_days
+
+    def __repr__(self):
+        return "{}(mean={}, shape={}, max_days={})" \
+               "".format(self.__class__.__name__, repr(self.mean),
+                         repr(self.shape), repr(self.max_days))
+
+    def _cdf(self, x):
+        return stats.gamma.cdf(x, self.shape, scale=self.mean / self.shape)
+
+    def pmf(self):
+        """Probability of each duration 0, ..., `max_days` (array)"""
+        days = np.arange(self.max_days + 1)
+        pmf = np.diff(self._cdf(np.concatenate([[0.], days + .5])))
+        return pmf / pmf.sum()
+
+    def survival(self):
+        """
+        Probability of a stay lasting more than 0, ..., `max_days` days, i.e.
+        of still being there after that many days (array)
+        """
+        return 1. - np.cumsum(self.pmf())
+
+
+class HealthcareLoad(object):
+    """
+    Infected individuals are hospitalized with probability
+    `p_hospitalization`, after `admission_delay` (from the infection). A
+    fraction `p_icu` of the admissions are transferred to intensive care
+    after `icu_delay` and stay there for `icu_stay`; the others stay in a
+    general ward for `hospital_stay`.
+
+    p_hospitalization, p_icu: float
+    admission_delay, hospital_stay, icu_delay, icu_stay: `Delay`
+    beds, icu_beds: float or None
+        Capacities (general wards, intensive care), if known
+    """
+    def __init__(self, p_hospitalization=.03, p_icu=.25,
+                 admission_delay=None, hospital_stay=None, icu_delay=None,
+                 icu_stay=None, beds=None, icu_beds=None):
+        self.p_hospitalization = p_hospitalization
+        self.p_icu = p_icu
+        self.admission_delay = Delay(10, 4) if admission_delay is None \
+            else admission_delay
+        self.hospital_stay = Delay(8) if hospital_stay is None \
+            else hospital_stay
+        self.icu_delay = Delay(2) if icu_delay is None else icu_delay
+        self.icu_stay = Delay(12) if icu_stay is None else icu_stay
+        self.beds = beds
+        self.icu_beds = icu_beds
+        self.kernels = self._kernels()
+        self._spectra = {}
+
+    def __repr__(self):
+        return "{}(p_hospitalization={}, p_icu={}, admission_delay={}, " \
+               "hospital_stay={}, icu_delay={}, icu_stay={}, beds={}, " \
+               "icu_beds={})".format(self.__class__.__name__,
+                                     repr(self.p_hospitalization),
+                                     repr(self.p_icu),
+                                     repr(self.admission_delay),
+                                     repr(self.hospital_stay),
+                                     repr(self.icu_delay),
+                                     repr(self.icu_stay), repr(self.beds),
+                                     repr(self.icu_beds))
+
+    def _kernels(self):
+        """
+        Kernels (in the order of `Load.FIELDS`) turning the daily infections
+        into each quantity
+        """
+        convolve = np.convolve
+        p_hosp, p_icu = self.p_hospitalization, self.p_icu
+        admission = self.admission_delay.pmf()
+        transfer = convolve(admission, self.icu_delay.pmf())
+        admissions = p_hosp * admission
+        icu_admissions = p_hosp * p_icu * transfer
+        # ICU patients occupy a ward bed until their transfer
+        ward = p_hosp * _add(
+            (1 - p_icu) * convolve(admission, self.hospital_stay.survival()),
+            p_icu * convolve(admission, self.icu_delay.survival()))
+        icu = convolve(icu_admissions, self.icu_stay.survival())
+        return [admissions, icu_admissions, ward, icu]
+
+    @profiling.timed("HealthcareLoad")
+    def __call__(self, incidence):
+        """
+        `Load` from the daily infections `incidence`: array [n_steps] or
+        [n_outcomes, n_steps]. NaN (e.g. after the end of a shorter outcome
+        of an ensemble) count as no infection, the load being NaN there.
+        """
+        incidence = np.asarray(incidence, dtype=float)
+        missing = np.isnan(incidence)
+        n_steps = incidence.shape[-1]
+        size = fft.next_fast_len(n_steps + max(len(k) for k in self.kernels)
+                                 - 1, real=True)
+
+        with profiling.timer("HealthcareLoad.fft"):
+            spectrum = fft.rfft(np.where(missing, 0., incidence), size)
+            kernels = self._spectra.get(size)
+            if kernels is None:
+                kernels = np.array([fft.rfft(k, size) for k in self.kernels])
+                self._spectra[size] = kernels
+            # [..., n_fields, size // 2 + 1]
+            convolved = fft.irfft(spectrum[..., np.newaxis, :] * kernels,
+                                  size)[..., :n_steps]
+        # The round-off of the transforms may leave tiny negative values
+        convolved = np.maximum(convolved, 0.)
+        convolved[np.broadcast_to(missing[..., np.newaxis, :],
+                                  convolved.shape)] = np.nan
+        return Load(*np.moveaxis(convolved, -2, 0), beds=self.beds,
+                    icu_beds=self.icu_beds)
+
+    def of(self, outcomes, field="n_infection"):
+        """
+        `Load` of an `Outcome` (arrays [n_steps]) or of an `Ensemble` /
+        sequence of outcomes (arrays [n_outcomes, n_steps]), the daily
+        infections being the increments of the counter `field`
+        """
+        if hasattr(outcomes, "daily"):
+            return self(outcomes.daily(field))
+        if not isinstance(outcomes, Ensemble):
+            outcomes = Ensemble(outcomes)
+        values = outcomes.column(field)
+        return self(np.diff(values, axis=-1, prepend=values[..., :1]))
+
+
+class Load(object):
+    """
+    Daily load of the healthcare system (arrays of the shape of the
+    incidence)
+
+    admissions, icu_admissions: array
+        New patients in hospital, in intensive care
+    ward, icu: array
+        Occupied beds in general wards, in intensive care
+    beds, icu_beds: float or None
+        Capacities
+    """
+    FIELDS = ("admissions", "icu_admissions", "ward", "icu")
+
+    def __init__(self, admissions, icu_admissions, ward, icu, beds=None,
+                 icu_beds=None):
+        self.admissions = admissions
+        self.icu_admissions = icu_admissions
+        self.ward = ward
+        self.icu = icu
+        self.beds = beds
+        self.icu_beds = icu_beds
+
+    def __repr__(self):
+        return "{}(shape={}, beds={}, icu_beds={})" \
+               "".format(self.__class__.__name__, self.admissions.shape,
+                         repr(self.beds), repr(self.icu_beds))
+
+    @property
+    def occupancy(self):
+        """Occupied hospital beds (general wards and intensive care)"""
+        return self.ward + self.icu
+
+    def capacity(self, field):
+        """Capacity against which `field` ("ward", "icu", ...) is compared"""
+        if field == "icu":
+            return self.icu_beds
+        if field in ("ward", "occupancy"):
+            return self.beds
+        raise ValueError("No capacity for '{}'".format(field))
+
+    def over_capacity(self, field="occupancy"):
+        """Boolean array of the days where `field` exceeds its capacity"""
+        capacity = self.capacity(field)
+        if capacity is None:
+            raise ValueError("Unknown capacity for '{}'".format(field))
+        with np.errstate(invalid="ignore"):
+            return getattr(self, field) > capacity
+
+    def peak(self, field="occupancy"):
+        """Maximum of `field` over time (per outcome)"""
+        return np.nanmax(getattr(self, field), axis=-1)
@@ -0,0 +1,479 @@
+"""
+Bayesian inference of the parameters of the virus.
+
+The posterior of some parameters of `SEIRS` (e.g. the reproduction number
+and the rate of loss of immunity) given the daily number of reported cases
+is sampled by an ensemble (affine-invariant) MCMC. The likelihoods of all
+the proposals of a move are evaluated by one batched integration of the
+fused kernel, one column per walker:
+
+    likelihood = CaseLikelihood(model, daily_cases,
+                                ("R_0", "immunity_drop_rate"))
+    posterior = Posterior({"R_0": Uniform(1, 6),
+                           "immunity_drop_rate": Uniform(0, .01)},
+                          likelihood)
+    sampler = EnsembleSampler(posterior, posterior.sample_prior(64))
+    sampler.run(2000, checkpoint="chains.npz")
+    sampler.diagnostics(burn=500)   # R-hat and ESS per parameter
+
+Reporting delays, weekday effects and overdispersion are accounted for by
+an observation model (see `observation.ReportedCases`):
+
+    CaseLikelihood(model, daily_cases, ("R_0",), observation=reporting)
+
+An interrupted run is resumed with `EnsembleSampler.load(path, posterior)`.
+"""
+import datetime
+import os
+
+import numpy as np
+
+from . import profiling
+from .filtering import poisson_log_likelihood
+
+
+# ---------------------------------------------------------------------------- #
+#                                    Priors                                    #
+# ---------------------------------------------------------------------------- #
+class Uniform(object):
+    def __init__(self, low, high):
+        self.low = low
+        self.high = high
+
+    def __repr__(self):
+        return "{}({}, {})".format(self.__class__.__name__, repr(self.low),
+                                   repr(self.high))
+
+    def log_pdf(self, values):
+        inside = (values >= self.low) & (values <= self.high)
+        return np.where(inside, -np.log(self.high - self.low), -np.inf)
+
+    def sample(self, n, random_state):
+        return random_state.uniform(self.low, self.high, n)
+
+
+class Normal(object):
+    def __init__(self, mean, std):
+        self.mean = mean
+        self.std = std
+
+    def __repr__(self):
+        return "{}({}, {})".format(self.__class__.__name__, repr(self.mean),
+                                   repr(self.std))
+
+    def log_pdf(self, values):
+        z = (values - self.mean) / self.std
+        return -.5 * z ** 2 - np.log(self.std * np.sqrt(2 * np.pi))
+
+    def sample(self, n, random_state):
+        return random_state.normal(self.mean, self.std, n)
+
+
+# ---------------------------------------------------------------------------- #
+#                                  Likelihood                                  #
+# ---------------------------------------------------------------------------- #
+def seirs_parameters(values, reference):
+    """
+    Parameters (beta, kappa, gamma, ksi) of `SEIRS` from those of the virus.
+
+    values: dict
+        name -> array [n] among the kernel parameters ("beta", "kappa",
+        "gamma", "ksi") and "R_0" (`beta / gamma`), "exposed_duration",
+        "infectious_duration", "immunity_drop_rate". The missing ones keep
+        their value in `reference`.
+    reference: tuple
+        The parameters of the model
+    """
+    beta, kappa, gamma, ksi = (values.get(name, ref) for name, ref in
+                               zip(("beta", "kappa", "gamma", "ksi"),
+                                   reference))
+    if "exposed_duration" in values:
+        kappa = 1. / values["exposed_duration"]
+    if "infectious_duration" in values:
+        gamma = 1. / values["infectious_duration"]
+    if "immunity_drop_rate" in values:
+        ksi = values["immunity_drop_rate"]
+    if "R_0" in values:
+        beta = values["R_0"] * gamma
+    return beta, kappa, gamma, ksi
+
+
+class CaseLikelihood(object):
+    """
+    Log-likelihood of the daily number of reported cases, for many values of
+    the parameters at once.
+
+    Parameters
+    ----------
+    model: `Model`
+        Model on a `KernelSimulator` with an "n_infection" counter (e.g.
+        `SEIRS`), set to the state of the first day
+    daily_cases: array-like [n_days]
+        Number of cases reported on each of the following days (NaN when
+        unknown)
+    names: sequence of str
+        Names of the inferred parameters (see `parametrization`)
+    ascertainment: float
+        Fraction of the new infections which are reported as cases
+    log_likelihood: callable or None
+        `log_likelihood(n_cases, expected_cases)` (vectorized over the
+        walkers). Default: that of `observation` if any, else Poisson.
+    parametrization: callable
+        `parametrization(values, reference)` returns the parameters of the
+        kernel, `values` mapping the names to arrays (see `seirs_parameters`)
+    observation: `observation.ReportedCases` or None
+        Observation model turning the simulated infections (times
+        `ascertainment`) into the expected reported cases. Its own
+        ascertainment applies on top, so only one of them may differ from 1.
+    """
+    def __init__(self, model, daily_cases, names, ascertainment=1.,
+                 log_likelihood=None, parametrization=seirs_parameters,
+                 observation=None):
+        if observation is not None and np.any(ascertainment != 1.) and \
+                np.any(np.asarray(observation.ascertainment) != 1.):
+            raise ValueError("The ascertainment is given both to the "
+                             "likelihood ({}) and to the observation model "
+                             "({})".format(ascertainment,
+                                           observation.ascertainment))
+        self.model = model
+        self.daily_cases = np.asarray(daily_cases, dtype=float)
+        self.names = tuple(names)
+        self.ascertainment = ascertainment
+        if log_likelihood is None:
+            log_likelihood = poisson_log_likelihood if observation is None \
+                else observation.log_pmf
+        self.log_likelihood = log_likelihood
+        self.parametrization = parametrization
+        self.observation = observation
+
+        simulator = model.simulator
+        self.kernel = simulator.kernel
+        self.step_size = simulator.step_size
+        self.reference = tuple(float(p) for p in simulator.parameters)
+        self.x0 = tuple(float(v) for v in
+                        model._state2variables(model.current_state))
+        self._infection_flows = [j for j, attribute in model.tracked
+                                 if attribute == "n_infection"]
+
+    @property
+    def n_dim(self):
+        return len(self.names)
+
+    def simulate(self, theta):
+        """
+        Expected number of cases per day for each row of `theta`
+        [n, n_dim].
+
+        Return
+        ------
+        expected: np.ndarray [n_days, n]
+        """
+        theta = np.atleast_2d(theta)
+        n = len(theta)
+        values = {name: theta[:, i] for i, name in enumerate(self.names)}
+        p = tuple(np.broadcast_to(np.asarray(q, dtype=float), (n,))
+                  for q in self.parametrization(values, self.reference))
+        x = tuple(np.full(n, v) for v in self.x0)
+        zeros = (0.,) * self.kernel.n_flows
+        n_steps = int(1. / self.step_size)
+        expected = np.empty((len(self.daily_cases), n))
+        with profiling.timer("CaseLikelihood.simulate"):
+            for day in range(len(self.daily_cases)):
+                x, acc = self.kernel.integrate(x, zeros, p, self.step_size,
+                                               n_steps)
+                expected[day] = self.ascertainment * \
+                    sum(acc[j] for j in self._infection_flows)
+        if self.observation is not None:
+            first_day = self.model.current_state.date + \
+                datetime.timedelta(days=1)
+            expected = self.observation.expected(expected.T, first_day).T
+        profiling.count("CaseLikelihood.walkers", n)
+        return expected
+
+    def __call__(self, theta):
+        """Log-likelihood [n] of each row of `theta` [n, n_dim]"""
+        expected = self.simulate(theta)
+        known = ~np.isnan(self.daily_cases)
+        cases = self.daily_cases[known][:, np.newaxis]
+        log_l = self.log_likelihood(cases, expected[known]).sum(axis=0)
+        return np.where(np.isfinite(log_l), log_l, -np.inf)
+
+
+class Posterior(object):
+    """
+    Unnormalized log-posterior, vectorized over the walkers.
+
+    priors: dict
+        name -> prior (with `log_pdf` and `sample`), in the order of
+        `likelihood.names`
+    likelihood: callable
+        `likelihood(theta [n, n_dim]) -> [n]`, with a `names` attribute
+    """
+    def __init__(self, priors, likelihood):
+        self.priors = [priors[name] for name in likelihood.names]
+        self.likelihood = likelihood
+
+    @property
+    def names(self):
+        return self.likelihood.names
+
+    @property
+    def n_dim(self):
+        return len(self.priors)
+
+    def log_prior(self, theta):
+        return sum(prior.log_pdf(theta[:, i])
+                   for i, prior in enumerate(self.priors))
+
+    def sample_prior(self, n, random_state=None):
+        """Initial positions [n, n_dim] of `n` walkers"""
+        if not isinstance(random_state, np.random.RandomState):
+            random_state = np.random.RandomState(random_state)
+        return np.column_stack([prior.sample(n, random_state)
+                                for prior in self.priors])
+
+    def __call__(self, theta):
+        theta = np.atleast_2d(theta)
+        log_p = np.asarray(self.log_prior(theta), dtype=float)
+        # The walkers out of the support are not simulated
+        inside = np.isfinite(log_p)
+        if inside.any():
+            log_p[inside] += self.likelihood(theta[inside])
+        return log_p
+
+
+# ---------------------------------------------------------------------------- #
+#                                    Sampler                                   #
+# ---------------------------------------------------------------------------- #
+class EnsembleSampler(object):
+    """
+    Affine-invariant ensemble sampler (stretch move of Goodman & Weare). The
+    walkers are split in two halves, each one moved with respect to the
+    other, so that the proposals of a half are evaluated in one call of
+    `log_probability`.
+
+    Parameters
+    ----------
+    log_probability: callable
+        `log_probability(theta [n, n_dim]) -> [n]` (e.g. a `Posterior`)
+    initial: array-like [n_walkers, n_dim]
+        Initial positions (an even number of walkers, at least 2 n_dim)
+    a: float
+        Scale of the stretch move
+    random_state: int, `np.random.RandomState` or None
+    names: sequence of str or None
+        Names of the parameters (default: those of `log_probability`)
+    """
+    def __init__(self, log_probability, initial, a=2., random_state=None,
+                 names=None):
+        if not isinstance(random_state, np.random.RandomState):
+            random_state = np.random.RandomState(random_state)
+        self.random_state = random_state
+        self.log_probability = log_probability
+        self.a = a
+        if names is None:
+            names = getattr(log_probability, "names", None)
+        self.names = None if names is None else tuple(names)
+
+        self.position = np.array(initial, dtype=float)
+        n_walkers, n_dim = self.position.shape
+        if n_walkers % 2 != 0 or n_walkers < 2 * n_dim:
+            raise ValueError("The number of walkers must be even and at "
+                             "least twice the number of parameters, got {} "
+                             "for {}".format(n_walkers, n_dim))
+        self.log_prob = np.asarray(log_probability(self.position),
+                                   dtype=float)
+        self.n_accepted = np.zeros(n_walkers, dtype=int)
+        self._chain = []
+        self._log_probs = []
+
+    def __repr__(self):
+        return "{}(n_walkers={}, n_dim={}, n_iterations={}, names={})".format(
+            self.__class__.__name__, self.n_walkers, self.n_dim,
+            self.n_iterations, repr(self.names))
+
+    @property
+    def n_walkers(self):
+        return self.position.shape[0]
+
+    @property
+    def n_dim(self):
+        return self.position.shape[1]
+
+    @property
+    def n_iterations(self):
+        return len(self._chain)
+
+    @property
+    def chain(self):
+        """Positions [n_iterations, n_walkers, n_dim]"""
+        if len(self._chain) == 0:
+            return np.empty((0, self.n_walkers, self.n_dim))
+        return np.array(self._chain)
+
+    @property
+    def log_probs(self):
+        """Log-probabilities [n_iterations, n_walkers]"""
+        if len(self._log_probs) == 0:
+            return np.empty((0, self.n_walkers))
+        return np.array(self._log_probs)
+
+    @property
+    def acceptance_fraction(self):
+        return self.n_accepted / max(self.n_iterations, 1)
+
+    def _move(self, active, complement):
+        rs = self.random_state
+        n = len(active)
+        X = self.position[active]
+        z = ((self.a - 1.) * rs.random_sample(n) + 1.) ** 2 / self.a
+        partners = self.position[complement[rs.randint(len(complement),
+                                                       size=n)]]
+        proposal = partners + z[:, np.newaxis] * (X - partners)
+        log_prob = np.asarray(self.log_probability(proposal), dtype=float)
+        log_ratio = (self.n_dim - 1.) * np.log(z) + log_prob - \
+            self.log_prob[active]
+        accepted = np.log(rs.random_sample(n)) < log_ratio
+        self.position[active[accepted]] = proposal[accepted]
+        self.log_prob[active[accepted]] = log_prob[accepted]
+        self.n_accepted[active[accepted]] += 1
+
+    def step(self):
+        """Move all the walkers once"""
+        with profiling.timer("EnsembleSampler.step"):
+            half = self.n_walkers // 2
+            first = np.arange(half)
+            second = np.arange(half, self.n_walkers)
+            self._move(first, second)
+            self._move(second, first)
+        self._chain.append(self.position.copy())
+        self._log_probs.append(self.log_prob.copy())
+        return self
+
+    def run(self, n_iterations, checkpoint=None, checkpoint_every=100):
+        """
+        Perform `n_iterations` steps, saving the sampler to `checkpoint` (a
+        path) every `checkpoint_every` steps and at the end
+        """
+        for i in range(1, n_iterations + 1):
+            self.step()
+            if checkpoint is not None and (i % checkpoint_every == 0 or
+                                           i == n_iterations):
+                self.save(checkpoint)
+        return self
+
+    # ----------------------------------------------------------- Checkpoints
+    def save(self, path):
+        """Save the chains and the state of the sampler (`.npz`)"""
+        name, rs_keys, rs_pos, rs_has_gauss, rs_gauss = \
+            self.random_state.get_state()
+        names = () if self.names is None else self.names
+        # Written aside and then renamed: an interrupted save does not
+        # corrupt the previous checkpoint
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, chain=self.chain, log_probs=self.log_probs,
+                 position=self.position, log_prob=self.log_prob,
+                 n_accepted=self.n_accepted, a=self.a,
+                 names=np.array(names, dtype=str),
+                 rs_keys=rs_keys, rs_pos=rs_pos, rs_has_gauss=rs_has_gauss,
+                 rs_gauss=rs_gauss)
+        os.replace(tmp_path, path)
+        return self
+
+    @classmethod
+    def load(cls, path, log_probability):
+        """The sampler saved at `path`, ready to `run` further"""
+        with np.load(path) as data:
+            sampler = cls.__new__(cls)
+            sampler.log_probability = log_probability
+            sampler.a = float(data["a"])
+            names = tuple(str(name) for name in data["names"])
+            sampler.names = names if len(names) > 0 else None
+            sampler.position = data["position"].copy()
+            sampler.log_prob = data["log_prob"].copy()
+            sampler.n_accepted = data["n_accepted"].copy()
+            sampler._chain = list(data["chain"])
+            sampler._log_probs = list(data["log_probs"])
+            sampler.random_state = np.random.RandomState()
+            sampler.random_state.set_state(("MT19937", data["rs_keys"],
+                                            int(data["rs_pos"]),
+                                            int(data["rs_has_gauss"]),
+                                            float(data["rs_gauss"])))
+        return sampler
+
+    # ----------------------------------------------------------- Diagnostics
+    def samples(self, burn=0, thin=1):
+        """Samples [n, n_dim] pooled over the walkers"""
+        return self.chain[burn::thin].reshape(-1, self.n_dim)
+
+    def diagnostics(self, burn=0):
+        """
+        Return
+        ------
+        diagnostics: dict
+            name -> (mean, std, R-hat, ESS) of each parameter
+        """
+        chain = self.chain[burn:]
+        rhat = split_rhat(chain)
+        ess = effective_sample_size(chain)
+        flat = chain.reshape(-1, self.n_dim)
+        names = self.names if self.names is not None else \
+            ["theta{}".format(i) for i in range(self.n_dim)]
+        return {name: (float(flat[:, i].mean()), float(flat[:, i].std()),
+                       float(rhat[i]), float(ess[i]))
+                for i, name in enumerate(names)}
+
+
+# ---------------------------------------------------------------------------- #
+#                                  Diagnostics                                 #
+# ---------------------------------------------------------------------------- #
+def split_rhat(chain):
+    """
+    Split potential scale reduction factor (Gelman-Rubin) of each parameter
+    of `chain` [n_iterations, n_chains, n_dim]; close to 1 at convergence.
+    """
+    chain = np.asarray(chain, dtype=float)
+    half = len(chain) // 2
+    if half < 2:
+        return np.full(chain.shape[2], np.nan)
+    # Each chain split in two halves
+    chains = np.concatenate([chain[:half], chain[half:2 * half]], axis=1)
+    n = half
+    W = chains.var(axis=0, ddof=1).mean(axis=0)
+    B = n * chains.mean(axis=0).var(axis=0, ddof=1)
+    var = (n - 1.) / n * W + B / n
+    return np.sqrt(var / W)
+
+
+def autocorrelation(chain):
+    """
+    Normalized autocorrelation [n_iterations, n_dim] of `chain`
+    [n_iterations, n_chains, n_dim] (by FFT, averaged over the chains)
+    """
+    chain = np.asarray(chain, dtype=float)
+    n = len(chain)
+    x = chain - chain.mean(axis=0)
+    size = 2 ** int(np.ceil(np.log2(2 * n)))
+    f = np.fft.rfft(x, n=size, axis=0)
+    acf = np.fft.irfft(f * np.conjugate(f), n=size, axis=0)[:n].real
+    acf = acf.mean(axis=1)
+    return acf / np.where(acf[0] > 0, acf[0], 1.)
+
+
+def effective_sample_size(chain, c=5.):
+    """
+    Effective number of independent samples of each parameter of `chain`
+    [n_iterations, n_chains, n_dim]: the number of samples divided by the
+    integrated autocorrelation time, estimated over the window of Sokal
+    (the smallest `M >= c tau(M)`).
+    """
+    chain = np.asarray(chain, dtype=float)
+    n, n_chains = chain.shape[:2]
+    if n < 2:
+        return np.full(chain.shape[2], np.nan)
+    taus = 2. * np.cumsum(autocorrelation(chain), axis=0) - 1.
+    windows = np.arange(n)[:, np.newaxis] >= c * taus
+    # First window satisfying the criterion (the last one if none does)
+    m = np.where(windows.any(axis=0), np.argmax(windows, axis=0), n - 1)
+    tau = np.maximum(taus[m, np.arange(taus.shape[1])], 1.)
+    return n * n_chains / tau
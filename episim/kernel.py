@@ -0,0 +1,443 @@
+"""
+Fused kernels generated from symbolic flows.
+
+A compartmental dynamic is a set of flows `f_j(x, p)` (symbolic `Node`s)
+moving mass from a compartment to another (or from/to the outside). Instead
+of evaluating one node tree per variable and per step, `Kernel` generates
+(and compiles) straight-line Python code computing all the flows and all the
+derivatives at once, shared sub-expressions (named nodes such as `N`)
+being computed only once. The generated functions only use arithmetic, so
+they work with floats as well as with numpy arrays of any shape (e.g. one
+column per replicate).
+"""
+
+import warnings
+
+import numpy as np
+
+from . import profiling
+from .modeling import Function
+
+
+# "numpy": the generated code as such (floats or arrays), "numba": the
+# generated code JIT-compiled (floats only), "auto": numba if installed
+BACKENDS = ("numpy", "numba", "auto")
+
+
+def _numba():
+    """
+    The numba module, or None if it is not installed. It is only imported
+    when a backend asks for it, its import being slow (and that of `model`
+    having to stay cheap, e.g. for the process-pool workers).
+    """
+    try:
+        import numba
+    except ImportError:
+        return None
+    return numba
+
+
+def resolve_backend(backend):
+    """The backend to use for `backend`, falling back to numpy"""
+    if backend is None:
+        return "numpy"
+    if backend not in BACKENDS:
+        raise ValueError("Unknown backend '{}' (choose among {})"
+                         "".format(backend, ", ".join(BACKENDS)))
+    if backend == "numpy":
+        return backend
+    numba = _numba()
+    if backend == "auto":
+        return "numpy" if numba is None else "numba"
+    if numba is None:
+        warnings.warn("numba is not installed, falling back to numpy")
+        return "numpy"
+    return backend
+
+
+class Flow(object):
+    """
+    Transition from compartment `src` to compartment `dst` (indices of the
+    variables, or None for the outside) at rate `rate` (a `Node`).
+    """
+    def __init__(self, src, dst, rate, name=None):
+        self.src = src
+        self.dst = dst
+        self.rate = rate
+        self.name = name
+
+    def __repr__(self):
+        return "{}({}, {}, {}, name={})".format(self.__class__.__name__,
+                                                repr(self.src),
+                                                repr(self.dst),
+                                                repr(self.rate),
+                                                repr(self.name))
+
+
+class Kernel(object):
+    """
+    Parameters
+    ----------
+    variables: list of `Variable`
+        The state variables (`variable.index` is its position in the state)
+    parameters: list of `Parameter`
+        The parameters (`parameter.index` is its position in `p`)
+    flows: list of `Flow`
+
+    Attributes
+    ----------
+    rhs: callable
+        `rhs(x, p) -> (dx, f)`: derivatives and flows (tuples)
+    integrate: callable
+        `integrate(x, acc, p, h, n_steps) -> (x, acc)`: `n_steps` explicit
+        Euler steps of size `h`. `acc` is incremented by the integral of
+        each flow.
+    integrate_days: callable
+        `integrate_days(x, p, h, n_steps, n_days, out) -> out`: `n_days`
+        times `n_steps` steps; row `d` of `out` receives the variables at
+        the end of day `d` followed by the integral of the flows over that
+        day (floats only)
+    source: str
+        The generated code
+    verified: set
+        Backends whose compiled code has been checked against the reference
+        (see `KernelSimulator.verify`), once per process
+    """
+    def __init__(self, variables, parameters, flows):
+        self.variables = list(variables)
+        self.parameters = list(parameters)
+        self.flows = list(flows)
+        self.source = self.generate_source()
+        self._compile()
+
+    def _compile(self):
+        namespace = {}
+        exec(compile(self.source, "<episim.kernel>", "exec"), namespace)
+        self.rhs = namespace["rhs"]
+        self.integrate = namespace["integrate"]
+        self.integrate_days = namespace["integrate_days"]
+        self._jitted = None
+        self.verified = set()
+
+    def jit(self):
+        """
+        The functions (`rhs`, `integrate`, `integrate_days`) compiled by
+        numba, once
+        """
+        if self._jitted is None:
+            numba = _numba()
+            with profiling.timer("Kernel.jit"):
+                self._jitted = tuple(numba.njit(f) for f in
+                                     (self.rhs, self.integrate,
+                                      self.integrate_days))
+        return self._jitted
+
+    def __getstate__(self):
+        # The compiled functions cannot be pickled, only their source
+        state = dict(self.__dict__)
+        for name in "rhs", "integrate", "integrate_days", "_jitted", \
+                "verified":
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._compile()
+
+    @property
+    def n_variables(self):
+        return len(self.variables)
+
+    @property
+    def n_parameters(self):
+        return len(self.parameters)
+
+    @property
+    def n_flows(self):
+        return len(self.flows)
+
+    @property
+    def stoichiometry(self):
+        """Matrix [n_variables, n_flows]: dx/dt = stoichiometry . f"""
+        S = np.zeros((self.n_variables, self.n_flows))
+        for j, flow in enumerate(self.flows):
+            if flow.src is not None:
+                S[flow.src, j] -= 1
+            if flow.dst is not None:
+                S[flow.dst, j] += 1
+        return S
+
+    # ------------------------------------------------------------------ Code
+    def _symbols(self):
+        """
+        Map the leaves and the shared (named) sub-expressions to local names.
+
+        Return
+        ------
+        symbol: callable
+            See `Node.to_source`
+        temporaries: list of (local name, node)
+            Sub-expressions to compute before the flows, in dependency order
+        """
+        names = {}
+        for v in self.variables:
+            names[id(v)] = "x{}".format(v.index)
+        for p in self.parameters:
+            names[id(p)] = "p{}".format(p.index)
+
+        def symbol(node):
+            return names.get(id(node))
+
+        temporaries = []
+        seen = set()
+
+        def visit(node):
+            if id(node) in seen:
+                return
+            seen.add(id(node))
+            for child in node.children():
+                visit(child)
+            if isinstance(node, Function) and node.name is not None:
+                source = node.to_source(symbol)
+                local = "t{}".format(len(temporaries))
+                names[id(node)] = local
+                temporaries.append((local, source))
+
+        for flow in self.flows:
+            visit(flow.rate)
+        return symbol, temporaries
+
+    def _derivatives(self):
+        terms = [[] for _ in self.variables]
+        for j, flow in enumerate(self.flows):
+            if flow.src is not None:
+                terms[flow.src].append("- f{}".format(j))
+            if flow.dst is not None:
+                terms[flow.dst].append("+ f{}".format(j))
+        derivatives = []
+        for ts in terms:
+            if len(ts) == 0:
+                derivatives.append(None)
+            else:
+                derivatives.append(" ".join(ts).lstrip("+ "))
+        return derivatives
+
+    def generate_source(self):
+        symbol, temporaries = self._symbols()
+        derivatives = self._derivatives()
+        x = ["x{}".format(v.index) for v in self.variables]
+        p = ["p{}".format(q.index) for q in self.parameters]
+        f = ["f{}".format(j) for j in range(self.n_flows)]
+        acc = ["a{}".format(j) for j in range(self.n_flows)]
+
+        def unpack(names, container):
+            if len(names) == 0:
+                return []
+            return ["{}, = {}".format(", ".join(names), container)]
+
+        def body():
+            lines = []
+            lines.extend("{} = {}".format(local, source)
+                         for local, source in temporaries)
+            lines.extend("f{} = {}".format(j, flow.rate.to_source(symbol))
+                         for j, flow in enumerate(self.flows))
+            return lines
+
+        def tup(names):
+            if len(names) == 0:
+                return "()"
+            return "({},)".format(", ".join(names))
+
+        indent = "    "
+        lines = ["def rhs(x, p):"]
+        lines.extend(indent + l for l in unpack(x, "x") + unpack(p, "p"))
+        lines.extend(indent + l for l in body())
+        dx = ["0." if d is None else "({})".format(d) for d in derivatives]
+        lines.append(indent + "return {}, {}".format(tup(dx), tup(f)))
+        lines.append("")
+        lines.append("")
+
+        lines.append("def integrate(x, acc, p, h, n_steps):")
+        lines.extend(indent + l for l in
+                     unpack(x, "x") + unpack(acc, "acc") + unpack(p, "p"))
+        lines.append(indent + "for _ in range(n_steps):")
+        lines.extend(2 * indent + l for l in body())
+        updates = ["{} + h * ({})".format(xi, d)
+                   for xi, d in zip(x, derivatives) if d is not None]
+        updated = [xi for xi, d in zip(x, derivatives) if d is not None]
+        if len(updated) > 0:
+            lines.append(2 * indent + "{} = {}".format(", ".join(updated),
+                                                       ", ".join(updates)))
+        if len(acc) > 0:
+            lines.append(2 * indent + "{} = {}".format(
+                ", ".join(acc),
+                ", ".join("{} + h * {}".format(a, fj)
+                          for a, fj in zip(acc, f))))
+        lines.append(indent + "return {}, {}".format(tup(x), tup(acc)))
+        lines.append("")
+        lines.append("")
+
+        lines.append("def integrate_days(x, p, h, n_steps, n_days, out):")
+        lines.extend(indent + l for l in unpack(x, "x") + unpack(p, "p"))
+        lines.append(indent + "for d in range(n_days):")
+        lines.extend(2 * indent + "{} = 0.".format(a) for a in acc)
+        lines.append(2 * indent + "for _ in range(n_steps):")
+        lines.extend(3 * indent + l for l in body())
+        if len(updated) > 0:
+            lines.append(3 * indent + "{} = {}".format(", ".join(updated),
+                                                       ", ".join(updates)))
+        lines.extend(3 * indent + "{} = {} + h * {}".format(a, a, fj)
+                     for a, fj in zip(acc, f))
+        lines.extend(2 * indent + "out[d, {}] = {}".format(i, name)
+                     for i, name in enumerate(x + acc))
+        lines.append(indent + "return out")
+        lines.append("")
+        return "\n".join(lines)
+
+    def __str__(self):
+        return self.source
+
+
+class KernelSimulator(object):
+    """
+    Explicit Euler method on a `Kernel`. For each day, the variables
+    followed by the integral of each flow over the day are yielded.
+
+    backend: str
+        One of `BACKENDS`. With numba, all the days are integrated by a
+        single compiled call (the state must be made of floats).
+    schedule: dict or None
+        Parameters varying from one day to the next: index of the parameter
+        -> sequence of daily values. The days are counted from the `day`
+        given to `__call__`; before the first day, the parameter keeps its
+        value in `parameters`, after the last one, its last value.
+    """
+    def __init__(self, kernel, parameters, step_size=1., backend="numpy",
+                 schedule=None):
+        self.kernel = kernel
+        self.parameters = tuple(parameters)
+        self.step_size = step_size
+        self.N = kernel.n_variables
+        self.backend = resolve_backend(backend)
+        self.schedule = {} if schedule is None else \
+            {i: np.asarray(values) for i, values in schedule.items()}
+
+    @property
+    def n_flows(self):
+        return self.kernel.n_flows
+
+    @property
+    def stoichiometry(self):
+        return self.kernel.stoichiometry
+
+    @property
+    def verified(self):
+        """Whether the backend has been verified (on this kernel)"""
+        return self.backend in self.kernel.verified
+
+    def rhs(self, x):
+        """`dx/dt` at `x` (array [n_variables] or [n_variables, m])"""
+        dx = self.kernel.rhs(tuple(x), self.parameters)[0]
+        return np.array([np.broadcast_to(d, np.shape(x[0])) for d in dx])
+
+    def parameters_at(self, day):
+        """The parameters of the `day`-th day of the schedule"""
+        if len(self.schedule) == 0 or day < 0:
+            return self.parameters
+        p = list(self.parameters)
+        for i, values in self.schedule.items():
+            p[i] = values[min(day, len(values) - 1)]
+        return tuple(p)
+
+    def __call__(self, *x, dt=1, day=0):
+        if self.backend == "numba":
+            return self._jitted_days(x, dt, day)
+        return self._days(x, dt, day)
+
+    def _days(self, x, dt, day=0):
+        integrate = self.kernel.integrate
+        h = self.step_size
+        zeros = (0.,) * self.kernel.n_flows
+
+        n_steps_per_dt = int(1. / self.step_size)
+        for i in range(int(dt)):
+            p = self.parameters_at(day + i)
+            with profiling.timer("KernelSimulator.steps"):
+                x, acc = integrate(x, zeros, p, h, n_steps_per_dt)
+            profiling.count("KernelSimulator.steps", n_steps_per_dt)
+            yield x + acc
+
+    def days(self, x, n_days, day=0):
+        """
+        What `__call__` yields, as an array [n_days, n_variables + n_flows]
+        (floats), all the days being integrated by one call of
+        `integrate_days` when there is no schedule
+        """
+        out = np.empty((int(n_days), self.N + self.kernel.n_flows))
+        if len(self.schedule) > 0:
+            for i, values in enumerate(self(*x, dt=n_days, day=day)):
+                out[i] = values
+            return out
+        if self.backend == "numba":
+            integrate_days = self.kernel.jit()[2]
+        else:
+            integrate_days = self.kernel.integrate_days
+        n_steps_per_dt = int(1. / self.step_size)
+        with profiling.timer("KernelSimulator.steps"):
+            integrate_days(tuple(float(v) for v in x),
+                           tuple(float(v) for v in self.parameters),
+                           float(self.step_size), n_steps_per_dt,
+                           int(n_days), out)
+        profiling.count("KernelSimulator.steps", n_steps_per_dt * int(n_days))
+        return out
+
+    def _jitted_days(self, x, dt, day=0):
+        if len(self.schedule) > 0:
+            # One compiled call per day, with the parameters of the day
+            integrate = self.kernel.jit()[1]
+            h = float(self.step_size)
+            n_steps_per_dt = int(1. / self.step_size)
+            x = tuple(float(v) for v in x)
+            zeros = (0.,) * self.kernel.n_flows
+            for i in range(int(dt)):
+                p = tuple(float(v) for v in self.parameters_at(day + i))
+                with profiling.timer("KernelSimulator.steps"):
+                    x, acc = integrate(x, zeros, p, h, n_steps_per_dt)
+                profiling.count("KernelSimulator.steps", n_steps_per_dt)
+                yield x + acc
+            return
+        integrate_days = self.kernel.jit()[2]
+        n_steps_per_dt = int(1. / self.step_size)
+        out = np.empty((int(dt), self.N + self.kernel.n_flows))
+        with profiling.timer("KernelSimulator.steps"):
+            integrate_days(tuple(float(v) for v in x),
+                           tuple(float(v) for v in self.parameters),
+                           float(self.step_size), n_steps_per_dt, int(dt),
+                           out)
+        profiling.count("KernelSimulator.steps", n_steps_per_dt * int(dt))
+        for row in out:
+            yield tuple(row)
+
+    def verify(self, *x, n_days=30, rtol=1e-9):
+        """
+        Compare the backend with the reference (numpy) integration of the
+        kernel over `n_days` from `x`.
+
+        Return
+        ------
+        error: float
+            The largest relative difference
+
+        Raise
+        -----
+        ValueError if it exceeds `rtol`
+        """
+        reference = np.array(list(self._days(x, n_days)), dtype=float)
+        values = np.array(list(self(*x, dt=n_days)), dtype=float)
+        error = np.max(np.abs(values - reference) /
+                       np.maximum(np.abs(reference), 1.))
+        if error > rtol:
+            raise ValueError("Backend {} differs from the reference by {:.2e}"
+                             "".format(self.backend, error))
+        self.kernel.verified.add(self.backend)
+        return error
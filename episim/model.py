@@ -1,14 +1,19 @@
 import os
+import sys
 import datetime
+import warnings
 
 from collections import defaultdict
 
 import numpy as np
-from scipy import sparse
 
 from episim.ontology import Ontology
-from episim.plot.modeling import System, Accumulator
-from .data import State
+from episim.modeling import System, Parameter
+from .kernel import Flow, Kernel, KernelSimulator, resolve_backend
+from . import profiling
+from .data import State, ArrayHistory
+from .equilibrium import conservation_laws, find_equilibrium, \
+    seirs_endemic_equilibrium, final_susceptible
 
 
 class EulerSimulator(object):
@@ -27,45 +32,102 @@ class EulerSimulator(object):
 
         n_steps_per_dt = int(1. / self.step_size)
         for i in range(int(dt)):
-            for t in range(n_steps_per_dt):
-                for i, dxi_dt in enumerate(self.dx_dt):
-                    dx[i] = dxi_dt(*x)
-                x = x + h * dx
+            with profiling.timer("EulerSimulator.steps"):
+                for t in range(n_steps_per_dt):
+                    for i, dxi_dt in enumerate(self.dx_dt):
+                        dx[i] = dxi_dt(*x)
+                    x = x + h * dx
+            profiling.count("EulerSimulator.steps", n_steps_per_dt)
+            profiling.count("EulerSimulator.rhs", n_steps_per_dt * self.N)
             yield x
 
 
 
+def _issparse(A):
+    # scipy.sparse is only imported by the models building a sparse operator
+    # (keeping the import of this module cheap): if it is not loaded, `A`
+    # cannot be sparse
+    sparse = sys.modules.get("scipy.sparse")
+    return sparse is not None and sparse.issparse(A)
+
+
 class LinNonLinEulerSimulator(object):
     """
-    P : p
+    Explicit Euler method on a dynamic split into a linear part and a few
+    non-linear flows:
+
+        dx/dt = A x + sum_j (e_dst(j) - e_src(j)) f_j(x)
+
+    A: matrix [N, N] (dense or `scipy.sparse`, e.g. banded)
+        The linear part
+    flows: list of `Flow`
+        The non-linear flows, whose `rate` is a callable of the state vector.
+        For each day, the variables followed by the integral of each of
+        these flows over the day are yielded (as `KernelSimulator` does).
     """
-    def __init__(self, dx_dt_lin, dx_dt_dict, step_size=1.):
-        if hasattr(M, "tocsr"):
-            dx_dt_lin = dx_dt_lin.tocsr()
-        self.dx_dt_matrix = dx_dt_lin
-        self.dx_dt_dict = dx_dt_dict
-        self.N = len(dx_dt_lin)
+    def __init__(self, A, flows=(), step_size=1.):
+        if _issparse(A):
+            A = A.tocsr()
+        self.A = A
+        self.flows = list(flows)
+        self.N = A.shape[0]
         self.step_size = step_size
 
+    @property
+    def n_flows(self):
+        return len(self.flows)
+
+    @property
+    def stoichiometry(self):
+        """Matrix whose columns span the directions of dx/dt"""
+        A = self.A.toarray() if _issparse(self.A) else np.asarray(self.A)
+        columns = np.zeros((self.N, len(self.flows)))
+        for j, flow in enumerate(self.flows):
+            if flow.src is not None:
+                columns[flow.src, j] -= 1
+            if flow.dst is not None:
+                columns[flow.dst, j] += 1
+        return np.hstack([A, columns])
+
+    def rhs(self, x):
+        """`dx/dt` at `x` (array [N] or [N, m])"""
+        x = np.asarray(x)
+        dx = self.A @ x
+        for flow in self.flows:
+            f = flow.rate(x)
+            if flow.src is not None:
+                dx[flow.src] -= f
+            if flow.dst is not None:
+                dx[flow.dst] += f
+        return dx
 
     def __call__(self, *x, dt=1):
-        dx = np.zeros(self.N)
-        x = np.array(x)
+        x = np.array(x, dtype=float)
+        A = self.A
         h = self.step_size
+        flows = self.flows
+        acc = np.zeros((len(flows),) + x.shape[1:])
 
         n_steps_per_dt = int(1. / self.step_size)
         for i in range(int(dt)):
-            for t in range(n_steps_per_dt):
-                dx *= 0
-                # Linear part
-                dx[:] = self.dx_dt_matrix.dot(x)
-
-                # Non linear
-                for i, f in self.dx_dt_dict.items():
-                    dx[i] += f(*x)
-
-                x = x + h * dx
-            yield x
+            acc[:] = 0
+            with profiling.timer("LinNonLinEulerSimulator.steps"):
+                for t in range(n_steps_per_dt):
+                    # Linear part
+                    dx = A @ x
+
+                    # Non linear
+                    for j, flow in enumerate(flows):
+                        f = flow.rate(x)
+                        if flow.src is not None:
+                            dx[flow.src] -= f
+                        if flow.dst is not None:
+                            dx[flow.dst] += f
+                        acc[j] += h * f
+
+                    x = x + h * dx
+            profiling.count("LinNonLinEulerSimulator.steps", n_steps_per_dt)
+            yield tuple(x) + tuple(acc)
 
 
 class F(object):
@@ -129,16 +191,69 @@ class Dynamic(object):
 
 
 
+class Snapshot(object):
+    """
+    Full state of a model at the end of a day: its current state (the raw
+    `State`, not a query through the ontology) and the step size of the
+    integrator (the integrators always stop at the end of a day, so that no
+    sub-step is pending, and the kernels hold no state).
+
+    A snapshot can be restored into the model it was taken from, or into any
+    model of the same class (e.g. with other parameters); it is picklable
+    and `to_dict` gives a plain representation.
+    """
+    @classmethod
+    def from_dict(cls, d):
+        d = dict(d)
+        date = datetime.date.fromisoformat(d.pop("date"))
+        return cls(date=date, **d)
+
+    def __init__(self, model_name, date, attributes, step_size=None):
+        self.model_name = model_name
+        self.date = date
+        self.attributes = dict(attributes)
+        self.step_size = step_size
+
+    def __repr__(self):
+        return "{}({}, {}, {}, {})".format(self.__class__.__name__,
+                                           repr(self.model_name),
+                                           repr(self.date),
+                                           repr(self.attributes),
+                                           repr(self.step_size))
+
+    def state(self):
+        """A new `State` equal to the one of the snapshot"""
+        return State(self.date, **self.attributes)
+
+    def to_dict(self):
+        return {
+            "model_name": self.model_name,
+            "date": self.date.isoformat(),
+            "attributes": dict(self.attributes),
+            "step_size": self.step_size,
+        }
+
+
 class Model(object):
+    # State attributes of the variables (in the order of `_state2variables`)
+    # and counters: (index of the flow yielded by the simulator, attribute)
+    variable_names = ()
+    tracked = ()
+
     @classmethod
     def compute_parameters(cls, virus, population):
         return tuple()
 
     @classmethod
-    def factory(cls, initial_state, virus, population, resolution=0.1):
+    def factory(cls, initial_state, virus, population, resolution=0.1,
+                backend=None):
+        """
+        `initial_state` is either a `State` or a `Snapshot`. `backend`
+        selects the simulator backend (see `set_backend`).
+        """
         t = cls.compute_parameters(virus, population)
         model = cls(*t, resolution=resolution)
-        return model.set_state(initial_state)
+        return model.set_backend(backend).start_from(initial_state)
 
 
     def __init__(self, resolution=0.1):
@@ -149,45 +264,297 @@ class Model(object):
     def _compute_reproduction_number(self, n_susceptible, n_total):
         return 0
 
-
-    def set_state(self, state):
+    def _susceptible(self, query):
+        """
+        Number of susceptible individuals entering the reproduction number,
+        `query(name)` giving the value of an entry of the ontology (in a
+        state or over time)
+        """
+        return query("susceptible")
+
+    def _integrate(self, variables, state, n_steps):
+        """
+        Values yielded by the simulator for the `n_steps` days after
+        `state`, starting from `variables`
+        """
+        return self.simulator(*variables, dt=n_steps)
+
+    def _integrate_array(self, variables, state, n_steps):
+        """
+        What `_integrate` yields (`n_steps` > 0), as an array [n_steps,
+        n_variables + n_flows]. All the days are integrated by one call
+        when the simulator can (see `KernelSimulator.days`) and `_integrate`
+        is not overridden.
+        """
+        days = getattr(self.simulator, "days", None)
+        if days is not None and \
+                type(self)._integrate is Model._integrate and \
+                all(np.ndim(v) == 0 for v in variables):
+            return days(variables, n_steps)
+        array = None
+        for day, values in enumerate(self._integrate(variables, state,
+                                                     n_steps)):
+            if array is None:
+                array = np.empty((n_steps, len(values)))
+            array[day] = values
+        return array
+
+
+    @profiling.timed("Model.prepare_state")
+    def prepare_state(self, state):
+        """
+        Complete `state` (reproduction number, counters) without changing
+        the model
+        """
         queriable = self.ontology(state)
-        R = self._compute_reproduction_number(queriable.susceptible,
-                                              queriable.population)
+        R = self._compute_reproduction_number(
+            self._susceptible(lambda name: getattr(queriable, name)),
+            queriable.population)
         state.reproduction_number = R
         if state.n_infection is None:
             state.n_infection = queriable.infected
-        self.current_state = state
+        return state
+
+    def set_state(self, state):
+        self.current_state = self.prepare_state(state)
+        return self
+
+    def start_from(self, initial_state):
+        """Set the state from a `State` or restore a `Snapshot`"""
+        if isinstance(initial_state, Snapshot):
+            self.restore(initial_state)
+        else:
+            self.set_state(initial_state)
+        if getattr(self.simulator, "backend", "numpy") != "numpy" and \
+                not self.simulator.verified:
+            # Check the compiled code against the reference, once per kernel
+            self.simulator.verify(*self._state2variables(self.current_state),
+                                  n_days=10)
         return self
 
+    def set_backend(self, backend):
+        """
+        Select the backend of the simulator among `kernel.BACKENDS` ("numpy"
+        if None). Simulators without backends (e.g. `EulerSimulator`) stay
+        with numpy.
+        """
+        backend = resolve_backend(backend)
+        if hasattr(self.simulator, "backend"):
+            self.simulator.backend = backend
+        elif backend != "numpy":
+            warnings.warn("{} has no {} backend, using numpy"
+                          "".format(self.__class__.__name__, backend))
+        return self
+
+    def snapshot(self):
+        """`Snapshot` of the current state"""
+        attributes = dict(vars(self.current_state))
+        date = attributes.pop("date")
+        return Snapshot(self.__class__.__name__, date, attributes,
+                        getattr(self.simulator, "step_size", None))
+
+    def restore(self, snapshot):
+        """
+        Restore a `Snapshot` taken from a model of the same class (the
+        parameters and the resolution may differ)
+        """
+        if snapshot.model_name != self.__class__.__name__:
+            raise ValueError("Cannot restore a snapshot of {} into {}"
+                             "".format(snapshot.model_name,
+                                       self.__class__.__name__))
+        return self.set_state(snapshot.state())
+
     def _state2variables(self, state):
         return tuple()
 
-    def _variables2state(self, date, *values):
+    def _variables2state(self, date, *values, previous=None):
+        """
+        `values` are those yielded by the simulator for `date`, `previous`
+        is the state of the day before
+        """
         return State(date)
 
-    def run(self, n_steps=1):
-        variables = self._state2variables(self.current_state)
+    def simulate(self, state, n_steps=1):
+        """
+        Yield the states of the `n_steps` days following `state`. The model
+        is left unchanged (the simulators and kernels do not hold any state
+        either), so that several simulations can use the same model
+        concurrently (e.g. from a thread pool).
+        """
+        variables = self._state2variables(state)
 
-        date = self.current_state.date
+        date = state.date
         plus_one = datetime.timedelta(days=1)
 
-        for variables in self.simulator(*variables, dt=n_steps):
+        for variables in self._integrate(variables, state, n_steps):
 
             date = date + plus_one
 
-            state = self._variables2state(date, *variables)
+            with profiling.timer("Model.variables2state"):
+                state = self._variables2state(date, *variables,
+                                              previous=state)
 
-            self.set_state(state)
+            yield self.prepare_state(state)
 
+    def run(self, n_steps=1):
+        """Simulate from (and update) the current state"""
+        for state in self.simulate(self.current_state, n_steps):
+            self.current_state = state
             yield state
 
+    @property
+    def counter_names(self):
+        names = []
+        for _, attribute in self.tracked:
+            if attribute not in names:
+                names.append(attribute)
+        return names
+
+    @property
+    def fields(self):
+        """The fields `run_array` can record"""
+        return list(self.variable_names) + self.counter_names + \
+               ["reproduction_number"]
+
+    def _equilibrium_guess(self):
+        """Starting point of `steady_state` (by default the current state)"""
+        return self._state2variables(self.current_state)
+
+    @profiling.timed("Model.steady_state")
+    def steady_state(self, guess=None, tol=1e-10, max_iter=50):
+        """
+        Equilibrium of the dynamic with the same population as the current
+        state (see `episim.equilibrium`).
+
+        guess: `State` or None
+            Starting point of Newton's method (default: a closed form of the
+            model if it has one, the current state otherwise)
+
+        Return
+        ------
+        equilibrium: `Equilibrium`
+            Its `state` attribute is the equilibrium as a `State` (with
+            the counters of the current state)
+        """
+        if not hasattr(self.simulator, "rhs"):
+            raise TypeError("{} has no right-hand side to solve"
+                            "".format(self.__class__.__name__))
+        if guess is None:
+            x0 = self._equilibrium_guess()
+        else:
+            x0 = self._state2variables(guess)
+        # Keep the conserved quantities (population) of the current state
+        x_current = np.array(self._state2variables(self.current_state),
+                             dtype=float)
+        W = conservation_laws(self.simulator.stoichiometry)
+        x0 = np.asarray(x0, dtype=float)
+        x0 = x0 + np.linalg.lstsq(W, W.dot(x_current - x0), rcond=None)[0]
+
+        equilibrium = find_equilibrium(self.simulator.rhs, x0,
+                                       self.simulator.stoichiometry, tol,
+                                       max_iter)
+        state = self._variables2state(self.current_state.date,
+                                      *equilibrium.variables,
+                                      *np.zeros(self.simulator.n_flows),
+                                      previous=self.current_state)
+        equilibrium.state = self.prepare_state(state)
+        return equilibrium
+
+    @profiling.timed("Model.run_array")
+    def run_array(self, n_steps, record_every=1, fields=None):
+        """
+        Simulate `n_steps` days from the current state (which is updated),
+        recording `fields` (see `fields`; all by default) every `record_every`
+        days in a preallocated array, without any `State` per day.
+
+        Return
+        ------
+        array: np.ndarray [n_steps // record_every + 1, len(fields)]
+            The first row is the current state
+        """
+        if fields is None:
+            fields = self.fields
+        initial = self.current_state
+        n_vars = len(self.variable_names)
+        counters = self.counter_names
+
+        # Counters are the initial values plus the cumulated flows
+        variables = self._state2variables(initial)
+        n_flows = 0
+        for j, _ in self.tracked:
+            n_flows = max(n_flows, j + 1)
+        to_counters = np.zeros((len(counters), n_flows))
+        for j, attribute in self.tracked:
+            to_counters[counters.index(attribute), j] = 1
+        offset = np.array([getattr(initial, c) or 0. for c in counters])
+
+        # Columns: variables, counters, reproduction number
+        n_rows = n_steps // record_every + 1
+        record = np.empty((n_rows, n_vars + len(counters) + 1))
+        record[0, :n_vars] = variables
+        record[0, n_vars:-1] = offset
+        if n_steps > 0:
+            # Rows: the variables at the end of each day and the cumulated
+            # flows
+            days = self._integrate_array(variables, initial, n_steps)
+            np.cumsum(days[:, n_vars:], axis=0, out=days[:, n_vars:])
+            recorded = days[record_every-1::record_every][:n_rows-1]
+            record[1:, :n_vars] = recorded[:, :n_vars]
+            record[1:, n_vars:-1] = offset + \
+                recorded[:, n_vars:n_vars+n_flows].dot(to_counters.T)
+
+        history = ArrayHistory(record, list(self.variable_names) + counters
+                               + ["reproduction_number"], None)
+        record[:, -1] = self._compute_reproduction_number(
+            self._susceptible(lambda name: history.column(name,
+                                                          self.ontology)),
+            history.column("population", self.ontology)
+        )
+
+        if n_steps > 0:
+            date = initial.date + datetime.timedelta(days=n_steps)
+            state = self._variables2state(date, *days[-1], previous=initial)
+            self.current_state = self.prepare_state(state)
+
+        columns = [history.fields.index(field) for field in fields]
+        return record[:, columns]
 
 
 
 
 
 
+
+def seirs_kernel():
+    S, E, I, R = System.new("S", "E", "I", "R")
+    beta, kappa, gamma, ksi = (Parameter(name, i) for i, name in
+                               enumerate(("beta", "kappa", "gamma", "ksi")))
+    N = S + E + I + R
+    N.override_name("N")
+    return Kernel([S, E, I, R], [beta, kappa, gamma, ksi], [
+        Flow(0, 1, beta * S * I / N, "n_infection"),
+        Flow(1, 2, kappa * E),
+        Flow(2, 3, gamma * I),
+        Flow(3, 0, ksi * R),
+    ])
+
+
+def sir_kernel():
+    S, I, R = System.new("S", "I", "R")
+    beta, gamma = Parameter("beta", 0), Parameter("gamma", 1)
+    N = S + I + R
+    N.override_name("N")
+    return Kernel([S, I, R], [beta, gamma], [
+        Flow(0, 1, beta * S * I / N, "n_infection"),
+        Flow(1, 2, gamma * I),
+    ])
+
+
+# Pure functions of (state, parameters), shared by all the instances
+SEIRS_KERNEL = seirs_kernel()
+SIR_KERNEL = sir_kernel()
+
+
 class SEIRS(Model):
     """
     beta: float
@@ -213,6 +580,9 @@ class SEIRS(Model):
         return beta, kappa, gamma, ksi
 
 
+    variable_names = ("susceptible", "exposed", "infectious", "recovered")
+    tracked = ((0, "n_infection"),)
+
     def __init__(self, beta=0, kappa=0, gamma=0, ksi=0, resolution=0.1):
         if resolution is None:
             resolution = EulerSimulator
@@ -224,35 +594,30 @@ class SEIRS(Model):
 
         self.current_state = None
 
+        # The kernel is shared by all the instances
+        self.simulator = KernelSimulator(SEIRS_KERNEL,
+                                         (beta, kappa, gamma, ksi),
+                                         step_size=resolution)
 
-
+    @property
+    def dynamic(self):
+        """The dynamic as node trees (reference for `EulerSimulator`)"""
         S, E, I, R = System.new("S", "E", "I", "R")
         N = S + E + I + R
         N.override_name("N")
 
         S2E = self.beta * S * I / N
-        S2E_acc = Accumulator(S2E, self.resolution)
-
         E2I = self.kappa * E
         I2R = self.gamma * I
         R2S = self.ksi * R
 
         dS_dt = -S2E + R2S
-        dE_dt = S2E_acc - E2I
+        dE_dt = S2E - E2I
         dI_dt = E2I - I2R
         dR_dt  = I2R - R2S
 
-
-        self.dynamic = Dynamic.from_nodes((S, dS_dt), (E, dE_dt),
-                                          (I, dI_dt), (R, dR_dt))
-
-        self.acc_n_infect = S2E_acc
-
-
-        self.simulator = EulerSimulator(*iter(self.dynamic),
-                                        step_size=resolution)
-
-
+        return Dynamic.from_nodes((S, dS_dt), (E, dE_dt),
+                                  (I, dI_dt), (R, dR_dt))
 
     def __repr__(self):
         s = "{}(beta={}, kappa={}, gamma={}, ksi={}, resolution={})".format(
@@ -280,7 +645,43 @@ class SEIRS(Model):
 
 
     def _compute_reproduction_number(self, n_susceptible, n_total):
-        return self.beta / self.gamma * n_susceptible / float(n_total)
+        return self.beta / self.gamma * n_susceptible / n_total
+
+    def endemic_equilibrium(self):
+        """
+        `State` at the endemic equilibrium (closed form), with the
+        population of the current state. None if there is none.
+        """
+        N = sum(self._state2variables(self.current_state))
+        SEIR = seirs_endemic_equilibrium(N, self.beta, self.kappa,
+                                         self.gamma, self.ksi)
+        if SEIR is None:
+            return None
+        S, E, I, R = SEIR
+        return State(self.current_state.date, susceptible=S, exposed=E,
+                     infectious=I, recovered=R,
+                     n_infection=self.current_state.n_infection)
+
+    def final_state(self):
+        """
+        `State` at the end of the epidemic (closed form, through the Lambert
+        W function). Only exists with lasting immunity (`ksi = 0`).
+        """
+        if self.ksi > 0:
+            raise ValueError("No end of the epidemic with a loss of immunity"
+                             ", see `steady_state`")
+        S, E, I, R = self._state2variables(self.current_state)
+        N = S + E + I + R
+        S_inf = final_susceptible(S, R, N, self.beta / self.gamma)
+        return State(self.current_state.date, susceptible=S_inf, exposed=0,
+                     infectious=0, recovered=N - S_inf,
+                     n_infection=self.current_state.n_infection + S - S_inf)
+
+    def _equilibrium_guess(self):
+        state = self.endemic_equilibrium()
+        if state is None:
+            return super()._equilibrium_guess()
+        return self._state2variables(state)
 
     def _state2variables(self, state):
         zero = lambda x: 0 if x is None else x
@@ -292,12 +693,10 @@ class SEIRS(Model):
         return S, E, I, R
 
 
-    def _variables2state(self, date, *values):
-        S, E, I, R = values
+    def _variables2state(self, date, *values, previous=None):
+        S, E, I, R, S2E, _, _, _ = values
 
-        n_infection = self.current_state.n_infection
-        n_infection += self.acc_n_infect.value
-        self.acc_n_infect.reset()
+        n_infection = previous.n_infection + S2E
 
         state = State(date)
         state.susceptible = S
@@ -322,11 +721,20 @@ class SIR(Model):
 
         return beta, gamma
 
+    variable_names = ("susceptible", "infectious", "recovered")
+    tracked = ((0, "n_infection"),)
+
     def __init__(self, beta, gamma, resolution=0.1):
         super().__init__(resolution)
         self.beta = beta
         self.gamma = gamma
 
+        self.simulator = KernelSimulator(SIR_KERNEL, (beta, gamma),
+                                         step_size=resolution)
+
+    @property
+    def dynamic(self):
+        """The dynamic as node trees (reference for `EulerSimulator`)"""
         S, I, R = System.new("S", "I", "R")
         N = S + I + R
         N.override_name("N")
@@ -338,11 +746,7 @@ class SIR(Model):
         dI_dt = S2I - I2R
         dR_dt = I2R
 
-        self.dynamic = Dynamic.from_nodes((S, dS_dt), (I, dI_dt), (R, dR_dt))
-
-
-        self.simulator = EulerSimulator(iter(self.dynamic), resolution)
-
+        return Dynamic.from_nodes((S, dS_dt), (I, dI_dt), (R, dR_dt))
 
     def __repr__(self):
         s = "{}(beta={}, gamma={}, resolution={})".format(
@@ -364,8 +768,20 @@ class SIR(Model):
 
 
     def _compute_reproduction_number(self, n_susceptible, n_total):
-        return self.beta / self.gamma * n_susceptible / float(n_total)
+        return self.beta / self.gamma * n_susceptible / n_total
+
 
+    def final_state(self):
+        """
+        `State` at the end of the epidemic (closed form, through the Lambert
+        W function)
+        """
+        S, I, R = self._state2variables(self.current_state)
+        N = S + I + R
+        S_inf = final_susceptible(S, R, N, self.beta / self.gamma)
+        return State(self.current_state.date, susceptible=S_inf,
+                     infectious=0, recovered=N - S_inf,
+                     n_infection=self.current_state.n_infection + S - S_inf)
 
     def _state2variables(self, state):
         zero = lambda x: 0 if x is None else x
@@ -376,11 +792,10 @@ class SIR(Model):
         return S, I, R
 
 
-    def _variables2state(self, date, *values):
-        S, I, R = values
+    def _variables2state(self, date, *values, previous=None):
+        S, I, R, S2I, _ = values
 
-        n_infection = self.current_state.n_infection
-        n_infection += (self.current_state.susceptible - S)
+        n_infection = previous.n_infection + S2I
 
         state = State(date)
         state.susceptible = S
@@ -390,3 +805,158 @@ class SIR(Model):
 
         return state
 
+
+
+
+class ErlangSEIRS(Model):
+    """
+    SEIRS whose exposed and infectious stages are chains of sub-stages
+    (linear chain trick): the time spent in each stage follows an Erlang
+    distribution (of mean `1/kappa`, resp. `1/gamma`) instead of an
+    exponential one, which sharpens the epidemic peak.
+
+    The sub-stages are leaves of `Ontology.staged_ontology`, so that the
+    states can still be queried for `exposed` and `infectious`. Everything
+    but the infections is linear and is integrated as a sparse banded
+    matrix, so that tens of sub-stages remain cheap.
+
+    n_exposed_stages, n_infectious_stages: int
+        Number of sub-stages (1 gives back `SEIRS`). The resolution must be
+        finer than the residence time of a sub-stage.
+    """
+    tracked = ((0, "n_infection"),)
+
+    @classmethod
+    def compute_parameters(cls, virus, population):
+        return SEIRS.compute_parameters(virus, population)
+
+    @classmethod
+    def factory(cls, initial_state, virus, population, resolution=0.1,
+                backend=None, n_exposed_stages=4, n_infectious_stages=4):
+        t = cls.compute_parameters(virus, population)
+        model = cls(*t, resolution=resolution,
+                    n_exposed_stages=n_exposed_stages,
+                    n_infectious_stages=n_infectious_stages)
+        return model.set_backend(backend).start_from(initial_state)
+
+    def __init__(self, beta=0, kappa=0, gamma=0, ksi=0, resolution=0.1,
+                 n_exposed_stages=4, n_infectious_stages=4):
+        super().__init__(resolution=resolution)
+        self.beta = beta
+        self.kappa = kappa
+        self.gamma = gamma
+        self.ksi = ksi
+        self.n_exposed_stages = n_exposed_stages
+        self.n_infectious_stages = n_infectious_stages
+
+        fastest = max(n_exposed_stages * kappa, n_infectious_stages * gamma)
+        if resolution * fastest > 1:
+            raise ValueError("Resolution {} too coarse for sub-stages of "
+                             "{:.2f} day(s), the compartments would become "
+                             "negative".format(resolution, 1. / fastest))
+
+        self.ontology = Ontology.staged_ontology(n_exposed_stages,
+                                                 n_infectious_stages)
+        self.exposed_stages = ["exposed_{:d}".format(i) for i in
+                               range(1, n_exposed_stages + 1)]
+        self.infectious_stages = ["infectious_{:d}".format(i) for i in
+                                  range(1, n_infectious_stages + 1)]
+        self.variable_names = ["susceptible"] + self.exposed_stages + \
+                              self.infectious_stages + ["recovered"]
+
+        self.simulator = LinNonLinEulerSimulator(self.linear_operator(),
+                                                 [self._infection_flow()],
+                                                 step_size=resolution)
+
+    def linear_operator(self):
+        """
+        Sparse matrix of the linear part: progression along the chains
+        (sub-diagonal), recovery and loss of immunity (R -> S, the only
+        entry outside of the band)
+        """
+        k, m = self.n_exposed_stages, self.n_infectious_stages
+        n = k + m + 2
+        rates = np.zeros(n)
+        rates[1:k+1] = k * self.kappa
+        rates[k+1:k+m+1] = m * self.gamma
+        rates[-1] = self.ksi
+
+        from scipy import sparse
+        A = sparse.diags([-rates, rates[:-1]], [0, -1], shape=(n, n),
+                         format="lil")
+        A[0, n-1] = self.ksi
+        return A.tocsr()
+
+    def _infection_flow(self):
+        beta = self.beta
+        first_i = 1 + self.n_exposed_stages
+        last_i = first_i + self.n_infectious_stages
+
+        def infection(x):
+            return beta * x[0] * x[first_i:last_i].sum(axis=0) / x.sum(axis=0)
+
+        return Flow(0, 1, infection, "n_infection")
+
+    def __repr__(self):
+        s = "{}(beta={}, kappa={}, gamma={}, ksi={}, resolution={}, " \
+            "n_exposed_stages={}, n_infectious_stages={})".format(
+                self.__class__.__name__,
+                repr(self.beta),
+                repr(self.kappa),
+                repr(self.gamma),
+                repr(self.ksi),
+                repr(self.resolution),
+                repr(self.n_exposed_stages),
+                repr(self.n_infectious_stages),
+            )
+        if self.current_state is None:
+            return s
+
+        return s + ".set_state({})".format(repr(self.current_state))
+
+    def __str__(self):
+        return "{}(beta={:.2e}, kappa={:.2e}, gamma={:.2e}, ksi={:.2e}, " \
+               "stages={}x{})".format(self.__class__.__name__,
+                                      self.beta, self.kappa,
+                                      self.gamma, self.ksi,
+                                      self.n_exposed_stages,
+                                      self.n_infectious_stages)
+
+    def _compute_reproduction_number(self, n_susceptible, n_total):
+        return self.beta / self.gamma * n_susceptible / n_total
+
+    def _equilibrium_guess(self):
+        # Same aggregates as SEIRS, spread evenly over the sub-stages
+        variables = self._state2variables(self.current_state)
+        SEIR = seirs_endemic_equilibrium(sum(variables), self.beta,
+                                         self.kappa, self.gamma, self.ksi)
+        if SEIR is None:
+            return variables
+        S, E, I, R = SEIR
+        return self._state2variables(State(None, susceptible=S, exposed=E,
+                                           infectious=I, recovered=R))
+
+    def _state2variables(self, state):
+        zero = lambda x: 0 if x is None else x
+
+        def stages(aggregate, names):
+            values = [getattr(state, name) for name in names]
+            if all(v is None for v in values):
+                # Only the aggregate is known: spread it evenly
+                return [zero(getattr(state, aggregate)) / float(len(names))] \
+                       * len(names)
+            return [zero(v) for v in values]
+
+        return tuple([zero(state.susceptible)]
+                     + stages("exposed", self.exposed_stages)
+                     + stages("infectious", self.infectious_stages)
+                     + [zero(state.recovered)])
+
+    def _variables2state(self, date, *values, previous=None):
+        n = len(self.variable_names)
+        # The aggregates (exposed, infectious) are left to the ontology
+        state = State(date)
+        for name, value in zip(self.variable_names, values[:n]):
+            setattr(state, name, value)
+        state.n_infection = previous.n_infection + values[n]
+        return state
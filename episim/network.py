@@ -0,0 +1,316 @@
+"""
+SEIRS on an explicit contact graph.
+
+Each node of a `ContactGraph` is an individual, each (weighted) edge a
+contact through which the infection is transmitted. The adjacency matrix is
+stored in CSR form, the daily infection pressure on every node being a
+sparse mat-vec:
+
+    graph = ContactGraph.watts_strogatz(10 ** 6, k=20, p=.1)
+    factory = partial(NetworkSEIRS.factory, graph=graph,
+                      intervention="drop")
+    model = factory(state, SARSCoV2Th(), PopulationBehavior())
+    outcome = Outcome.from_model(model, 100)
+
+The transmission rate per unit of edge weight is such that a node with the
+average degree receives the same pressure as in `SEIRS`. Interventions on
+the population (e.g. `Confine`) reduce the contact frequency, which is
+applied to the graph by rescaling the weights of all the edges
+(`intervention="rescale"`) or by dropping edges at random
+(`intervention="drop"`).
+"""
+import numpy as np
+from scipy import sparse
+
+from . import profiling
+from .agent import IndividualModel
+from .parameters import InterventionDecorator
+
+
+class ContactGraph(object):
+    """
+    Undirected weighted graph.
+
+    adjacency: `scipy.sparse.csr_matrix` [n_nodes, n_nodes]
+        Symmetric, `adjacency[i, j]` being the weight of the contact between
+        `i` and `j` (0 if none)
+    """
+    @classmethod
+    def from_edges(cls, sources, targets, n_nodes=None, weights=None):
+        """
+        Graph from the lists of the ends of its edges. Self-loops are
+        discarded, the weights of repeated edges are summed (each edge
+        weighs 1 if `weights` is None).
+        """
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        if n_nodes is None:
+            n_nodes = int(max(sources.max(initial=-1),
+                              targets.max(initial=-1))) + 1
+        if weights is None:
+            weights = np.ones(len(sources), dtype=np.float32)
+        weights = np.asarray(weights, dtype=np.float32)
+        keep = sources != targets
+        sources, targets, weights = sources[keep], targets[keep], \
+            weights[keep]
+        adjacency = sparse.coo_matrix(
+            (np.concatenate([weights, weights]),
+             (np.concatenate([sources, targets]),
+              np.concatenate([targets, sources]))),
+            shape=(n_nodes, n_nodes)).tocsr()
+        adjacency.sum_duplicates()
+        return cls(adjacency)
+
+    @classmethod
+    def watts_strogatz(cls, n_nodes, k=10, p=.1, random_state=None):
+        """
+        Small-world graph: ring where each node is linked to its `k` nearest
+        neighbors, each edge being rewired to a random node with probability
+        `p`
+        """
+        if not isinstance(random_state, np.random.RandomState):
+            random_state = np.random.RandomState(random_state)
+        half = k // 2
+        sources = np.repeat(np.arange(n_nodes), half)
+        targets = (sources + np.tile(np.arange(1, half + 1), n_nodes)) % \
+            n_nodes
+        rewired = random_state.random_sample(len(targets)) < p
+        targets[rewired] = random_state.randint(0, n_nodes,
+                                                np.count_nonzero(rewired))
+        graph = cls.from_edges(sources, targets, n_nodes)
+        # Rewiring may duplicate edges: contacts are not counted twice
+        graph.adjacency.data[:] = 1
+        return graph
+
+    @classmethod
+    def configuration(cls, degrees, random_state=None):
+        """
+        Random graph whose nodes have the given `degrees` (up to self-loops
+        and repeated edges, which are dropped and merged)
+        """
+        if not isinstance(random_state, np.random.RandomState):
+            random_state = np.random.RandomState(random_state)
+        degrees = np.array(degrees, dtype=np.int64)
+        if degrees.sum() % 2 == 1:
+            degrees[random_state.randint(len(degrees))] += 1
+        stubs = np.repeat(np.arange(len(degrees)), degrees)
+        random_state.shuffle(stubs)
+        graph = cls.from_edges(stubs[0::2], stubs[1::2], len(degrees))
+        graph.adjacency.data[:] = 1
+        return graph
+
+    @classmethod
+    def load(cls, path, n_nodes=None):
+        """
+        Graph saved by `save` (`.npz`) or edge list: one edge per line,
+        "source target [weight]"
+        """
+        if path.endswith(".npz"):
+            return cls(sparse.load_npz(path).tocsr())
+        edges = np.loadtxt(path, ndmin=2)
+        weights = edges[:, 2] if edges.shape[1] > 2 else None
+        return cls.from_edges(edges[:, 0].astype(np.int64),
+                              edges[:, 1].astype(np.int64), n_nodes, weights)
+
+    def __init__(self, adjacency):
+        self.adjacency = adjacency.astype(np.float32)
+
+    def __repr__(self):
+        return "{}(n_nodes={}, n_edges={})".format(self.__class__.__name__,
+                                                   self.n_nodes, self.n_edges)
+
+    def save(self, path):
+        sparse.save_npz(path, self.adjacency)
+        return self
+
+    @property
+    def n_nodes(self):
+        return self.adjacency.shape[0]
+
+    @property
+    def n_edges(self):
+        return self.adjacency.nnz // 2
+
+    @property
+    def degrees(self):
+        """Weighted degree of each node"""
+        return np.asarray(self.adjacency.sum(axis=1)).ravel()
+
+    @property
+    def mean_degree(self):
+        return float(self.adjacency.data.sum(dtype=np.float64)) / \
+            max(self.n_nodes, 1)
+
+    def rescale(self, factor):
+        """Graph whose weights are multiplied by `factor`"""
+        return self.__class__(self.adjacency * factor)
+
+    def drop_edges(self, fraction, random_state=None):
+        """Graph without a random `fraction` of the edges"""
+        if not isinstance(random_state, np.random.RandomState):
+            random_state = np.random.RandomState(random_state)
+        upper = sparse.triu(self.adjacency, k=1).tocoo()
+        keep = random_state.random_sample(upper.nnz) >= fraction
+        return self.from_edges(upper.row[keep], upper.col[keep],
+                               self.n_nodes, upper.data[keep])
+
+
+class Nodes(object):
+    """State (index in `NetworkSEIRS.variable_names`) of each node"""
+    def __init__(self, state):
+        self.state = state
+
+    def __len__(self):
+        return len(self.state)
+
+    def __repr__(self):
+        return "{}(n_nodes={})".format(self.__class__.__name__, len(self))
+
+    def copy(self):
+        return self.__class__(self.state.copy())
+
+
+def without_interventions(population):
+    """`population` without its `InterventionDecorator`s"""
+    while isinstance(population, InterventionDecorator):
+        population = population._population_parameter
+    return population
+
+
+class NetworkSEIRS(IndividualModel):
+    """
+    Parameters (as `SEIRS`)
+    -----------------------
+    beta, kappa, gamma, ksi: float
+
+    Graph
+    -----
+    graph: `ContactGraph`
+        One node per individual
+    intervention: str
+        How a reduction of the contacts (`beta < reference_beta`) is applied
+        to the graph: "rescale" the weights or "drop" edges
+    reference_beta: float or None
+        `beta` of the population without interventions (default: `beta`).
+        Set by `factory`.
+    random_state: int, `np.random.RandomState` or None
+    """
+    variable_names = ("susceptible", "exposed", "infectious", "recovered")
+    INTERVENTIONS = ("rescale", "drop")
+
+    @classmethod
+    def compute_parameters(cls, virus, population):
+        beta = population.contact_frequency * virus.transmission_rate
+        kappa = 1. / virus.exposed_duration
+        gamma = 1. / virus.infectious_duration
+        ksi = virus.immunity_drop_rate
+        return beta, kappa, gamma, ksi
+
+    @classmethod
+    def factory(cls, initial_state, virus, population, resolution=1.,
+                backend=None, **kwargs):
+        """
+        As `Model.factory`; `kwargs` are the graph settings (see the class
+        documentation). The reference contact frequency is that of
+        `population` without its interventions.
+        """
+        if kwargs.get("reference_beta") is None:
+            kwargs["reference_beta"] = cls.compute_parameters(
+                virus, without_interventions(population))[0]
+        return super().factory(initial_state, virus, population, resolution,
+                               backend, **kwargs)
+
+    def __init__(self, beta, kappa, gamma, ksi, resolution=1., graph=None,
+                 intervention="rescale", reference_beta=None,
+                 random_state=None):
+        super().__init__(random_state)
+        if graph is None:
+            raise ValueError("{} needs a contact graph"
+                             "".format(self.__class__.__name__))
+        if intervention not in self.INTERVENTIONS:
+            raise ValueError("Unknown intervention '{}' (choose among {})"
+                             "".format(intervention,
+                                       ", ".join(self.INTERVENTIONS)))
+        self.beta = beta
+        self.kappa = kappa
+        self.gamma = gamma
+        self.ksi = ksi
+        self.intervention = intervention
+        self.reference_beta = beta if reference_beta is None \
+            else reference_beta
+
+        # Rate per unit of weight of the graph without interventions
+        self.base_graph = graph
+        self.transmission_rate = self.reference_beta / graph.mean_degree
+        ratio = beta / self.reference_beta if self.reference_beta > 0 else 0.
+        if intervention == "drop" and ratio < 1:
+            with profiling.timer("NetworkSEIRS.drop_edges"):
+                self.graph = graph.drop_edges(1. - ratio, self.random_state)
+        else:
+            # Rescaling all the weights is a factor of the mat-vec
+            self.graph = graph
+            self.transmission_rate *= ratio
+
+        # Daily probability of leaving each state, and next state
+        self.p_leave = -np.expm1(-np.array([0., kappa, gamma, ksi]))
+        self.next_state = np.array([0, 2, 3, 0], dtype=np.int8)
+
+    def __repr__(self):
+        return "{}(beta={}, kappa={}, gamma={}, ksi={}, graph={}, " \
+               "intervention={}, reference_beta={})" \
+               "".format(self.__class__.__name__, repr(self.beta),
+                         repr(self.kappa), repr(self.gamma), repr(self.ksi),
+                         repr(self.base_graph), repr(self.intervention),
+                         repr(self.reference_beta))
+
+    def __str__(self):
+        return "{}(beta={:.2e}, kappa={:.2e}, gamma={:.2e}, ksi={:.2e}, " \
+               "n_nodes={}, n_edges={})".format(self.__class__.__name__,
+                                                self.beta, self.kappa,
+                                                self.gamma, self.ksi,
+                                                self.graph.n_nodes,
+                                                self.graph.n_edges)
+
+    def _compute_reproduction_number(self, n_susceptible, n_total):
+        # Of the mean-field `SEIRS` with the same rates
+        return self.beta / self.gamma * n_susceptible / n_total
+
+    def generate(self, state, random_state):
+        counts = self._state2variables(state)
+        if sum(counts) != self.graph.n_nodes:
+            raise ValueError("The population ({}) differs from the number of "
+                             "nodes ({})".format(sum(counts),
+                                                 self.graph.n_nodes))
+        nodes = np.repeat(np.arange(len(counts), dtype=np.int8), counts)
+        random_state.shuffle(nodes)
+        return Nodes(nodes)
+
+    def counts(self, nodes):
+        return np.bincount(nodes.state, minlength=len(self.variable_names))
+
+    def pressure(self, nodes):
+        """
+        Infection pressure on each node: sum of the weights of its edges to
+        infectious nodes. As the adjacency is symmetric, only the rows of
+        the infectious nodes are involved.
+        """
+        infectious = np.flatnonzero(nodes.state == 2)
+        rows = self.graph.adjacency[infectious]
+        return rows.T.dot(np.ones(len(infectious), dtype=np.float32))
+
+    def step(self, nodes, random_state):
+        state = nodes.state
+        with profiling.timer("NetworkSEIRS.infections"):
+            pressure = self.pressure(nodes)
+            susceptible = np.flatnonzero(state == 0)
+            p = -np.expm1(-self.transmission_rate * pressure[susceptible])
+            draws = random_state.random_sample(len(susceptible))
+            infected = susceptible[draws < p]
+
+        with profiling.timer("NetworkSEIRS.progression"):
+            active = np.flatnonzero(self.p_leave[state] > 0)
+            leaving = active[random_state.random_sample(len(active)) <
+                             self.p_leave[state[active]]]
+            state[leaving] = self.next_state[state[leaving]]
+        state[infected] = 1
+        return len(infected),
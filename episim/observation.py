@@ -0,0 +1,205 @@
+"""
+Observation model: the daily number of cases reported by the surveillance
+given the daily infections of outcomes.
+
+A fraction `ascertainment` of the infections is reported, after a reporting
+delay (from the infection), the daily counts being modulated by weekday
+effects and drawn from a negative binomial distribution (Poisson if
+`dispersion` is None). Series are handled as arrays [..., n_days], the
+delay being applied to all of them at once in the Fourier domain:
+
+    reporting = ReportedCases(ascertainment=.2, reporting_delay=Delay(7, 3),
+                              weekday_effects=(1.2, 1.1, 1, 1, 1, .8, .6),
+                              dispersion=10)
+    reporting.expected_of(outcomes)            # [n_outcomes, n_days]
+    reporting.sample_of(outcomes, 100)         # [100, n_outcomes, n_days]
+    reporting.log_likelihood(daily_cases, infections, start_date)
+
+As a likelihood of `CaseLikelihood`, it applies to the simulated infections:
+
+    CaseLikelihood(model, daily_cases, ("R_0",), observation=reporting)
+"""
+import numpy as np
+from scipy import fft
+from scipy.special import gammaln
+
+from . import profiling
+from .data import Ensemble
+from .filtering import poisson_log_likelihood
+
+
+def negative_binomial_log_likelihood(dispersion):
+    """
+    `log_likelihood(n_cases, expected)` of a negative binomial distribution
+    of mean `expected` and variance `expected + expected**2 / dispersion`
+    (e.g. for `CaseLikelihood` or `ParticleFilter`)
+    """
+    k = float(dispersion)
+
+    def log_likelihood(n_cases, expected):
+        expected = np.maximum(expected, 1e-12)
+        return gammaln(n_cases + k) - gammaln(k) - gammaln(n_cases + 1) + \
+            k * np.log(k / (k + expected)) + \
+            n_cases * np.log(expected / (k + expected))
+    return log_likelihood
+
+
+class ReportedCases(object):
+    """
+    Parameters
+    ----------
+    ascertainment: float or array
+        Fraction of the infections which are reported (an array broadcast
+        against the series, e.g. [n_outcomes, 1], varies it across them)
+    reporting_delay: `healthcare.Delay` or None
+        Delay between the infection and the report (None: the same day)
+    weekday_effects: sequence of 7 floats or None
+        Relative reporting on Mondays, ..., Sundays (rescaled to a mean of 1,
+        so as to preserve weekly totals)
+    dispersion: float or None
+        Size of the negative binomial noise (the lower, the noisier; None:
+        Poisson)
+    """
+    def __init__(self, ascertainment=1., reporting_delay=None,
+                 weekday_effects=None, dispersion=None):
+        self.ascertainment = ascertainment
+        self.reporting_delay = reporting_delay
+        if weekday_effects is not None:
+            weekday_effects = np.asarray(weekday_effects, dtype=float)
+            if weekday_effects.shape != (7,):
+                raise ValueError("Expected 7 weekday effects, got {}"
+                                 "".format(len(weekday_effects)))
+            weekday_effects = weekday_effects / weekday_effects.mean()
+        self.weekday_effects = weekday_effects
+        self.dispersion = dispersion
+        self.log_pmf = poisson_log_likelihood if dispersion is None else \
+            negative_binomial_log_likelihood(dispersion)
+        self._kernel = None if reporting_delay is None \
+            else reporting_delay.pmf()
+        self._spectra = {}
+
+    def __repr__(self):
+        weekday_effects = self.weekday_effects
+        if weekday_effects is not None:
+            weekday_effects = tuple(float(w) for w in weekday_effects)
+        return "{}(ascertainment={}, reporting_delay={}, weekday_effects={}, " \
+               "dispersion={})".format(self.__class__.__name__,
+                                       repr(self.ascertainment),
+                                       repr(self.reporting_delay),
+                                       repr(weekday_effects),
+                                       repr(self.dispersion))
+
+    def _delayed(self, infections):
+        """Infections [..., n_days] convolved with the reporting delay"""
+        if self._kernel is None:
+            return infections
+        n_days = infections.shape[-1]
+        size = fft.next_fast_len(n_days + len(self._kernel) - 1, real=True)
+        with profiling.timer("ReportedCases.fft"):
+            kernel = self._spectra.get(size)
+            if kernel is None:
+                kernel = self._spectra[size] = fft.rfft(self._kernel, size)
+            delayed = fft.irfft(fft.rfft(infections, size) * kernel,
+                                size)[..., :n_days]
+        # The round-off of the transforms may leave tiny negative values
+        return np.maximum(delayed, 0.)
+
+    def weekday_factors(self, n_days, start_date=None):
+        """Factors [n_days] of the days following `start_date` (included)"""
+        if self.weekday_effects is None:
+            return np.ones(n_days)
+        if start_date is None:
+            raise ValueError("The weekday effects require the start date")
+        days = (start_date.weekday() + np.arange(n_days)) % 7
+        return self.weekday_effects[days]
+
+    def expected(self, infections, start_date=None):
+        """
+        Expected number of reported cases.
+
+        Parameters
+        ----------
+        infections: array-like [..., n_days]
+            Daily infections. NaN (e.g. after the end of a shorter outcome of
+            an ensemble) count as no infection, the reports being NaN there.
+        start_date: `datetime.date` or None
+            Date of the first day (required by the weekday effects)
+
+        Return
+        ------
+        expected: np.ndarray [..., n_days]
+        """
+        infections = np.asarray(infections, dtype=float)
+        missing = np.isnan(infections)
+        expected = self._delayed(np.where(missing, 0., infections))
+        expected = expected * self.ascertainment * \
+            self.weekday_factors(infections.shape[-1], start_date)
+        expected[np.broadcast_to(missing, expected.shape)] = np.nan
+        return expected
+
+    @profiling.timed("ReportedCases.sample")
+    def sample(self, infections, start_date=None, n_samples=None,
+               random_state=None):
+        """
+        Synthetic reported series: array [..., n_days], or
+        [n_samples, ..., n_days] if `n_samples` is not None (NaN where
+        `infections` is NaN)
+        """
+        if not isinstance(random_state, np.random.RandomState):
+            random_state = np.random.RandomState(random_state)
+        expected = self.expected(infections, start_date)
+        if n_samples is not None:
+            expected = np.broadcast_to(expected, (n_samples,) + expected.shape)
+        missing = np.isnan(expected)
+        mean = np.where(missing, 0., expected)
+        if self.dispersion is not None:
+            # Negative binomial as a gamma mixture of Poisson distributions
+            k = self.dispersion
+            mean = random_state.gamma(k, mean / k)
+        cases = random_state.poisson(mean).astype(float)
+        cases[missing] = np.nan
+        return cases
+
+    def log_likelihood(self, reported, infections, start_date=None):
+        """
+        Log-likelihood of the `reported` cases [n_days] given the daily
+        `infections` [..., n_days], summed over the days (those where
+        `reported` is NaN are skipped)
+
+        Return
+        ------
+        log_likelihood: float or np.ndarray [...]
+        """
+        reported = np.asarray(reported, dtype=float)
+        expected = self.expected(infections, start_date)
+        known = ~np.isnan(reported)
+        log_l = self.log_pmf(reported[known], expected[..., known])
+        return log_l.sum(axis=-1)
+
+    def expected_of(self, outcomes, field="n_infection"):
+        """
+        `expected` of an `Outcome` ([n_days]) or of an `Ensemble` / sequence
+        of outcomes ([n_outcomes, n_days]), the daily infections being the
+        increments of the counter `field`
+        """
+        return self.expected(*_daily(outcomes, field))
+
+    def sample_of(self, outcomes, n_samples=None, field="n_infection",
+                  random_state=None):
+        """`sample` of an `Outcome` or of an `Ensemble` / sequence of them"""
+        infections, start_date = _daily(outcomes, field)
+        return self.sample(infections, start_date, n_samples, random_state)
+
+
+def _daily(outcomes, field):
+    """Daily increments of `field` and date of the first day"""
+    if hasattr(outcomes, "daily"):
+        return outcomes.daily(field), outcomes.start_date
+    if not isinstance(outcomes, Ensemble):
+        outcomes = Ensemble(outcomes)
+    start_dates = {o.start_date for o in outcomes}
+    if len(start_dates) > 1:
+        raise ValueError("The outcomes do not start on the same day")
+    values = outcomes.column(field)
+    return np.diff(values, axis=-1, prepend=values[..., :1]), \
+        start_dates.pop()
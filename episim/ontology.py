@@ -1,3 +1,6 @@
+from . import profiling
+
+
 class Queryable(object):
     def __init__(self, ontology, state):
         self.ontology = ontology
@@ -52,6 +55,110 @@ class Ontology(object):
             }
         )
 
+    @classmethod
+    def staged_ontology(cls, n_exposed, n_infectious):
+        """
+        Default ontology whose exposed and infectious entries are divided into
+        `n_exposed` and `n_infectious` sub-stages ("exposed_1", ... with short
+        names "E1", ...)
+        """
+        def stages(name, short_name, n):
+            return {WithShort("{}_{:d}".format(name, i), "{}{:d}"
+                              "".format(short_name, i)): None
+                    for i in range(1, n + 1)}
+
+        return cls(
+            {
+                WithShort("population", "N"): {
+                    WithShort("living", "L"): {
+                        WithShort("susceptible", "S"): None,
+                        WithShort("infected", "Id"): {
+                            WithShort("exposed", "E"):
+                                stages("exposed", "E", n_exposed),
+                            WithShort("infectious", "I"):
+                                stages("infectious", "I", n_infectious),
+                        },
+                        WithShort("recovered", "R"): None
+                    },
+                    WithShort("deceased", "D"): None
+                    }
+            }
+        )
+
+    @classmethod
+    def vaccination_ontology(cls, strata=()):
+        """
+        Ontology with vaccinated and partially immune (whose protection
+        has waned) entries. With `strata` (names, e.g. age groups), each
+        compartment is divided into one sub-entry per stratum
+        ("susceptible_<stratum>" with short name "S_<stratum>", ...)
+        """
+        def strata_of(name, short_name):
+            return cls._divided(name, short_name, strata)
+
+        return cls(
+            {
+                WithShort("population", "N"): {
+                    WithShort("living", "L"): {
+                        WithShort("susceptible", "S"):
+                            strata_of("susceptible", "S"),
+                        WithShort("infected", "Id"): {
+                            WithShort("exposed", "E"):
+                                strata_of("exposed", "E"),
+                            WithShort("infectious", "I"):
+                                strata_of("infectious", "I"),
+                        },
+                        WithShort("recovered", "R"):
+                            strata_of("recovered", "R"),
+                        WithShort("vaccinated", "V"):
+                            strata_of("vaccinated", "V"),
+                        WithShort("partially_immune", "P"):
+                            strata_of("partially_immune", "P"),
+                    },
+                    WithShort("deceased", "D"): strata_of("deceased", "D"),
+                    }
+            }
+        )
+
+    @classmethod
+    def strain_ontology(cls, strains):
+        """
+        Default ontology whose exposed, infectious and recovered entries are
+        divided into one sub-entry per strain ("exposed_<strain>" with short
+        name "E_<strain>", ...). The susceptible entry gathers those who
+        have no immunity left against any strain.
+        """
+        def strains_of(name, short_name):
+            return cls._divided(name, short_name, strains)
+
+        return cls(
+            {
+                WithShort("population", "N"): {
+                    WithShort("living", "L"): {
+                        WithShort("susceptible", "S"): None,
+                        WithShort("infected", "Id"): {
+                            WithShort("exposed", "E"):
+                                strains_of("exposed", "E"),
+                            WithShort("infectious", "I"):
+                                strains_of("infectious", "I"),
+                        },
+                        WithShort("recovered", "R"):
+                            strains_of("recovered", "R"),
+                    },
+                    WithShort("deceased", "D"): None
+                    }
+            }
+        )
+
+    @staticmethod
+    def _divided(name, short_name, parts):
+        """Children "<name>_<part>" of an entry (None if no `parts`)"""
+        if len(parts) == 0:
+            return None
+        return {WithShort("{}_{}".format(name, part),
+                          "{}_{}".format(short_name, part)): None
+                for part in parts}
+
     def __init__(self, tree_dict):
         self.onto_tree = tree_dict
         self.entries = {}
@@ -69,6 +176,7 @@ class Ontology(object):
             self._fill_entries(value)
 
     def __call__(self, state):
+        profiling.count("Ontology.query")
         return Queryable(self, state)
 
     def children_names(self, s):
@@ -77,12 +185,23 @@ class Ontology(object):
             for k in d.keys():
                 yield str(k)
 
+    def leaves(self):
+        """Names of the leaves (the compartments), in definition order"""
+        return [name for name, children in self.entries.items()
+                if children is None]
+
     def shorten(self, long_name, short_name):
         self.short_names[long_name] = short_name
 
     def shortest_name(self, name):
         return self.short_names.get(name, name)
 
+    def longest_name(self, name):
+        for long_name, short_name in self.short_names.items():
+            if short_name == name:
+                return long_name
+        return name
+
 
 
 
@@ -25,6 +25,33 @@ class VirusParameter(object, metaclass=ABCMeta):
     def immunity_drop_rate(self):
         return 0
 
+    @property
+    def asymptomatic_ratio(self):
+        # Proportion of the infections which never show symptoms
+        return 0
+
+    @property
+    def asymptomatic_infectiousness(self):
+        # Infectiousness of asymptomatic cases relative to the (pre)symptomatic
+        return 1
+
+    @property
+    def presymptomatic_duration(self):
+        # Part of the infectious duration before the symptoms
+        return .5 * self.infectious_duration
+
+    @property
+    def symptomatic_duration(self):
+        return self.infectious_duration - self.presymptomatic_duration
+
+    @property
+    def symptomatic_fatality_rate(self):
+        return 0
+
+    @property
+    def asymptomatic_fatality_rate(self):
+        return 0
+
     @property
     def transmission_rate(self):
         # Discuss this
@@ -57,6 +84,30 @@ class VPDecorator(VirusParameter):
     def immunity_drop_rate(self):
         return self._virus_parameter.immunity_drop_rate
 
+    @property
+    def asymptomatic_ratio(self):
+        return self._virus_parameter.asymptomatic_ratio
+
+    @property
+    def asymptomatic_infectiousness(self):
+        return self._virus_parameter.asymptomatic_infectiousness
+
+    @property
+    def presymptomatic_duration(self):
+        return self._virus_parameter.presymptomatic_duration
+
+    @property
+    def symptomatic_duration(self):
+        return self._virus_parameter.symptomatic_duration
+
+    @property
+    def symptomatic_fatality_rate(self):
+        return self._virus_parameter.symptomatic_fatality_rate
+
+    @property
+    def asymptomatic_fatality_rate(self):
+        return self._virus_parameter.asymptomatic_fatality_rate
+
 
 class TransmissionRateMultiplier(VPDecorator):
     def __init__(self, virus_parameter, weight=1.):
@@ -1,3 +1,34 @@
-from .single_outcome import StatePlot, CumulStatePlot, InfectedPlot, \
-    ReproductionNumberPlot, InfectionNumberPlot, RiskyContactPlot, \
-    StateDashboard, FullDashboard
+"""
+The plotting subsystem (and therefore matplotlib) is only loaded when one of
+its names is first accessed, so that `import episim.plot` stays cheap.
+"""
+import importlib
+
+
+_LAZY = {
+    "StatePlot": "single_outcome",
+    "CumulStatePlot": "single_outcome",
+    "InfectedPlot": "single_outcome",
+    "ReproductionNumberPlot": "single_outcome",
+    "InfectionNumberPlot": "single_outcome",
+    "RiskyContactPlot": "single_outcome",
+    "StateDashboard": "single_outcome",
+    "FullDashboard": "single_outcome",
+}
+
+__all__ = list(_LAZY)
+
+
+def __getattr__(name):
+    module_name = _LAZY.get(name)
+    if module_name is None:
+        raise AttributeError("module {} has no attribute {}"
+                             "".format(repr(__name__), repr(name)))
+    module = importlib.import_module("." + module_name, __name__)
+    value = getattr(module, name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,394 @@
+"""
+Animation of the evolution of one or several runs, day by day.
+
+Sources are either finished `Outcome`s or `Live` runs, which pull their
+states from `Model.run` as the animation goes:
+
+    dashboard = AnimatedDashboard()(outcome_1, outcome_2)
+    dashboard.play()                      # interactive, blitted
+    dashboard.save("run.mp4", fps=30)     # streamed to a movie writer
+
+    AnimatedDashboard()(Live(model, 3650)).play(frame_step=7)
+
+The artists are created once; each frame only updates their data (views on
+preallocated buffers, scaled as the days become available, decimated if the
+dashboard has a `decimator`). When playing interactively, the static part of
+the figure is cached and only the lines are redrawn (blitting).
+"""
+import datetime
+
+import numpy as np
+from matplotlib import animation as mpl_animation
+from matplotlib import pyplot as plt
+
+from episim import profiling
+from .plot import Plot, Dashboard
+
+
+COLUMNS = ("susceptible", "exposed", "infectious", "recovered", "infected",
+           "n_infection", "reproduction_number")
+
+
+class Track(object):
+    """
+    Preallocated buffers (one per column of `COLUMNS`) of a run. `length`
+    is the number of days available so far.
+    """
+    def __init__(self, n_steps, population_size, start_date, dates=None,
+                 name=None):
+        self.n_steps = n_steps
+        self.population_size = float(population_size)
+        self.start_date = start_date
+        self.dates = [start_date] if dates is None else list(dates)
+        self.name = name
+        self.columns = {c: np.full(n_steps, np.nan) for c in COLUMNS}
+        self.length = 0
+
+    def advance(self, index):
+        """Make sure that day `index` is available (if it ever will)"""
+        return index < self.length
+
+    def __getitem__(self, column):
+        return self.columns[column][:self.length]
+
+
+class OutcomeTrack(Track):
+    def __init__(self, outcome):
+        super().__init__(len(outcome), outcome.population_size,
+                         outcome.start_date, outcome.dates, outcome.name)
+        for column in COLUMNS:
+            self.columns[column][:] = outcome.column(column)
+        self.length = self.n_steps
+
+
+class Live(object):
+    """A run of `model` over `n_days`, animated while it is simulated"""
+    def __init__(self, model, n_days, name=None):
+        self.model = model
+        self.n_days = n_days
+        self.name = name
+
+
+class LiveTrack(Track):
+    def __init__(self, live):
+        model = live.model
+        state = model.ontology(model.current_state)
+        super().__init__(live.n_days + 1, state.population,
+                         model.current_state.date, name=live.name)
+        self.ontology = model.ontology
+        self._states = model.run(live.n_days)
+        self._append(state)
+
+    def _append(self, state):
+        i = self.length
+        for column in COLUMNS:
+            value = getattr(state, column)
+            self.columns[column][i] = np.nan if value is None else value
+        self.length += 1
+
+    def advance(self, index):
+        while self.length <= index:
+            state = next(self._states, None)
+            if state is None:
+                return False
+            self._append(self.ontology(state))
+        return True
+
+
+def as_track(source):
+    if isinstance(source, Track):
+        return source
+    if isinstance(source, Live):
+        return LiveTrack(source)
+    return OutcomeTrack(source)
+
+
+class AnimatedSeries(object):
+    """
+    Line of a (scaled) column of a track. The scaled values are kept in a
+    preallocated buffer, filled (and their maximum updated) as the days of
+    the track become available.
+    """
+    def __init__(self, line, track, column, scale):
+        self.line = line
+        self.track = track
+        self.column = column
+        self.scale = scale
+        self.values = np.full(track.n_steps, np.nan)
+        self.length = 0
+        self.maximum = np.nan
+
+    def fill(self):
+        """Scale the days made available since the last call"""
+        end = self.track.length
+        if end > self.length:
+            new = self.track.columns[self.column][self.length:end]
+            np.multiply(new, self.scale, out=self.values[self.length:end])
+            if not np.all(np.isnan(new)):
+                self.maximum = np.nanmax([self.maximum, np.nanmax(
+                    self.values[self.length:end])])
+            self.length = end
+
+
+class AnimatedPlot(Plot):
+    """
+    Lines of (scaled) columns of the tracks whose data is updated in place
+    at each frame.
+    """
+    title = ""
+    ylabel = ""
+
+    def __init__(self, ax=None, convention=None, decimator=None):
+        super().__init__(ax, convention, decimator)
+        self.lines = []  # `AnimatedSeries`
+
+    def series(self, i, color, track):
+        """Yield (column, color, label, linestyle, scale) for the track"""
+        return iter(())
+
+    def plot_tracks(self, tracks, colors, n_steps, animated):
+        for i, (track, color) in enumerate(zip(tracks, colors)):
+            for column, c, label, linestyle, scale in self.series(i, color,
+                                                                  track):
+                line, = self.axes.plot([], [], color=c, label=label,
+                                       linestyle=linestyle,
+                                       animated=animated)
+                series = AnimatedSeries(line, track, column, scale)
+                series.fill()
+                self.lines.append(series)
+
+        self.axes.set_xlim(0, max(n_steps - 1, 1))
+        self.rescale(initial=True)
+        self.axes.set_title(self.title)
+        self.axes.set_ylabel(self.ylabel)
+        self.axes.grid(True)
+        handles, _ = self.axes.get_legend_handles_labels()
+        if 0 < len(handles) <= 8:
+            self.axes.legend(loc="upper right")
+        return self
+
+    def rescale(self, initial=False):
+        """
+        Grow the y axis if some value does not fit.
+
+        Return
+        ------
+        changed: bool
+            Whether the limits have changed
+        """
+        top = 0
+        for series in self.lines:
+            if not np.isnan(series.maximum):
+                top = max(top, series.maximum)
+        if top <= 0:
+            top = 1.
+        current = self.axes.get_ylim()[1]
+        if initial or top > current:
+            # Some headroom to avoid rescaling at every frame
+            self.axes.set_ylim(0, top * (1.1 if initial else 1.5))
+            return True
+        return False
+
+    def update(self, index):
+        for series in self.lines:
+            series.fill()
+            end = min(index, series.length - 1) + 1
+            series.line.set_data(*self.decimate(self._t[:end],
+                                                series.values[:end]))
+        return [series.line for series in self.lines]
+
+    def set_tracks_dates(self, tracks, n_steps):
+        self._t = np.arange(n_steps)
+        dates = []
+        for track in tracks:
+            dates.extend(d for d in track.dates if d not in dates)
+        self.set_dates(sorted(dates))
+
+
+LINESTYLES = ("-", "--", ":", "-.")
+
+
+class AnimatedStatePlot(AnimatedPlot):
+    title = "State distribution with respect to time"
+    ylabel = "Percentage of population"
+
+    def series(self, i, color, track):
+        # The compartments have their own colors, runs their own line style
+        linestyle = LINESTYLES[i % len(LINESTYLES)]
+        N = track.population_size
+        convention = self.convention
+        suffix = "" if i == 0 else " ({:d})".format(i+1)
+        yield "susceptible", convention.susceptible_color, \
+              "Susceptible" + suffix, linestyle, 1. / N
+        if isinstance(track, LiveTrack) or \
+                np.nanmax(track.columns["exposed"]) > 0:
+            yield "exposed", convention.exposed_color, \
+                  "Exposed" + suffix, linestyle, 1. / N
+        yield "infectious", convention.infectious_color, \
+              "Infectious" + suffix, linestyle, 1. / N
+        yield "recovered", convention.recovered_color, \
+              "Recovered" + suffix, linestyle, 1. / N
+
+
+class AnimatedInfectedPlot(AnimatedPlot):
+    title = "Number of infections (E+I)"
+    ylabel = "Number of infection"
+
+    def series(self, i, color, track):
+        label = track.name if track.name else "Outcome {:d}".format(i+1)
+        yield "infected", color, label, "-", 1.
+
+
+class AnimatedInfectionNumberPlot(AnimatedPlot):
+    title = "Percentage of cumulative infection"
+    ylabel = "Perc. cumul. infection"
+
+    def series(self, i, color, track):
+        yield "n_infection", color, None, "-", 1. / track.population_size
+
+
+class AnimatedReproductionNumberPlot(AnimatedPlot):
+    title = "Reproduction number"
+    ylabel = "Reproduction number"
+
+    def series(self, i, color, track):
+        yield "reproduction_number", color, None, "-", 1.
+
+
+class AnimatedDashboard(Dashboard):
+    """
+    2x2 dashboard (state distribution, infected, cumulative infection and
+    reproduction number) of one or several sources (`Outcome` or `Live`),
+    overlaid with one color per source.
+    """
+    plot_factories = (AnimatedStatePlot, AnimatedInfectedPlot,
+                      AnimatedInfectionNumberPlot,
+                      AnimatedReproductionNumberPlot)
+
+    def __init__(self, fig=None, convention=None, decimator=None):
+        super().__init__(fig, convention, decimator)
+        self.tracks = []
+        self.plots = []
+        self.n_steps = 0
+        self._animated = None
+        self._background = None
+        self._date_text = None
+
+    def __call__(self, *sources):
+        self.tracks = [as_track(source) for source in sources]
+        self.n_steps = max(track.n_steps for track in self.tracks)
+        return self
+
+    def _build(self, animated):
+        """Create the axes and the artists (once per mode)"""
+        if self._animated == animated:
+            return
+        self.figure.clf()
+        self._animated = animated
+        all_axes = self.figure.subplots(2, 2, sharex=True)
+        colors = list(self.convention.yield_colors(len(self.tracks)))
+        self.plots = []
+        for ax, factory in zip(all_axes.ravel(), self.plot_factories):
+            plot = factory(ax, self.convention, self.decimator)
+            plot.plot_tracks(self.tracks, colors, self.n_steps, animated)
+            plot.set_tracks_dates(self.tracks, self.n_steps)
+            self.plots.append(plot)
+
+        self._date_text = all_axes[0, 0].text(
+            .02, .95, "", transform=all_axes[0, 0].transAxes,
+            verticalalignment="top", animated=animated)
+        self.figure.subplots_adjust(hspace=0.3, wspace=0.3)
+
+    def frames(self, frame_step=1):
+        """Yield the indices of the frames (the last day is always shown)"""
+        index = 0
+        last = self.n_steps - 1
+        while True:
+            index = min(index, last)
+            for track in self.tracks:
+                track.advance(index)
+            yield index
+            if index >= last:
+                return
+            index += frame_step
+
+    def update(self, index):
+        """
+        Update the artists for day `index`.
+
+        Return
+        ------
+        redraw: bool
+            Whether the static part of the figure has changed (axis limits)
+        """
+        with profiling.timer("AnimatedDashboard.update"):
+            redraw = False
+            for plot in self.plots:
+                plot.update(index)
+                redraw = plot.rescale() or redraw
+
+            date = self.tracks[0].start_date + datetime.timedelta(days=index)
+            self._date_text.set_text(date.strftime("%d/%m/%y"))
+        return redraw
+
+    @property
+    def artists(self):
+        artists = [series.line for plot in self.plots
+                   for series in plot.lines]
+        artists.append(self._date_text)
+        return artists
+
+    def _capture_background(self):
+        canvas = self.figure.canvas
+        canvas.draw()
+        self._background = canvas.copy_from_bbox(self.figure.bbox)
+
+    def _blit(self):
+        canvas = self.figure.canvas
+        canvas.restore_region(self._background)
+        for artist in self.artists:
+            self.figure.draw_artist(artist)
+        canvas.blit(self.figure.bbox)
+        canvas.flush_events()
+
+    def play(self, frame_step=1, interval=0.):
+        """
+        Play the animation in the (interactive) figure, redrawing only the
+        lines at each frame.
+
+        frame_step: int
+            Number of days between two frames
+        interval: float
+            Minimum time (in seconds) between two frames
+        """
+        self._build(animated=True)
+        plt.show(block=False)
+        self._capture_background()
+        for index in self.frames(frame_step):
+            if self.update(index):
+                self._capture_background()
+            self._blit()
+            if interval > 0:
+                plt.pause(interval)
+        return self
+
+    def save(self, fpath, fps=25, frame_step=1, writer=None, dpi=None,
+             **writer_kwargs):
+        """
+        Stream the frames to a movie file.
+
+        writer: str, `matplotlib.animation.AbstractMovieWriter` or None
+            If None, "pillow" is used for GIF files and "ffmpeg" otherwise
+        """
+        if writer is None:
+            writer = "pillow" if fpath.lower().endswith(".gif") else "ffmpeg"
+        if isinstance(writer, str):
+            writer = mpl_animation.writers[writer](fps=fps, **writer_kwargs)
+
+        self._build(animated=False)
+        with writer.saving(self.figure, fpath, dpi):
+            for index in self.frames(frame_step):
+                self.update(index)
+                with profiling.timer("AnimatedDashboard.grab_frame"):
+                    writer.grab_frame()
+        return self
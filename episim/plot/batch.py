@@ -0,0 +1,144 @@
+"""
+Headless batch rendering of dashboards to files.
+
+Rendering uses the non-interactive Agg backend (nothing is shown, nothing
+blocks) and is spread over a pool of processes. Each process allocates a
+single figure and recycles it for every dashboard it renders.
+
+    jobs = [RenderJob(ComparatorDashboard, outcomes, "comparison")]
+    jobs += [RenderJob(FullDashboard, [o], "dashboard_{}".format(i))
+             for i, o in enumerate(outcomes)]
+    renderer = BatchRenderer(output_dir="report", formats=("png", "svg"))
+    renderer(jobs)                   # one file per job and format
+    renderer.to_pdf(jobs, "report.pdf")  # one page per job
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+
+
+FORMATS = ("png", "pdf", "svg")
+
+
+def use_headless_backend():
+    matplotlib.use("Agg", force=True)
+
+
+class RenderJob(object):
+    """
+    A dashboard class (e.g. `FullDashboard`, `ComparatorDashboard`), the
+    outcomes it is called with and the base name (without extension) of the
+    files to produce. `kwargs` are passed to the dashboard (e.g.
+    `healthcare`).
+    """
+    def __init__(self, dashboard_cls, outcomes, basename, **kwargs):
+        self.dashboard_cls = dashboard_cls
+        self.outcomes = list(outcomes)
+        self.basename = basename
+        self.kwargs = kwargs
+
+    def __repr__(self):
+        return "{}({}, <{} outcomes>, {})" \
+               "".format(self.__class__.__name__,
+                         self.dashboard_cls.__name__,
+                         len(self.outcomes),
+                         repr(self.basename))
+
+    def draw(self, figure):
+        figure.clf()
+        return self.dashboard_cls(fig=figure, **self.kwargs)(*self.outcomes)
+
+
+# Figure recycled by all the jobs of a (worker) process
+_figure = None
+
+
+def _get_figure(figsize):
+    global _figure
+    from matplotlib import pyplot as plt
+    if _figure is None or not plt.fignum_exists(_figure.number):
+        _figure = plt.figure(figsize=figsize)
+    else:
+        _figure.set_size_inches(*figsize)
+    return _figure
+
+
+def _render(job, output_dir, formats, figsize, savefig_kwargs):
+    dashboard = job.draw(_get_figure(figsize))
+    fpaths = []
+    for fmt in formats:
+        fpath = os.path.join(output_dir, "{}.{}".format(job.basename, fmt))
+        dashboard.save(fpath, format=fmt, **savefig_kwargs)
+        fpaths.append(fpath)
+    return fpaths
+
+
+class BatchRenderer(object):
+    """
+    Parameters
+    ----------
+    output_dir: str
+        Directory where to write the files (created if needed)
+    formats: iterable of str
+        Subset of `FORMATS`
+    n_jobs: int or None
+        Number of processes. None for as many as CPUs, 1 to render in the
+        current process
+    figsize: (float, float)
+        Size of the figure, in inches
+    savefig_kwargs:
+        Forwarded to `Figure.savefig` (e.g. `dpi`)
+    """
+    def __init__(self, output_dir=".", formats=("png",), n_jobs=None,
+                 figsize=(20, 10), **savefig_kwargs):
+        for fmt in formats:
+            if fmt not in FORMATS:
+                raise ValueError("Unknown format '{}' (expected one of {})"
+                                 "".format(fmt, ", ".join(FORMATS)))
+        self.output_dir = output_dir
+        self.formats = tuple(formats)
+        self.n_jobs = n_jobs
+        self.figsize = figsize
+        self.savefig_kwargs = savefig_kwargs
+
+    def __call__(self, jobs):
+        """
+        Render the jobs, one file per job and format.
+
+        Return
+        ------
+        fpaths: list of list of str
+            The paths of the files produced by each job
+        """
+        jobs = list(jobs)
+        os.makedirs(self.output_dir, exist_ok=True)
+        args = (self.output_dir, self.formats, self.figsize,
+                self.savefig_kwargs)
+
+        if self.n_jobs == 1 or len(jobs) <= 1:
+            use_headless_backend()
+            return [_render(job, *args) for job in jobs]
+
+        with ProcessPoolExecutor(max_workers=self.n_jobs,
+                                 initializer=use_headless_backend) as executor:
+            futures = [executor.submit(_render, job, *args) for job in jobs]
+            return [future.result() for future in futures]
+
+    def to_pdf(self, jobs, fpath):
+        """
+        Render the jobs as the successive pages of a single PDF file. The
+        pages are drawn sequentially (a PDF file cannot be written from
+        several processes).
+        """
+        from matplotlib.backends.backend_pdf import PdfPages
+        use_headless_backend()
+        dirname = os.path.dirname(fpath)
+        if len(dirname) > 0:
+            os.makedirs(dirname, exist_ok=True)
+        figure = _get_figure(self.figsize)
+        with PdfPages(fpath) as pdf:
+            for job in jobs:
+                job.draw(figure)
+                pdf.savefig(figure, **self.savefig_kwargs)
+        return fpath
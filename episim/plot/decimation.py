@@ -0,0 +1,155 @@
+"""
+Decimation of long series before handing them to matplotlib.
+
+Decimators select a subset of the time indices of one or several series
+(rows of a 2D array), vectorized over the series:
+
+ - `MinMaxDecimator` keeps, for each bucket of consecutive points, the
+   minimum and the maximum (so that no peak is lost);
+ - `LTTBDecimator` implements the Largest-Triangle-Three-Buckets algorithm,
+   which favours the visual shape of the curve.
+
+Either the series share the same selection (`__call__`, needed when they are
+drawn against each other, e.g. with `fill_between`) or each series is
+decimated on its own (`each`, for many independent lines).
+"""
+import numpy as np
+
+
+def as_2d(Y):
+    Y = np.asarray(Y, dtype=float)
+    if Y.ndim == 1:
+        Y = Y[np.newaxis, :]
+    return Y
+
+
+class Decimator(object):
+    """
+    Parameters
+    ----------
+    max_points: int
+        Maximum number of points kept per series. Series which are not
+        longer than that are left untouched.
+    """
+    def __init__(self, max_points=1000):
+        if max_points < 4:
+            raise ValueError("At least 4 points must be kept")
+        self.max_points = max_points
+
+    def __repr__(self):
+        return "{}(max_points={})".format(self.__class__.__name__,
+                                          repr(self.max_points))
+
+    def select(self, Y):
+        """
+        Parameters
+        ----------
+        Y: array [n_series, n_points]
+
+        Return
+        ------
+        indices: int array [n_series, n_selected]
+            Sorted indices selected for each series
+        """
+        n_series, n_points = Y.shape
+        return np.tile(np.arange(n_points), (n_series, 1))
+
+    def shared_indices(self, Y):
+        Y = as_2d(Y)
+        if Y.shape[1] <= self.max_points:
+            return np.arange(Y.shape[1])
+        return np.unique(self.select(Y))
+
+    def __call__(self, t, *ys):
+        """
+        Decimate `t` and the series `ys` with a common selection.
+
+        Return
+        ------
+        t, y_1, ..., y_k: the decimated arrays
+        """
+        Y = np.vstack([np.asarray(y, dtype=float) for y in ys])
+        idx = self.shared_indices(Y)
+        t = np.asarray(t)[idx]
+        return (t,) + tuple(Y[i, idx] for i in range(len(ys)))
+
+    def each(self, t, Y):
+        """
+        Decimate each series of `Y` [n_series, n_points] independently.
+
+        Return
+        ------
+        T, Y: arrays [n_series, n_selected]
+            Can be drawn in one go with `axes.plot(T.T, Y.T)`
+        """
+        Y = as_2d(Y)
+        t = np.asarray(t)
+        if Y.shape[1] <= self.max_points:
+            return np.tile(t, (Y.shape[0], 1)), Y
+        idx = self.select(Y)
+        return t[idx], np.take_along_axis(Y, idx, axis=1)
+
+
+class MinMaxDecimator(Decimator):
+    def select(self, Y):
+        n_series, n_points = Y.shape
+        if n_points <= self.max_points:
+            return super().select(Y)
+        # First and last points are always kept
+        n_buckets = (self.max_points - 2) // 2
+        bucket_size = int(np.ceil(n_points / float(n_buckets)))
+        n_padded = n_buckets * bucket_size
+        padded = np.pad(Y, ((0, 0), (0, n_padded - n_points)), mode="edge")
+        buckets = padded.reshape(n_series, n_buckets, bucket_size)
+
+        nan = np.isnan(buckets)
+        argmin = np.where(nan, np.inf, buckets).argmin(axis=2)
+        argmax = np.where(nan, -np.inf, buckets).argmax(axis=2)
+        offsets = np.arange(n_buckets) * bucket_size
+
+        idx = np.hstack([
+            np.zeros((n_series, 1), dtype=int),
+            argmin + offsets,
+            argmax + offsets,
+            np.full((n_series, 1), n_points - 1, dtype=int),
+        ])
+        idx = np.minimum(idx, n_points - 1)
+        idx.sort(axis=1)
+        return idx
+
+
+class LTTBDecimator(Decimator):
+    def select(self, Y):
+        n_series, n_points = Y.shape
+        if n_points <= self.max_points:
+            return super().select(Y)
+
+        t = np.arange(n_points, dtype=float)
+        Y = np.where(np.isnan(Y), 0, Y)
+        # Inner buckets (first and last points are buckets by themselves)
+        edges = np.linspace(1, n_points - 1,
+                            self.max_points - 1).astype(int)
+        rows = np.arange(n_series)
+
+        idx = np.zeros((n_series, self.max_points), dtype=int)
+        idx[:, -1] = n_points - 1
+        a = np.zeros(n_series, dtype=int)
+        for b in range(self.max_points - 2):
+            start, end = edges[b], edges[b + 1]
+            # Average of the next bucket (or the last point)
+            if b + 2 < len(edges):
+                nxt = slice(edges[b + 1], edges[b + 2])
+            else:
+                nxt = slice(n_points - 1, n_points)
+            c_t = t[nxt].mean()
+            c_y = Y[:, nxt].mean(axis=1)
+
+            a_t = t[a]
+            a_y = Y[rows, a]
+            area = np.abs((a_t - c_t)[:, np.newaxis]
+                          * (Y[:, start:end] - a_y[:, np.newaxis])
+                          - (a_t[:, np.newaxis] - t[start:end])
+                          * (c_y - a_y)[:, np.newaxis])
+            a = start + area.argmax(axis=1)
+            idx[:, b + 1] = a
+        return idx
@@ -1,5 +1,8 @@
 import numpy as np
 
+from episim import profiling
+from episim.data import Ensemble
+from .decimation import MinMaxDecimator
 from .plot import Plot, Dashboard
 from .single_outcome import DescriptionPlot
 
@@ -10,23 +13,69 @@ def index_color_outcome(convention, outcomes):
 
 
 class MultiOutputPlot(Plot):
+    """
+    Plot the same quantity for several outcomes, computed in one go over
+    them (each line being decimated on its own).
+
+    quantiles: sequence of float or None
+        If not None, the outcomes are seen as an ensemble and summarized by
+        bands between symmetric quantiles (e.g. `(.05, .25, .5, .75, .95)`)
+        instead of being drawn one line per outcome. The quantiles are
+        computed in one go over the ensemble.
+    """
+    def __init__(self, ax=None, convention=None, decimator=None,
+                 quantiles=None):
+        super().__init__(ax, convention, decimator)
+        self.quantiles = None if quantiles is None else sorted(quantiles)
+
     def __call__(self, *outcomes):
-        for i, c, o in index_color_outcome(self.convention, outcomes):
-            self.plot_outcome(o, color=c, label="Outcome {:d}".format(i+1))
-            self.set_dates(o.dates)
-        self.pack()
+        with profiling.timer(self.__class__.__name__):
+            if self.quantiles is None:
+                self.plot_outcomes(Ensemble(outcomes))
+                for o in outcomes:
+                    self.set_dates(o.dates)
+            else:
+                color = next(iter(self.convention.yield_colors(1)))
+                self.plot_ensemble(Ensemble(outcomes), color=color)
+                self.set_dates(outcomes[0].dates)
+            self.pack()
         return self
 
+    def values(self, ensemble):
+        """Array [n_outcomes, n_steps] of the plotted quantity"""
+        return np.zeros((len(ensemble), ensemble.n_steps))
+
+    def plot_outcomes(self, ensemble):
+        Y = self.values(ensemble)
+        T, Y = self.decimate_each(np.arange(Y.shape[1]), Y)
+
+        for i, c, o in index_color_outcome(self.convention, ensemble):
+            self.axes.plot(T[i], Y[i], color=c,
+                           label="Outcome {:d}".format(i+1))
+
+    def plot_ensemble(self, ensemble, color="k"):
+        qs = self.quantiles
+        bands = np.nanquantile(self.values(ensemble), qs, axis=0)
+        t, *bands = self.decimate(np.arange(bands.shape[1]), *bands)
+
+        n_bands = len(qs) // 2
+        for b in range(n_bands):
+            lower, higher = bands[b], bands[-1-b]
+            self.axes.fill_between(t, lower, higher, color=color,
+                                   alpha=.5 * (b+1) / (n_bands+1),
+                                   linewidth=0,
+                                   label="{:.0f}-{:.0f}%"
+                                         "".format(100*qs[b], 100*qs[-1-b]))
+        if len(qs) % 2 == 1:
+            self.axes.plot(t, bands[n_bands], color=color,
+                           label="{:.0f}%".format(100*qs[n_bands]))
+
     def pack(self):
         pass
 
 class ReproductionNumberMPlot(MultiOutputPlot):
-    def plot_outcome(self, outcome, color="k", label=None, **kwargs):
-        states = outcome.state_history
-        t = np.arange(len(states))
-        R = np.array([s.reproduction_number for s in states])
-
-        self.axes.plot(t, R, color=color, label=label)
+    def values(self, ensemble):
+        return ensemble.column("reproduction_number")
 
     def pack(self):
         self.axes.set_title("Reproduction number")
@@ -36,13 +85,8 @@ class ReproductionNumberMPlot(MultiOutputPlot):
 
 
 class InfectedMPlot(MultiOutputPlot):
-    def plot_outcome(self, outcome, color="k", label=None, **kwargs):
-        t = np.arange(len(outcome))
-
-        # rates
-        i = np.array([s.infected for s in outcome])
-
-        self.axes.plot(t, i, color=color, label=label)
+    def values(self, ensemble):
+        return ensemble.column("infected")
 
     def pack(self):
         self.axes.set_title("Number of infections (E+I)")
@@ -50,50 +94,139 @@ class InfectedMPlot(MultiOutputPlot):
 
 
 class InfectionNumberMPlot(MultiOutputPlot):
-    def plot_outcome(self, outcome, color="k", label=None, **kwargs):
-        states = outcome.state_history
-        N = outcome.population_size
-        t = np.arange(len(states))
-        R = np.array([s.n_infection for s in states]) / N
+    def values(self, ensemble):
+        N = ensemble.population_size
+        return ensemble.column("n_infection") / N[:, np.newaxis]
+
+    def pack(self):
+        self.axes.set_title("Percentage of cumulative infection")
+        self.axes.grid(True)
+
+
+
 
-        self.axes.plot(t, R, color=color)
 
 
+class HealthcareMPlot(MultiOutputPlot):
+    """
+    Field of the `Load` computed by `healthcare` (a
+    `episim.healthcare.HealthcareLoad`), with its capacity as a threshold
+    line when known
+    """
+    field = "occupancy"
+    title = "Occupied hospital beds"
+
+    def __init__(self, ax=None, convention=None, decimator=None,
+                 quantiles=None, healthcare=None):
+        super().__init__(ax, convention, decimator, quantiles)
+        if healthcare is None:
+            from episim.healthcare import HealthcareLoad
+            healthcare = HealthcareLoad()
+        self.healthcare = healthcare
+        self.load = None
+
+    def values(self, ensemble):
+        self.load = self.healthcare.of(ensemble)
+        return getattr(self.load, self.field)
+
     def pack(self):
-        self.axes.set_title("Percentage of cumulative infection")
+        self.axes.set_title(self.title)
+        capacity = None if self.load is None else \
+            self.load.capacity(self.field)
+        if capacity is not None:
+            self.axes.axhline(capacity, 0, 1, color="r", linestyle="--",
+                              alpha=.75, label="Capacity")
         self.axes.grid(True)
 
 
+class OccupancyMPlot(HealthcareMPlot):
+    field = "occupancy"
+    title = "Occupied hospital beds"
 
 
+class ICUMPlot(HealthcareMPlot):
+    field = "icu"
+    title = "Occupied ICU beds"
 
 
 class ComparatorDashboard(Dashboard):
+    """
+    Comparison of up to 3 outcomes. With `healthcare` (a
+    `episim.healthcare.HealthcareLoad`), the occupancy of the hospital and
+    ICU beds is added against their capacities.
+    """
+    def __init__(self, fig=None, convention=None, decimator=None,
+                 healthcare=None):
+        super().__init__(fig, convention, decimator)
+        self.healthcare = healthcare
+
+    @profiling.timed("ComparatorDashboard")
     def __call__(self, *outcomes):
         if len(outcomes) > 3:
             raise ValueError("At most 3 outcomtes for this dashboard")
 
-        all_axes = self.figure.subplots(3, 2, sharex=True)
+        n_rows = 3 if self.healthcare is None else 5
+        all_axes = self.figure.subplots(n_rows, 2, sharex=True)
 
         # First Column
-        InfectedMPlot(all_axes[0, 0], self.convention)(*outcomes)
-        InfectionNumberMPlot(all_axes[1, 0], self.convention)(*outcomes)
-        ReproductionNumberMPlot(all_axes[2, 0], self.convention)(*outcomes)
+        InfectedMPlot(all_axes[0, 0], self.convention,
+                      self.decimator)(*outcomes)
+        InfectionNumberMPlot(all_axes[1, 0], self.convention,
+                             self.decimator)(*outcomes)
+        ReproductionNumberMPlot(all_axes[2, 0], self.convention,
+                                self.decimator)(*outcomes)
 
         for i, c, o in index_color_outcome(self.convention, outcomes):
             title = o.name if o.name else "Outcome {:d}".format(i+1)
             DescriptionPlot(all_axes[i, 1],
                             self.convention).plot_outcome(o, color=c, title=title)
 
-        for i in range(3-len(outcomes)+1, 3):
+        for i in range(3-len(outcomes)+1, n_rows):
             all_axes[i, 1].axis("off")
 
-        return self
-
-
-
-
-
+        if self.healthcare is not None:
+            for ax, factory in zip(all_axes[3:, 0], (OccupancyMPlot,
+                                                     ICUMPlot)):
+                factory(ax, self.convention, self.decimator,
+                        healthcare=self.healthcare)(*outcomes)
+                ax.legend(loc="best")
 
+        return self
 
 
+class EnsembleDashboard(Dashboard):
+    """
+    Summary of an ensemble of outcomes (e.g. stochastic replicates) by
+    quantile bands. Series are decimated with a `MinMaxDecimator` unless
+    another decimator is given. With `healthcare` (a
+    `episim.healthcare.HealthcareLoad`), the occupancy of the hospital and
+    ICU beds is added against their capacities.
+    """
+    def __init__(self, fig=None, convention=None, decimator=None,
+                 quantiles=(.05, .25, .5, .75, .95), healthcare=None):
+        if decimator is None:
+            decimator = MinMaxDecimator()
+        super().__init__(fig, convention, decimator)
+        self.quantiles = quantiles
+        self.healthcare = healthcare
+
+    @profiling.timed("EnsembleDashboard")
+    def __call__(self, *outcomes):
+        factories = [InfectedMPlot, InfectionNumberMPlot,
+                     ReproductionNumberMPlot]
+        if self.healthcare is not None:
+            factories.extend([OccupancyMPlot, ICUMPlot])
+        all_axes = self.figure.subplots(len(factories), 1, sharex=True)
+
+        for ax, factory in zip(all_axes, factories):
+            if issubclass(factory, HealthcareMPlot):
+                plot = factory(ax, self.convention, self.decimator,
+                               self.quantiles, healthcare=self.healthcare)
+            else:
+                plot = factory(ax, self.convention, self.decimator,
+                               self.quantiles)
+            plot(*outcomes)
+            ax.legend(loc="best")
+
+        self.figure.suptitle("Ensemble of {:d} outcomes".format(len(outcomes)))
+        return self
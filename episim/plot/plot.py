@@ -4,6 +4,8 @@ import numpy as np
 
 from matplotlib import pyplot as plt
 
+from episim import profiling
+
 
 class Convention(object):
     @property
@@ -45,19 +47,49 @@ class Colormap(Convention):
 
 
 class BasePlot(object):
-    def __init__(self, convention=None):
+    """
+    decimator: `Decimator` or None
+        If not None, the series are decimated (see `episim.plot.decimation`)
+        before being drawn
+    """
+    def __init__(self, convention=None, decimator=None):
         if convention is None:
             convention = Colormap()
         self._convention = convention
+        self._decimator = decimator
 
     @property
     def convention(self):
         return self._convention
 
+    @property
+    def decimator(self):
+        return self._decimator
+
+    def decimate(self, t, *ys):
+        if self._decimator is None:
+            return (t,) + ys
+        return self._decimator(t, *ys)
+
+    def decimate_each(self, t, Y):
+        """
+        Decimate each series of `Y` [n_series, n_points] on its own (see
+        `Decimator.each`)
+
+        Return
+        ------
+        T, Y: arrays [n_series, n_selected]
+        """
+        if self._decimator is None:
+            return np.tile(t, (len(Y), 1)), Y
+        return self._decimator.each(t, Y)
+
+    @profiling.timed("BasePlot.show")
     def show(self):
         plt.show()
         return self
 
+    @profiling.timed("BasePlot.save")
     def save(self, fpath, **kwargs):
         plt.savefig(fpath, **kwargs)
         return self
@@ -71,7 +103,7 @@ class BasePlot(object):
 
 
 class Dashboard(BasePlot):
-    def __init__(self, fig=None, convention=None):
+    def __init__(self, fig=None, convention=None, decimator=None):
         self._own_fig = False
         if fig is None:
             fig = plt.figure(figsize=(20, 10))  # https://stackoverflow.com/questions/12439588/how-to-maximize-a-plt-show-window-using-python
@@ -79,12 +111,16 @@ class Dashboard(BasePlot):
 
         self._fig = fig
 
-        super().__init__(convention)
+        super().__init__(convention, decimator)
 
     def close(self):
         if self._own_fig:
             plt.close(self._fig)
 
+    @profiling.timed("Dashboard.save")
+    def save(self, fpath, **kwargs):
+        self.figure.savefig(fpath, **kwargs)
+        return self
 
     @property
     def figure(self):
@@ -108,22 +144,23 @@ class CustomDashboard(Dashboard):
 
     def __call__(self, *outcomes):
         for plot in self.plots:
-            for outcome in outcomes:
-                plot.plot_outcome(outcome)
+            with profiling.timer(plot.__class__.__name__):
+                for outcome in outcomes:
+                    plot.plot_outcome(outcome)
         return self
 
 
 
 
 class Plot(BasePlot, metaclass=ABCMeta):
-    def __init__(self, ax=None, convention=None):
+    def __init__(self, ax=None, convention=None, decimator=None):
         self._layout = None
         if ax is None:
             self._layout = Dashboard()
             ax = self._layout.figure.gca()
         self._axes = ax
 
-        super().__init__(convention)
+        super().__init__(convention, decimator)
 
     @property
     def axes(self):
@@ -134,6 +171,11 @@ class Plot(BasePlot, metaclass=ABCMeta):
         if self._layout is not None:
             self._layout.close()
 
+    @profiling.timed("Plot.save")
+    def save(self, fpath, **kwargs):
+        self.axes.figure.savefig(fpath, **kwargs)
+        return self
+
     def set_dates(self, dates):
         xticks = self.axes.get_xticks()
         start_date = dates[0]
@@ -146,9 +188,10 @@ class Plot(BasePlot, metaclass=ABCMeta):
             self.axes.axvline(x, color="k", alpha=.5, linestyle="--")
 
     def __call__(self, *outcomes, **kwargs):
-        for outcome in outcomes:
-            self.plot_outcome(outcome, **kwargs)
-            self.set_dates(outcome.dates)
+        with profiling.timer(self.__class__.__name__):
+            for outcome in outcomes:
+                self.plot_outcome(outcome, **kwargs)
+                self.set_dates(outcome.dates)
         return self
 
     def plot_outcome(self, outcome, **kwargs):
@@ -160,10 +203,11 @@ class Plot(BasePlot, metaclass=ABCMeta):
 class TwoAxesPlot(Plot):
     def __init__(self, ax, factory_1, color_1, factory_2, color_2,
                  title="",
-                 convention=None):
-        super().__init__(ax, convention=convention)
-        self.plot1 = factory_1(ax, convention=convention)
-        self.plot2 = factory_2(ax.twinx(), convention=convention)
+                 convention=None, decimator=None):
+        super().__init__(ax, convention=convention, decimator=decimator)
+        self.plot1 = factory_1(ax, convention=convention, decimator=decimator)
+        self.plot2 = factory_2(ax.twinx(), convention=convention,
+                               decimator=decimator)
         self.color_1 = color_1
         self.color_2 = color_2
         self.title = title
@@ -2,6 +2,7 @@ import os
 
 import numpy as np
 
+from episim import profiling
 from .plot import Plot, Dashboard, TwoAxesPlot
 
 
@@ -12,10 +13,11 @@ class StatePlot(Plot):
 
 
         # rates
-        s = np.array([s.susceptible for s in outcome]) / N
-        e = np.array([s.exposed for s in outcome]) / N
-        i = np.array([s.infectious for s in outcome]) / N
-        r = np.array([s.recovered for s in outcome]) / N
+        s = outcome.column("susceptible") / N
+        e = outcome.column("exposed") / N
+        i = outcome.column("infectious") / N
+        r = outcome.column("recovered") / N
+        t, s, e, i, r = self.decimate(t, s, e, i, r)
 
         self.axes.plot(t, s, color=self.convention.susceptible_color,
                        label="Susceptible")
@@ -44,10 +46,11 @@ class CumulStatePlot(Plot):
         N = outcome.population_size
 
         # rates
-        s = np.array([s.susceptible for s in outcome]) / N
-        e = np.array([s.exposed for s in outcome]) / N
-        i = np.array([s.infectious for s in outcome]) / N
-        r = np.array([s.recovered for s in outcome]) / N
+        s = outcome.column("susceptible") / N
+        e = outcome.column("exposed") / N
+        i = outcome.column("infectious") / N
+        r = outcome.column("recovered") / N
+        t, s, e, i, r = self.decimate(t, s, e, i, r)
 
         lower = 0
         higher = lower + s
@@ -94,8 +97,9 @@ class InfectedPlot(Plot):
         t = np.arange(len(outcome))
 
         # rates
-        e = np.array([s.exposed for s in outcome])
-        i = np.array([s.infectious for s in outcome])
+        e = outcome.column("exposed")
+        i = outcome.column("infectious")
+        t, e, i = self.decimate(t, e, i)
 
         if e.max() > 0:
             self.axes.plot(t, e, color=self.convention.exposed_color,
@@ -120,7 +124,8 @@ class ReproductionNumberPlot(Plot):
 
     def plot_outcome(self, outcome, color="k", title=None):
         t = np.arange(len(outcome))
-        R = np.array([s.reproduction_number for s in outcome])
+        R = outcome.column("reproduction_number")
+        t, R = self.decimate(t, R)
 
         self.axes.plot(t, R, color=color)
         self.axes.set_ylabel("Reproduction number", color=color)
@@ -141,7 +146,8 @@ class InfectionNumberPlot(Plot):
     def plot_outcome(self, outcome, color="k", title=None):
         N = outcome.population_size
         t = np.arange(len(outcome))
-        R = np.array([s.n_infection for s in outcome]) / N
+        R = outcome.column("n_infection") / N
+        t, R = self.decimate(t, R)
 
         self.axes.plot(t, R, color=color)
         self.axes.set_ylabel("Perc. cumul. infection", color=color)
@@ -176,10 +182,11 @@ class RiskyContactPlot(Plot):
         # N = 1
 
         # rates
-        s = np.array([s.susceptible for s in outcome])
-        i = np.array([s.infectious for s in outcome])
+        s = outcome.column("susceptible")
+        i = outcome.column("infectious")
 
         y = s * i / N**2
+        t, y = self.decimate(t, y)
 
 
         self.axes.plot(t, y, color=color)
@@ -228,29 +235,35 @@ class DescriptionPlot(Plot):
         self.axes.axis("off")
 
 class StateDashboard(Dashboard):
-
+    @profiling.timed("StateDashboard")
     def __call__(self, outcome):
         ax1, ax2, ax3 = self.figure.subplots(3, 1, sharex=True)
-        StatePlot(ax1, self.convention)(outcome)
-        CumulStatePlot(ax2, self.convention)(outcome)
+        StatePlot(ax1, self.convention, self.decimator)(outcome)
+        CumulStatePlot(ax2, self.convention, self.decimator)(outcome)
         TwoAxesPlot(ax3,
                     ReproductionNumberPlot, "dodgerblue",
-                    RiskyContactPlot, "orange")(outcome)
+                    RiskyContactPlot, "orange",
+                    convention=self.convention,
+                    decimator=self.decimator)(outcome)
 
 
         return self
 
 
 class FullDashboard(Dashboard):
+    @profiling.timed("FullDashboard")
     def __call__(self, outcome):
         all_axes = self.figure.subplots(3, 2, sharex=True)
 
         # First column
-        StatePlot(all_axes[0, 0], self.convention)(outcome)
-        CumulStatePlot(all_axes[1, 0], self.convention)(outcome)
+        StatePlot(all_axes[0, 0], self.convention, self.decimator)(outcome)
+        CumulStatePlot(all_axes[1, 0], self.convention,
+                       self.decimator)(outcome)
         TwoAxesPlot(all_axes[2, 0],
                     ReproductionNumberPlot, "royalblue",
-                    RiskyContactPlot, "darkorange")(outcome)
+                    RiskyContactPlot, "darkorange",
+                    convention=self.convention,
+                    decimator=self.decimator)(outcome)
 
         # Second column
         # all_axes[0, 1].axis("off")
@@ -262,9 +275,10 @@ class FullDashboard(Dashboard):
                                                          title=title)
         InfectionNumberPlot(
             all_axes[1, 1],
-            self.convention
+            self.convention,
+            self.decimator
         )(outcome)
-        InfectedPlot(all_axes[2, 1], self.convention)(outcome)
+        InfectedPlot(all_axes[2, 1], self.convention, self.decimator)(outcome)
         self.figure.subplots_adjust(wspace=0.3)
         return self
 
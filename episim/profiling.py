@@ -0,0 +1,192 @@
+"""
+Opt-in instrumentation.
+
+Timers and counters are spread over the hot paths of the library (simulator
+steps, right-hand-side evaluations, `Model.prepare_state`, `Outcome.concat`,
+plots, ...). They are no-ops unless a `Profiler` is active:
+
+    with profile() as profiler:
+        for scenario in scenarios:
+            with profiler.section(scenario.title):
+                scenario.run_model(SEIRS.factory)
+    print(profiler.report())
+
+When no profiler is active, a timer costs a global lookup and an empty
+context manager, and a counter a global lookup.
+
+A profiler can be fed from several threads (e.g. concurrent
+`Model.simulate`): its statistics are updated under a lock, the current
+section being that of the whole profiler.
+"""
+import functools
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+_active = None
+
+
+class _NullContext(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+_NULL_CONTEXT = _NullContext()
+
+
+class Stat(object):
+    def __init__(self):
+        self.n_calls = 0
+        self.total_time = 0.
+        self.count = 0
+
+    @property
+    def mean_time(self):
+        if self.n_calls == 0:
+            return 0.
+        return self.total_time / self.n_calls
+
+    def to_dict(self):
+        return {"n_calls": self.n_calls, "total_time": self.total_time,
+                "count": self.count}
+
+
+class _Timer(object):
+    def __init__(self, stat, lock):
+        self.stat = stat
+        self.lock = lock
+        self.start = 0.
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        elapsed = time.perf_counter() - self.start
+        with self.lock:
+            self.stat.total_time += elapsed
+            self.stat.n_calls += 1
+        return False
+
+
+class _Section(object):
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.previous = None
+
+    def __enter__(self):
+        self.previous = self.profiler.current_section
+        self.profiler.current_section = self.name
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.profiler.current_section = self.previous
+        return False
+
+
+class Profiler(object):
+    """
+    Collect timings and counts, grouped by section (typically one per
+    scenario). Timings are inclusive: nested timers are both charged.
+    """
+    default_section = "main"
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.sections = OrderedDict()
+        self.current_section = self.default_section
+        self._previous = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        global _active
+        if self.enabled:
+            self._previous = _active
+            _active = self
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        global _active
+        if self.enabled:
+            _active = self._previous
+            self._previous = None
+        return False
+
+    def section(self, name):
+        return _Section(self, name)
+
+    def _stat(self, name):
+        # (with the lock held)
+        stats = self.sections.get(self.current_section)
+        if stats is None:
+            stats = OrderedDict()
+            self.sections[self.current_section] = stats
+        stat = stats.get(name)
+        if stat is None:
+            stat = Stat()
+            stats[name] = stat
+        return stat
+
+    def timer(self, name):
+        with self._lock:
+            return _Timer(self._stat(name), self._lock)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self._stat(name).count += n
+
+    def to_dict(self):
+        return {section: {name: stat.to_dict() for name, stat in stats.items()}
+                for section, stats in self.sections.items()}
+
+    def report(self):
+        lines = []
+        header = "{:<40} {:>10} {:>12} {:>12} {:>12}" \
+                 "".format("", "calls", "total (s)", "mean (ms)", "count")
+        for section, stats in self.sections.items():
+            lines.append("[{}]".format(section))
+            lines.append(header)
+            for name, stat in stats.items():
+                lines.append("{:<40} {:>10d} {:>12.4f} {:>12.4f} {:>12d}"
+                             "".format(name, stat.n_calls, stat.total_time,
+                                       1000 * stat.mean_time, stat.count))
+            lines.append("")
+        return os.linesep.join(lines)
+
+
+def profile(enabled=True):
+    return Profiler(enabled)
+
+
+def active_profiler():
+    return _active
+
+
+def timer(name):
+    if _active is None:
+        return _NULL_CONTEXT
+    return _active.timer(name)
+
+
+def count(name, n=1):
+    if _active is not None:
+        _active.count(name, n)
+
+
+def timed(name):
+    """Decorator timing every call of the decorated function under `name`"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _active is None:
+                return func(*args, **kwargs)
+            with _active.timer(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,432 @@
+"""
+Renewal-equation model.
+
+The daily infections are driven by the past ones through the generation
+interval `w` (distribution of the time between an infection and the
+infections it causes):
+
+    I_t = S_{t-1} (1 - exp(-R_0 / N sum_s w_s I_{t-s}))
+
+i.e. `I_t ~= R_t sum_s w_s I_{t-s}` with `R_t = R_0 S / N`. The generation
+interval and the numbers of exposed and infectious individuals follow from
+the (gamma distributed) durations of the exposed and infectious stages of
+the `Virus`, so that the model can be compared with `SEIRS`:
+
+    model = RenewalModel.factory(state, SARSCoV2Th(), PopulationBehavior())
+    outcome = Outcome.from_run_array(model, 243)
+
+The convolutions of the past infections are computed online by divide and
+conquer: the days are split in halves, the contribution of the first half
+to the second being one FFT convolution. Simulating `T` days thus costs
+O(T log^2 T) instead of the O(T^2) (or O(T L) with a kernel of `L` days) of
+direct sums, for one or many simulations at once (`renewal_ensemble`).
+"""
+import datetime
+
+import numpy as np
+from scipy import fft, optimize, stats
+
+from . import profiling
+from .data import State, Outcome, ArrayHistory
+from .model import Model
+
+
+def infection_profile(exposed_duration, infectious_duration,
+                      n_exposed_stages=1, n_infectious_stages=1,
+                      max_days=None, resolution=.01):
+    """
+    Course of an infection whose exposed and infectious stages last
+    `exposed_duration` and `infectious_duration` days on average, with
+    gamma distributions of shapes `n_exposed_stages` and
+    `n_infectious_stages` (1 being the exponential durations of `SEIRS`).
+
+    max_days: int or None
+        Last age of infection (days) considered (by default, such that the
+        stages are over with probability 1 - 1e-6)
+    resolution: float
+        Step (days) of the numerical integration
+
+    Return
+    ------
+    generation_interval: array [max_days + 1]
+        Probability of an infection being caused 0, ..., `max_days` days
+        after the infection of its source (the first entry is 0)
+    exposed, infectious: array [max_days + 1]
+        Probability of being exposed (resp. infectious) 0, ..., `max_days`
+        days after the infection (averaged over the day)
+    """
+    latent = stats.gamma(n_exposed_stages,
+                         scale=float(exposed_duration) / n_exposed_stages)
+    infectious = stats.gamma(n_infectious_stages,
+                             scale=float(infectious_duration) /
+                             n_infectious_stages)
+    if max_days is None:
+        max_days = int(np.ceil(latent.ppf(1 - 1e-7) +
+                               infectious.ppf(1 - 1e-7)))
+    per_day = int(round(1. / resolution))
+    u = (np.arange((max_days + 1) * per_day) + .5) / per_day
+
+    # P(latent <= u) and P(latent + infectious <= u)
+    F_latent = latent.cdf(u)
+    F_end = fft.irfft(fft.rfft(latent.pdf(u) / per_day, 2 * len(u)) *
+                      fft.rfft(infectious.cdf(u), 2 * len(u)),
+                      2 * len(u))[:len(u)]
+
+    def daily(p):
+        return p.reshape(max_days + 1, per_day).mean(axis=1)
+
+    # Ages (days) of those infected during a day, at the end of each day
+    p_exposed = daily(1. - F_latent)
+    p_infectious = np.clip(daily(F_latent - F_end), 0., None)
+
+    # Density of the generation time: infectiousness over the infectious
+    # period. The infections of day t - s cause those of day t if the
+    # generation time is within a day of s (triangular weights).
+    density = np.clip(F_latent - F_end, 0., None).reshape(max_days + 1,
+                                                         per_day) / per_day
+    fraction = (np.arange(per_day) + .5) / per_day
+    generation_interval = density.dot(1. - fraction)
+    generation_interval[1:] += density[:-1].dot(fraction)
+    # No infection on the day of the infection of the source
+    generation_interval[1] += generation_interval[0]
+    generation_interval[0] = 0.
+    generation_interval /= generation_interval.sum()
+    return generation_interval, p_exposed, p_infectious
+
+
+class RenewalModel(Model):
+    """
+    Parameters
+    ----------
+    reproduction_number: float
+        Basic reproduction number R_0 (`beta / gamma` of `SEIRS`)
+    exposed_duration, infectious_duration: float
+        Average durations of the stages (days)
+    ksi: float
+        Daily rate of loss of immunity
+    n_exposed_stages, n_infectious_stages: int
+        Shapes of the distributions of the durations (see
+        `infection_profile`)
+    max_days: int or None
+        Length of the memory of the model (see `infection_profile`)
+    leaf: int
+        Number of days below which the convolutions are direct sums
+
+    The model is daily (the resolution is ignored). Its memory is the
+    `incidence` of the last `max_days` + 1 days (most recent last); a
+    `Snapshot` carries it (`snapshot.incidence`). Without it, e.g. from a
+    `State`, the exposed and infectious individuals are taken as infected
+    over the past days in proportion to the probability of still being in
+    their stage.
+    """
+    variable_names = ("susceptible", "exposed", "infectious", "recovered")
+    tracked = ((0, "n_infection"),)
+
+    @classmethod
+    def compute_parameters(cls, virus, population):
+        beta = population.contact_frequency * virus.transmission_rate
+        return (beta * virus.infectious_duration, virus.exposed_duration,
+                virus.infectious_duration, virus.immunity_drop_rate)
+
+    @classmethod
+    def factory(cls, initial_state, virus, population, resolution=1.,
+                backend=None, **kwargs):
+        """
+        As `Model.factory`; `kwargs` are the settings of the infection
+        profile (see the class documentation)
+        """
+        t = cls.compute_parameters(virus, population)
+        model = cls(*t, resolution=resolution, **kwargs)
+        return model.set_backend(backend).start_from(initial_state)
+
+    def __init__(self, reproduction_number, exposed_duration,
+                 infectious_duration, ksi=0., resolution=1.,
+                 n_exposed_stages=1, n_infectious_stages=1, max_days=None,
+                 leaf=32):
+        super().__init__(resolution=1.)
+        self.reproduction_number = reproduction_number
+        self.exposed_duration = exposed_duration
+        self.infectious_duration = infectious_duration
+        self.ksi = ksi
+        self.n_exposed_stages = n_exposed_stages
+        self.n_infectious_stages = n_infectious_stages
+        self.leaf = leaf
+        self.simulator = None
+        self.incidence = None
+
+        # Rows: generation interval, exposed, infectious (by age)
+        self.kernels = np.array(infection_profile(
+            exposed_duration, infectious_duration, n_exposed_stages,
+            n_infectious_stages, max_days))
+        self._spectra = {}
+
+    def __repr__(self):
+        s = "{}(reproduction_number={}, exposed_duration={}, " \
+            "infectious_duration={}, ksi={}, n_exposed_stages={}, " \
+            "n_infectious_stages={}, max_days={}, leaf={})".format(
+                self.__class__.__name__,
+                repr(self.reproduction_number),
+                repr(self.exposed_duration),
+                repr(self.infectious_duration),
+                repr(self.ksi),
+                repr(self.n_exposed_stages),
+                repr(self.n_infectious_stages),
+                repr(self.max_days),
+                repr(self.leaf),
+            )
+        if self.current_state is None:
+            return s
+
+        return s + ".set_state({})".format(repr(self.current_state))
+
+    def __str__(self):
+        return "{}(R_0={:.2f}, exposed_duration={:.1f}, " \
+               "infectious_duration={:.1f}, ksi={:.2e})" \
+               "".format(self.__class__.__name__, self.reproduction_number,
+                         self.exposed_duration, self.infectious_duration,
+                         self.ksi)
+
+    @property
+    def max_days(self):
+        return self.kernels.shape[1] - 1
+
+    @property
+    def generation_interval(self):
+        return self.kernels[0]
+
+    def _compute_reproduction_number(self, n_susceptible, n_total):
+        return self.reproduction_number * n_susceptible / n_total
+
+    # ------------------------------------------------------------------ State
+    def _state2variables(self, state):
+        zero = lambda x: 0 if x is None else x
+        return tuple(zero(getattr(state, name))
+                     for name in self.variable_names)
+
+    def _variables2state(self, date, *values, previous=None):
+        state = State(date)
+        for name, value in zip(self.variable_names, values):
+            setattr(state, name, value)
+        state.n_infection = previous.n_infection + values[-1]
+        return state
+
+    def history(self, state):
+        """
+        Daily infections of the `max_days` + 1 days up to `state` (most
+        recent last) consistent with its exposed and infectious individuals
+        """
+        _, exposed, infectious = self.kernels
+        E, I = self._state2variables(state)[1:3]
+        # Non-negative mix of the two profiles matching E and I
+        profiles = np.array([exposed, infectious])
+        weights = optimize.nnls(profiles.dot(profiles.T),
+                                np.array([E, I], dtype=float))[0]
+        history = weights.dot(profiles)
+        # Keep the number of infected individuals (and thus the recovered)
+        infected = history.dot(exposed + infectious)
+        if infected > 0:
+            history *= (E + I) / infected
+        return history[::-1].copy()
+
+    def set_state(self, state):
+        super().set_state(state)
+        self.incidence = self.history(self.current_state)
+        return self
+
+    def snapshot(self):
+        snapshot = super().snapshot()
+        snapshot.incidence = self.incidence.copy()
+        return snapshot
+
+    def restore(self, snapshot):
+        if snapshot.model_name != self.__class__.__name__:
+            raise ValueError("Cannot restore a snapshot of {} into {}"
+                             "".format(snapshot.model_name,
+                                       self.__class__.__name__))
+        incidence = getattr(snapshot, "incidence", None)
+        if incidence is None or len(incidence) != self.max_days + 1:
+            return self.set_state(snapshot.state())
+        self.current_state = self.prepare_state(snapshot.state())
+        self.incidence = np.array(incidence, dtype=float)
+        return self
+
+    # ------------------------------------------------------------- Dynamics
+    def _convolve(self, x, n_kernel, n_out):
+        """
+        First `n_out` values of the convolutions of `x` ([..., n]) with the
+        first `n_kernel` entries of the kernels: [..., n_kernels, n_out]
+        """
+        size = fft.next_fast_len(max(x.shape[-1] + n_kernel - 1, n_out),
+                                 real=True)
+        spectra = self._spectra.get((n_kernel, size))
+        if spectra is None:
+            spectra = fft.rfft(self.kernels[:, :n_kernel], size)
+            self._spectra[(n_kernel, size)] = spectra
+        profiling.count("RenewalModel.fft")
+        return fft.irfft(fft.rfft(x, size)[..., np.newaxis, :] * spectra,
+                         size)[..., :n_out]
+
+    @profiling.timed("RenewalModel.renew")
+    def renew(self, history, variables, n_steps, reproduction_number=None):
+        """
+        Simulate `n_steps` days following `history` (daily infections,
+        array [..., max_days + 1], most recent last) and `variables` (S, E,
+        I, R, each a float or an array [...]), with the basic reproduction
+        number `reproduction_number` (float or array [...], by default that
+        of the model).
+
+        Return
+        ------
+        values: array [..., 5, n_steps]
+            S, E, I, R and the daily infections
+        """
+        if reproduction_number is None:
+            reproduction_number = self.reproduction_number
+        L = self.max_days + 1
+        leaf = self.leaf
+        # Kernels long enough for the direct sums of the leaves
+        K = np.zeros((3, max(L, leaf + 1)))
+        K[:, :L] = self.kernels
+        history = np.asarray(history, dtype=float)
+        variables = [np.asarray(v, dtype=float) for v in variables]
+        shape = np.broadcast_shapes(history.shape[:-1],
+                                    np.shape(reproduction_number),
+                                    *[v.shape for v in variables])
+        S, _, _, R = [np.broadcast_to(v, shape).copy() for v in variables]
+        N = np.broadcast_to(sum(variables), shape)
+        rate = np.broadcast_to(reproduction_number / N, shape)
+        ksi = self.ksi
+
+        values = np.zeros(shape + (5, n_steps))
+        x = values[..., 4, :]
+        # Contributions of the past infections (of the history, then of the
+        # first halves already simulated) to each day
+        far = np.zeros(shape + (3, n_steps))
+        h = history.shape[-1]
+        if n_steps > 0:
+            far += self._convolve(history, L, h + n_steps)[..., h:]
+
+        def solve(lo, hi):
+            nonlocal S, R
+            if hi - lo <= leaf:
+                for i in range(lo, hi):
+                    y = far[..., :, i] + x[..., lo:i].dot(
+                        K[:, i - np.arange(lo, i)].T)
+                    infections = S * -np.expm1(-rate * y[..., 0])
+                    exposed = y[..., 1] + K[1, 0] * infections
+                    infectious = y[..., 2] + K[2, 0] * infections
+                    S = S - infections + ksi * R
+                    R = N - S - exposed - infectious
+                    x[..., i] = infections
+                    values[..., 0, i] = S
+                    values[..., 1, i] = exposed
+                    values[..., 2, i] = infectious
+                    values[..., 3, i] = R
+                return
+            mid = (lo + hi) // 2
+            solve(lo, mid)
+            # Ages 1, ..., hi - lo - 1 from the first half to the second
+            contribution = self._convolve(x[..., lo:mid], min(hi - lo, L),
+                                          hi - lo)
+            far[..., :, mid:hi] += contribution[..., mid - lo:]
+            solve(mid, hi)
+
+        solve(0, n_steps)
+        return values
+
+    def _history_of(self, state):
+        if state is self.current_state:
+            return self.incidence
+        return self.history(state)
+
+    def _simulate(self, state, history, n_steps, update=False):
+        values = self.renew(history, self._state2variables(state), n_steps)
+        incidence = np.concatenate([history, values[4]])
+        date = state.date
+        plus_one = datetime.timedelta(days=1)
+        for i in range(n_steps):
+            date = date + plus_one
+            state = self.prepare_state(
+                self._variables2state(date, *values[:, i], previous=state))
+            if update:
+                self.current_state = state
+                self.incidence = incidence[i + 1:i + 2 + self.max_days]
+            yield state
+
+    def simulate(self, state, n_steps=1):
+        """
+        As `Model.simulate`, from the memory of the model if `state` is its
+        current state, from the history reconstructed from `state`
+        otherwise
+        """
+        return self._simulate(state, self._history_of(state), n_steps)
+
+    def run(self, n_steps=1):
+        """Simulate from (and update) the current state and memory"""
+        return self._simulate(self.current_state, self.incidence, n_steps,
+                              update=True)
+
+    @profiling.timed("Model.run_array")
+    def run_array(self, n_steps, record_every=1, fields=None):
+        """See `Model.run_array`"""
+        if fields is None:
+            fields = self.fields
+        initial = self.current_state
+        values = self.renew(self.incidence, self._state2variables(initial),
+                            n_steps)
+        record = _record(self, initial, values, self.reproduction_number)
+        if n_steps > 0:
+            self.incidence = np.concatenate(
+                [self.incidence, values[4]])[-(self.max_days + 1):]
+            last = State(initial.date + datetime.timedelta(days=n_steps),
+                         n_infection=record[-1, 4])
+            for name, value in zip(self.variable_names, record[-1]):
+                setattr(last, name, value)
+            self.current_state = self.prepare_state(last)
+        columns = [self.fields.index(field) for field in fields]
+        return record[::record_every, columns]
+
+
+def _record(model, initial, values, reproduction_number):
+    """
+    Array [..., n_steps + 1, len(model.fields)] of the `values` of
+    `RenewalModel.renew` ([..., 5, n_steps]) following `initial`
+    """
+    n_steps = values.shape[-1]
+    record = np.empty(values.shape[:-2] + (n_steps + 1, 6))
+    record[..., 0, :4] = model._state2variables(initial)
+    record[..., 1:, :4] = np.swapaxes(values[..., :4, :], -1, -2)
+    record[..., 0, 4] = initial.n_infection
+    record[..., 1:, 4] = initial.n_infection + np.cumsum(values[..., 4, :],
+                                                         axis=-1)
+    N = record[..., :4].sum(axis=-1)
+    record[..., 5] = np.asarray(reproduction_number)[..., np.newaxis] * \
+        record[..., 0] / N
+    return record
+
+
+@profiling.timed("renewal_ensemble")
+def renewal_ensemble(model, n_days, reproduction_numbers):
+    """
+    Simulate `n_days` from the current state of `model` for each of the
+    `reproduction_numbers` (R_0), all at once.
+
+    Return
+    ------
+    outcomes: list of `Outcome`
+        One per reproduction number, stored column-wise
+    """
+    initial = model.current_state
+    R0 = np.asarray(reproduction_numbers, dtype=float)
+    values = model.renew(model.incidence, model._state2variables(initial),
+                         n_days, R0)
+    record = _record(model, initial, values, R0)
+    dates = [initial.date + datetime.timedelta(days=d)
+             for d in range(n_days + 1)]
+    outcomes = []
+    for r0, array in zip(R0, record):
+        outcome = Outcome(ArrayHistory(array, model.fields, dates),
+                          initial.date, "", model.ontology)
+        outcome.name = "R_0 = {:.2f}".format(r0)
+        outcomes.append(outcome)
+    return outcomes
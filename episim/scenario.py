@@ -1,8 +1,11 @@
 import datetime
 import os
 
+from .branching import Branch
 from .data import State, Outcome
-from .parameters import PopulationBehavior
+from .ontology import Ontology
+from .parameters import PopulationBehavior, Confine, \
+    TransmissionRateMultiplier
 from .virus import SARSCoV2Th
 
 
@@ -49,3 +52,204 @@ class OneYearNoIntervention(Scenario):
         return Outcome.from_model(model, n_step, start_date)
 
 
+class BaseScenario(Scenario):
+    def __init__(self, population_size, n_infectious, resolution,
+                 virus=None, population=None, initial_date=None):
+        self.resolution = resolution
+        N = population_size
+        I = n_infectious
+        if initial_date is None:
+            initial_date = datetime.date(2020, 1, 1)
+        self.initial_state = State(initial_date, susceptible=N-I, infectious=I,
+                                   n_infection=I)
+        # self.initial_state = State(N-I, 0, I, 0, initial_date, n_infection=I)
+        if virus is None:
+            virus = SARSCoV2Th()
+        self.virus = virus
+        if population is None:
+            population = PopulationBehavior()
+        self.population = population
+
+    def get_model(self, factory, state=None, virus=None, population=None,
+                  resolution=None):
+        if state is None:
+            state = self.initial_state
+        if virus is None:
+            virus = self.virus
+        if population is None:
+            population = self.population
+        if resolution is None:
+            resolution = self.resolution
+        return factory(state, virus, population, resolution)
+
+
+    def starting_description(self, model):
+        ontology = Ontology.default_ontology()
+        state = ontology(self.initial_state)
+        descr_ls = [
+            "Number of infectious    {:d} / {:d}    total population size"
+            "".format(state.infectious,
+                      state.population),
+            "{}".format(self.virus),
+            "Pop.: {}".format(self.population),
+            "Model: {}".format(model)
+        ]
+        return self.multiline(descr_ls)
+
+
+
+class NoIntervention(BaseScenario):
+    def __init__(self, n_days, population_size, n_infectious, resolution):
+        super().__init__(population_size, n_infectious, resolution)
+        self.n_days = n_days
+
+    def run_model(self, model_factory):
+        model = self.get_model(model_factory)
+
+        outcome = Outcome.from_model(model, self.n_days,
+                                     self.starting_description(model))
+        outcome.name = "Do nothing"
+        return outcome
+
+
+class SanityMeasure(BaseScenario):
+    def __init__(self, measure_effect, n_days_before_measures,
+                 n_days_after_measures, population_size, n_infectious,
+                 resolution):
+        super().__init__(population_size, n_infectious, resolution)
+        self.n_days_1 = n_days_before_measures
+        self.n_days_2 = n_days_after_measures
+        self.measure_effect = measure_effect
+
+    def run_model(self, model_factory):
+        model = self.get_model(model_factory)
+        outcome = Outcome.from_model(model, self.n_days_1,
+                                     self.starting_description(model))
+
+
+        virus = TransmissionRateMultiplier(self.virus, 0.5)
+        model = self.get_model(model_factory, virus=virus,
+                               state=model.snapshot())
+        descr_ls = [
+            "Sanity measures: dividing transmission rate by "
+            "{:.2f}".format(1./self.measure_effect),
+            "New model: {}".format(model)
+        ]
+
+        outcome = outcome.concat(
+            Outcome.from_model(model, self.n_days_2,
+                               self.multiline(descr_ls))
+        )
+
+        outcome.name = "Sanity measure (lower transmission rate)"
+        return outcome
+
+
+class Confinement(BaseScenario):
+    def __init__(self, confinement_effect, n_days_before_confinement,
+                 n_days_confinement, n_days_after_confinement,
+                 population_size, n_infectious, resolution):
+        super().__init__(population_size, n_infectious, resolution)
+        self.confinement_efficiency = 1 - confinement_effect
+        self.n_days_1 = n_days_before_confinement
+        self.n_days_2 = n_days_confinement
+        self.n_days_3 = n_days_after_confinement
+
+    def run_model(self, model_factory):
+        model = self.get_model(model_factory)
+
+        outcome = Outcome.from_model(model, self.n_days_1,
+                                     self.starting_description(model))
+
+        population = Confine(self.population, self.confinement_efficiency)
+
+        model = self.get_model(model_factory, state=model.snapshot(),
+                               population=population)
+
+        descr_ls = [
+            "Confinement: {}".format(population),
+            "New model: {}".format(model)
+        ]
+
+        outcome = outcome.concat(
+            Outcome.from_model(model, self.n_days_2,
+                               self.multiline(descr_ls))
+        )
+
+        model = self.get_model(model_factory, state=model.snapshot())
+
+        descr_ls = [
+            "Deconfinement: {}".format(str(population)),
+            "New model: {}".format(model)
+        ]
+
+        outcome = outcome.concat(
+            Outcome.from_model(model, self.n_days_3,
+                               self.multiline(descr_ls))
+        )
+
+        outcome.name = "Confine/deconfine"
+        return outcome
+
+
+class ConfinementSweep(BaseScenario):
+    """
+    `Confinement` for every combination of the number of days before the
+    confinement and of its duration. The variants are forked from a common
+    run without intervention (see `Branch`), so that the shared part is
+    simulated only once.
+    """
+    def __init__(self, confinement_effect, n_days_before_confinement,
+                 n_days_confinement, n_days_total, population_size,
+                 n_infectious, resolution):
+        super().__init__(population_size, n_infectious, resolution)
+        self.confinement_efficiency = 1 - confinement_effect
+        self.n_days_before = sorted(n_days_before_confinement)
+        self.n_days_confinement = sorted(n_days_confinement)
+        self.n_days_total = n_days_total
+
+    def run_models(self, model_factory):
+        """
+        Return
+        ------
+        outcomes: list of `Outcome`
+            One per (number of days before, duration), in this order
+        """
+        # The common run only goes until the last confinement starts
+        model = self.get_model(model_factory)
+        root = Branch(model, min(max(self.n_days_before), self.n_days_total),
+                      self.starting_description(model))
+
+        population = Confine(self.population, self.confinement_efficiency)
+
+        def confined(snapshot):
+            return self.get_model(model_factory, state=snapshot,
+                                  population=population)
+
+        def deconfined(snapshot):
+            return self.get_model(model_factory, state=snapshot)
+
+        def description(event):
+            return lambda model: self.multiline([
+                "{}: {}".format(event, population),
+                "New model: {}".format(model)
+            ])
+
+        for n_before in self.n_days_before:
+            n_after_before = self.n_days_total - n_before
+            confinement = root.fork(n_before, confined,
+                                    min(max(self.n_days_confinement),
+                                        n_after_before),
+                                    description("Confinement"))
+            for duration in self.n_days_confinement:
+                duration = min(duration, n_after_before)
+                confinement.fork(duration, deconfined,
+                                 n_after_before - duration,
+                                 description("Deconfinement"),
+                                 "Confine/deconfine ({:d}d + {:d}d)"
+                                 "".format(n_before, duration))
+
+        return root.outcomes()
+
+    def run_model(self, model_factory):
+        return self.run_models(model_factory)[0]
@@ -0,0 +1,376 @@
+"""
+Competition of several strains (variants) of a virus.
+
+SEIRS where each strain has its own `Virus` parameters and where a past
+infection protects, totally or partially, against the other strains. The
+exposed, infectious and recovered compartments are held as an array
+[n_strains, n_stages] (stages: exposed, infectious, recovered) updated at
+once, so that adding a strain adds a row rather than Python-level flows.
+
+    omicron = Strain(Virus(...), "omicron",
+                     seeds=[(datetime.date(2020, 6, 1), 100)])
+    factory = partial(MultiStrainSEIRS.factory, variants=[omicron],
+                      cross_immunity=.6)
+    model = factory(state, SARSCoV2Th(), PopulationBehavior())
+
+The `virus` given to the factory is the resident strain; the interventions
+decorating it (e.g. `TransmissionRateMultiplier`) apply to every strain.
+"""
+import numpy as np
+
+from . import profiling
+from .data import State
+from .model import Model
+from .ontology import Ontology
+from .parameters import VPDecorator
+
+
+class Strain(object):
+    """
+    virus: `VirusParameter`
+        Parameters of the strain
+    name: str
+    seeds: sequence of (date, n)
+        `n` susceptible individuals are exposed to the strain (e.g. imported
+        cases of a new variant) at the beginning of each `date`
+    """
+    def __init__(self, virus, name, seeds=()):
+        self.virus = virus
+        self.name = name
+        self.seeds = list(seeds)
+
+    def __repr__(self):
+        return "{}({}, {}, seeds={})".format(self.__class__.__name__,
+                                             repr(self.virus),
+                                             repr(self.name),
+                                             repr(self.seeds))
+
+
+def without_decorators(virus):
+    """`virus` without its `VPDecorator`s"""
+    while isinstance(virus, VPDecorator):
+        virus = virus._virus_parameter
+    return virus
+
+
+def cross_immunity_matrix(n_strains, cross_immunity=0.):
+    """
+    Matrix [n_strains, n_strains] whose entry (j, i) is the protection
+    against strain `i` conferred by a past infection with strain `j`.
+
+    cross_immunity: float or array [n_strains, n_strains]
+        A float is the protection against the other strains, the protection
+        against the same strain being total
+    """
+    if np.ndim(cross_immunity) == 0:
+        matrix = np.full((n_strains, n_strains), float(cross_immunity))
+        np.fill_diagonal(matrix, 1.)
+        return matrix
+    matrix = np.array(cross_immunity, dtype=float)
+    if matrix.shape != (n_strains, n_strains):
+        raise ValueError("Cross-immunity matrix of shape {}, {} expected"
+                         "".format(matrix.shape, (n_strains, n_strains)))
+    if np.any((matrix < 0) | (matrix > 1)):
+        raise ValueError("Protections must lie in [0, 1]")
+    return matrix
+
+
+class StrainSimulator(object):
+    """
+    Explicit Euler method on the multi-strain SEIRS. The variables are the
+    susceptible followed by the [n_strains, 3] array (exposed, infectious,
+    recovered) in row-major order; each may be a float or an array [m] (m
+    independent simulations). For each day, the variables followed by the
+    infections of each strain over the day are yielded.
+
+    beta, kappa, gamma, ksi: arrays [n_strains]
+    cross_immunity: array [n_strains, n_strains]
+        See `cross_immunity_matrix`
+    """
+    def __init__(self, beta, kappa, gamma, ksi, cross_immunity,
+                 step_size=1.):
+        self.beta = np.asarray(beta, dtype=float)
+        self.kappa = np.asarray(kappa, dtype=float)
+        self.gamma = np.asarray(gamma, dtype=float)
+        self.ksi = np.asarray(ksi, dtype=float)
+        # Susceptibility of the recovered from strain j to strain i
+        self.susceptibility = 1. - np.asarray(cross_immunity, dtype=float)
+        self.step_size = step_size
+
+    @property
+    def n_strains(self):
+        return len(self.beta)
+
+    @property
+    def n_flows(self):
+        return self.n_strains
+
+    @property
+    def stoichiometry(self):
+        """Matrix whose columns span the directions of dx/dt"""
+        n = self.n_strains
+        S, E, I, R = 0, 1 + 3 * np.arange(n), 2 + 3 * np.arange(n), \
+            3 + 3 * np.arange(n)
+        transfers = [(S, E[i]) for i in range(n)]
+        transfers.extend((R[j], E[i]) for j in range(n) for i in range(n)
+                         if self.susceptibility[j, i] > 0)
+        transfers.extend(zip(E, I))
+        transfers.extend(zip(I, R))
+        transfers.extend((R[i], S) for i in range(n))
+        columns = np.zeros((1 + 3 * n, len(transfers)))
+        for k, (src, dst) in enumerate(transfers):
+            columns[src, k] -= 1
+            columns[dst, k] += 1
+        return columns
+
+    def _derivatives(self, S, X):
+        """
+        dS/dt, dX/dt and the infections of each strain, `X` being the
+        [n_strains, 3, ...] array
+        """
+        shape = (self.n_strains,) + (1,) * (X.ndim - 2)
+        E, I, R = X[:, 0], X[:, 1], X[:, 2]
+        N = S + X.sum(axis=(0, 1))
+        force = self.beta.reshape(shape) * I / N
+        susceptibility = self.susceptibility
+        # Susceptible and recovered from the other strains, strain by strain
+        infections = force * (S + np.tensordot(susceptibility, R,
+                                               axes=(0, 0)))
+        # Loss of the recovered to the other strains
+        reinfections = R * np.tensordot(susceptibility, force, axes=(1, 0))
+        progression = self.kappa.reshape(shape) * E
+        recovery = self.gamma.reshape(shape) * I
+        waning = self.ksi.reshape(shape) * R
+
+        dS = waning.sum(axis=0) - force.sum(axis=0) * S
+        dX = np.stack([infections - progression,
+                       progression - recovery,
+                       recovery - waning - reinfections], axis=1)
+        return dS, dX, infections
+
+    def rhs(self, x):
+        """`dx/dt` at `x` (array [N] or [N, m])"""
+        x = np.asarray(x)
+        X = x[1:].reshape((self.n_strains, 3) + x.shape[1:])
+        dS, dX, _ = self._derivatives(x[0], X)
+        return np.concatenate([np.asarray(dS)[None],
+                               dX.reshape((-1,) + x.shape[1:])])
+
+    def __call__(self, *x, dt=1):
+        x = np.array(x, dtype=float)
+        n = self.n_strains
+        h = self.step_size
+        S = x[0]
+        X = x[1:].reshape((n, 3) + x.shape[1:])
+        acc = np.zeros((n,) + x.shape[1:])
+
+        n_steps_per_dt = int(1. / self.step_size)
+        for _ in range(int(dt)):
+            acc[:] = 0
+            with profiling.timer("StrainSimulator.steps"):
+                for _ in range(n_steps_per_dt):
+                    dS, dX, infections = self._derivatives(S, X)
+                    S = S + h * dS
+                    X = X + h * dX
+                    acc += h * infections
+            profiling.count("StrainSimulator.steps", n_steps_per_dt)
+            yield tuple(np.concatenate([np.asarray(S)[None],
+                                        X.reshape((-1,) + x.shape[1:]),
+                                        acc]))
+
+
+class MultiStrainSEIRS(Model):
+    """
+    SEIRS with several competing strains. Those who recover from strain `j`
+    are infected by strain `i` at the rate of the susceptible times
+    `1 - cross_immunity[j, i]`, and lose their immunity (towards the
+    susceptible) at the `ksi` of strain `j`.
+
+    Parameters (arrays [n_strains], see `SEIRS`)
+    --------------------------------------------
+    beta, kappa, gamma, ksi: array
+    strains: sequence of `Strain`
+        The first one is the resident strain: the aggregates of the initial
+        state (e.g. `exposed`) are attributed to it when the state does not
+        detail the strains (e.g. `exposed_<strain>`)
+    cross_immunity: float or array [n_strains, n_strains]
+        See `cross_immunity_matrix`
+
+    The states have the counters `n_infection` and `n_infection_<strain>`;
+    their reproduction number is the largest among the strains.
+    """
+    STAGES = ("exposed", "infectious", "recovered")
+
+    @classmethod
+    def compute_parameters(cls, virus, population):
+        beta = population.contact_frequency * virus.transmission_rate
+        kappa = 1. / virus.exposed_duration
+        gamma = 1. / virus.infectious_duration
+        ksi = virus.immunity_drop_rate
+        return beta, kappa, gamma, ksi
+
+    @classmethod
+    def factory(cls, initial_state, virus, population, resolution=0.1,
+                backend=None, variants=(), cross_immunity=0.,
+                name="resident"):
+        """
+        As `Model.factory`, `virus` being the resident strain (called
+        `name`) and `variants` a sequence of `Strain`. The interventions
+        decorating `virus` scale the transmission of all the strains.
+        """
+        strains = [Strain(virus, name)] + list(variants)
+        effect = virus.transmission_rate / \
+            without_decorators(virus).transmission_rate
+        parameters = []
+        for i, strain in enumerate(strains):
+            beta, kappa, gamma, ksi = cls.compute_parameters(strain.virus,
+                                                             population)
+            if i > 0:
+                beta *= effect
+            parameters.append((beta, kappa, gamma, ksi))
+        beta, kappa, gamma, ksi = (np.array(p) for p in zip(*parameters))
+        model = cls(beta, kappa, gamma, ksi, resolution=resolution,
+                    strains=strains, cross_immunity=cross_immunity)
+        return model.set_backend(backend).start_from(initial_state)
+
+    def __init__(self, beta, kappa, gamma, ksi, resolution=0.1, strains=(),
+                 cross_immunity=0.):
+        super().__init__(resolution=resolution)
+        self.strains = list(strains)
+        names = [strain.name for strain in self.strains]
+        if len(set(names)) != len(names):
+            raise ValueError("Strain names must be unique: {}"
+                             "".format(", ".join(names)))
+        n = len(names)
+        self.beta, self.kappa, self.gamma, self.ksi = (
+            np.broadcast_to(np.asarray(p, dtype=float), (n,)).copy()
+            for p in (beta, kappa, gamma, ksi)
+        )
+        self.cross_immunity = cross_immunity_matrix(n, cross_immunity)
+
+        self.ontology = Ontology.strain_ontology(names)
+        self.variable_names = ["susceptible"] + \
+            ["{}_{}".format(stage, name) for name in names
+             for stage in self.STAGES]
+        self.tracked = [(i, "n_infection") for i in range(n)] + \
+            [(i, "n_infection_{}".format(name))
+             for i, name in enumerate(names)]
+
+        self.simulator = StrainSimulator(self.beta, self.kappa, self.gamma,
+                                         self.ksi, self.cross_immunity,
+                                         step_size=resolution)
+
+    def __repr__(self):
+        s = "{}(beta={}, kappa={}, gamma={}, ksi={}, resolution={}, " \
+            "strains={}, cross_immunity={})".format(
+                self.__class__.__name__,
+                repr(self.beta),
+                repr(self.kappa),
+                repr(self.gamma),
+                repr(self.ksi),
+                repr(self.resolution),
+                repr(self.strains),
+                repr(self.cross_immunity),
+            )
+        if self.current_state is None:
+            return s
+
+        return s + ".set_state({})".format(repr(self.current_state))
+
+    def __str__(self):
+        return "{}(strains={}, beta={}, gamma={})".format(
+            self.__class__.__name__,
+            ", ".join(strain.name for strain in self.strains),
+            np.array2string(self.beta, precision=2),
+            np.array2string(self.gamma, precision=2))
+
+    @property
+    def n_strains(self):
+        return len(self.strains)
+
+    def _susceptible(self, query):
+        # Susceptibility to each strain (array [n_strains, ...])
+        recovered = np.array([query("recovered_{}".format(strain.name))
+                              for strain in self.strains], dtype=float)
+        return query("susceptible") + \
+            np.tensordot(1. - self.cross_immunity, recovered, axes=(0, 0))
+
+    def _compute_reproduction_number(self, n_susceptible, n_total):
+        n_susceptible = np.asarray(n_susceptible)
+        shape = (self.n_strains,) + (1,) * (n_susceptible.ndim - 1)
+        R = (self.beta / self.gamma).reshape(shape) * n_susceptible / n_total
+        return R.max(axis=0)
+
+    def reproduction_numbers(self, state):
+        """Effective reproduction number of each strain in `state`"""
+        queryable = self.ontology(state)
+        n_susceptible = self._susceptible(lambda name: getattr(queryable,
+                                                               name))
+        return self.beta / self.gamma * n_susceptible / queryable.population
+
+    def set_state(self, state):
+        # Detail the strains so that the ontology queries are consistent
+        for name, value in zip(self.variable_names,
+                               self._state2variables(state)):
+            setattr(state, name, value)
+        return super().set_state(state)
+
+    def _seeds(self, start, n_steps):
+        """{day index: [(strain index, n)]} of the seeds of the period"""
+        seeds = {}
+        for i, strain in enumerate(self.strains):
+            for date, n in strain.seeds:
+                day = (date - start).days
+                if 0 <= day < n_steps:
+                    seeds.setdefault(day, []).append((i, n))
+        return seeds
+
+    def _integrate(self, variables, state, n_steps):
+        seeds = self._seeds(state.date, n_steps)
+        n_vars = len(self.variable_names)
+        x = np.array(variables, dtype=float)
+        day = 0
+        while day < n_steps:
+            seeded = np.zeros(self.n_strains)
+            for i, n in seeds.get(day, ()):
+                n = min(n, x[0])
+                x[0] -= n
+                x[1 + 3 * i] += n
+                seeded[i] += n
+            stop = min([d for d in seeds if d > day] + [n_steps])
+            for values in self.simulator(*x, dt=stop - day):
+                values = np.array(values)
+                values[n_vars:] += seeded
+                seeded[:] = 0
+                yield values
+            x = values[:n_vars]
+            day = stop
+
+    def _state2variables(self, state):
+        zero = lambda x: 0 if x is None else x
+        variables = [zero(state.susceptible)]
+        rows = []
+        for i, strain in enumerate(self.strains):
+            rows.append([getattr(state, "{}_{}".format(stage, strain.name))
+                         for stage in self.STAGES])
+        for k, stage in enumerate(self.STAGES):
+            if all(row[k] is None for row in rows):
+                # Only the aggregate is known: the resident strain
+                rows[0][k] = getattr(state, stage)
+        for row in rows:
+            variables.extend(zero(v) for v in row)
+        return tuple(variables)
+
+    def _variables2state(self, date, *values, previous=None):
+        zero = lambda x: 0 if x is None else x
+        n_vars = len(self.variable_names)
+        # The aggregates (exposed, ...) are left to the ontology
+        state = State(date)
+        for name, value in zip(self.variable_names, values[:n_vars]):
+            setattr(state, name, value)
+        infections = values[n_vars:]
+        state.n_infection = previous.n_infection + sum(infections)
+        for strain, n in zip(self.strains, infections):
+            attribute = "n_infection_{}".format(strain.name)
+            setattr(state, attribute, zero(getattr(previous, attribute)) + n)
+        return state
@@ -0,0 +1,389 @@
+"""
+Vaccination over strata of the population (e.g. age groups).
+
+`SEIRS` with deaths, where the susceptible individuals of each stratum are
+vaccinated according to a `Rollout`: a daily dose capacity and an order of
+priority of the strata. The vaccinated individuals are protected (with the
+efficacy of the `Vaccine`) until their protection wanes into a partial
+immunity, which wanes in turn. The vaccinations are flows of the fused
+kernel like the infections: the daily capacity is a scheduled parameter of
+the kernel and the doses are shared among the strata by the dynamic itself.
+
+    strata = [Stratum("0-64", .8, .001), Stratum("65+", .2, .05)]
+    Vaccination = vaccination_model(strata)
+    rollout = Rollout(capacity=50000, priority=["65+"],
+                      start=datetime.date(2020, 3, 1))
+    model = Vaccination.factory(state, virus, population, rollout=rollout)
+
+Many rollouts are compared by integrating them all at once, one column per
+rollout (`compare_rollouts`).
+"""
+import datetime
+
+import numpy as np
+
+from . import profiling
+from .builder import ModelBuilder, CompartmentalModel
+from .data import Outcome, ArrayHistory
+from .kernel import KernelSimulator
+from .modeling import Addition, Constant, Minimum
+from .ontology import Ontology
+
+
+class Stratum(object):
+    """
+    name: str
+    share: float
+        Fraction of the population in the stratum
+    fatality_rate: float
+        Probability of an infection of the stratum being fatal
+    """
+    def __init__(self, name, share, fatality_rate=0.):
+        self.name = name
+        self.share = share
+        self.fatality_rate = fatality_rate
+
+    def __repr__(self):
+        return "{}({}, {}, {})".format(self.__class__.__name__,
+                                       repr(self.name), repr(self.share),
+                                       repr(self.fatality_rate))
+
+
+class Vaccine(object):
+    """
+    efficacy: float
+        Reduction of the susceptibility of the vaccinated individuals
+    partial_efficacy: float
+        Reduction of the susceptibility once the protection has waned
+    protection_duration: float
+        Average duration (days) of the full protection
+    partial_duration: float
+        Average duration (days) of the partial immunity
+    """
+    def __init__(self, efficacy=.9, partial_efficacy=.5,
+                 protection_duration=180, partial_duration=180):
+        self.efficacy = efficacy
+        self.partial_efficacy = partial_efficacy
+        self.protection_duration = protection_duration
+        self.partial_duration = partial_duration
+
+    def __repr__(self):
+        return "{}(efficacy={}, partial_efficacy={}, protection_duration={}, " \
+               "partial_duration={})".format(self.__class__.__name__,
+                                             repr(self.efficacy),
+                                             repr(self.partial_efficacy),
+                                             repr(self.protection_duration),
+                                             repr(self.partial_duration))
+
+    def parameters(self):
+        """Values of the vaccine parameters of the kernel, by name"""
+        return {
+            "efficacy": self.efficacy,
+            "partial_efficacy": self.partial_efficacy,
+            "waning": 1. / self.protection_duration,
+            "partial_waning": 1. / self.partial_duration,
+        }
+
+
+class Rollout(object):
+    """
+    Vaccination strategy.
+
+    capacity: float or sequence of float
+        Number of doses per day, constant or for each day from `start` (the
+        last value holds afterwards)
+    priority: sequence
+        Groups of strata in order of priority: names of strata or tuples of
+        names (strata with the same priority). The strata not listed come
+        last, together. The doses go to the first group (in proportion of
+        the number of susceptible individuals of its strata) and what is
+        left to the next one.
+    start: `datetime.date` or None
+        First day of the vaccination (None: from the first state of the
+        model, which is the state of the snapshot for a restored model)
+    name: str or None
+    """
+    def __init__(self, capacity, priority=(), start=None, name=None):
+        self.capacity = np.atleast_1d(np.asarray(capacity, dtype=float))
+        self.priority = tuple(priority)
+        self.start = start
+        self.name = name
+
+    def __repr__(self):
+        return "{}(capacity={}, priority={}, start={}, name={})".format(
+            self.__class__.__name__, repr(self.capacity), repr(self.priority),
+            repr(self.start), repr(self.name))
+
+    def ranks(self, strata):
+        """
+        Rank of the group of priority of each stratum: 0, 1, ... for the
+        groups which have strata (in the order of `priority`), the strata
+        not listed coming last
+
+        Raise
+        -----
+        ValueError if `priority` names an unknown stratum
+        """
+        groups = [(g,) if isinstance(g, str) else tuple(g)
+                  for g in self.priority]
+        names = [stratum.name for stratum in strata]
+        for group in groups:
+            for name in group:
+                if name not in names:
+                    raise ValueError("Unknown stratum '{}' in the priority "
+                                     "(strata: {})".format(name,
+                                                           ", ".join(names)))
+        positions = []
+        for name in names:
+            position = [r for r, group in enumerate(groups) if name in group]
+            positions.append(position[0] if len(position) > 0
+                             else len(groups))
+        # Consecutive ranks: the groups left empty are skipped
+        consecutive = {p: r for r, p in enumerate(sorted(set(positions)))}
+        return [consecutive[p] for p in positions]
+
+    def day(self, date, default_start):
+        """Day of the schedule of `date`"""
+        start = default_start if self.start is None else self.start
+        return (date - start).days
+
+
+# Compartments of each stratum (entries of `Ontology.vaccination_ontology`)
+COMPARTMENTS = ("susceptible", "exposed", "infectious", "recovered",
+                "vaccinated", "partially_immune", "deceased")
+
+
+def vaccination_builder(strata):
+    """
+    `ModelBuilder` of SEIRS with deaths, vaccination and waning over
+    `strata` (mixing homogeneously). Tracked: `n_infection` (including the
+    breakthrough infections), `n_death` and `n_vaccination`.
+    """
+    names = [s.name for s in strata]
+    builder = ModelBuilder(
+        ["{}_{}".format(c, name) for name in names for c in COMPARTMENTS],
+        ontology=lambda: Ontology.vaccination_ontology(names))
+
+    def of(compartment):
+        return [builder.variable("{}_{}".format(compartment, name))
+                for name in names]
+
+    S, E, I, R, V, P, D = (of(c) for c in COMPARTMENTS)
+    N = builder.total(*(S + E + I + R + V + P))
+    I_total = Addition.create(*I)
+    if len(I) > 1:
+        I_total.override_name("I")
+
+    beta = builder.parameter(
+        "beta", lambda v, p: p.contact_frequency * v.transmission_rate)
+    kappa = builder.parameter("kappa", lambda v, p: 1. / v.exposed_duration)
+    gamma = builder.parameter("gamma",
+                              lambda v, p: 1. / v.infectious_duration)
+    ksi = builder.parameter("ksi", lambda v, p: v.immunity_drop_rate)
+    vaccine = {name: builder.parameter(name, lambda v, p, value=value: value)
+               for name, value in Vaccine().parameters().items()}
+    capacity = builder.parameter("capacity", lambda v, p: 0.)
+    # in_group[r][i] is 1 if the stratum i is in the r-th group of priority
+    in_group = [[builder.parameter("rank_{:d}_{}".format(r, name),
+                                   lambda v, p, r=r: float(r == 0))
+                 for name in names] for r in range(len(names))]
+    mus = [builder.parameter("fatality_{}".format(s.name),
+                             lambda v, p, mu=s.fatality_rate: mu)
+           for s in strata]
+
+    force = beta * I_total / N
+    force.override_name("force")
+
+    # The groups of priority are served in turn: a group takes
+    # min(remaining, eligible / one_day) doses per day of those left by the
+    # previous ones (vaccinating at most all its susceptible individuals in
+    # `one_day`), only the rest being passed on to the next group
+    one_day = Constant(1., "one_day")
+    remaining = capacity
+    rates = []
+    for r, group in enumerate(in_group):
+        eligible = Addition.create(*[g * s for g, s in zip(group, S)])
+        eligible.override_name("eligible_{:d}".format(r))
+        doses = Minimum.create(remaining, eligible / one_day)
+        doses.override_name("doses_{:d}".format(r))
+        # (0 when there is no individual left)
+        rate = doses / (eligible + 1e-9)
+        rate.override_name("rate_{:d}".format(r))
+        rates.append(rate)
+        if r < len(in_group) - 1:
+            remaining = remaining - doses
+            remaining.override_name("remaining_{:d}".format(r))
+
+    for i, name in enumerate(names):
+        builder.transition(S[i], E[i], S[i] * force, track="n_infection")
+        builder.transition(V[i], E[i],
+                           (1 - vaccine["efficacy"]) * V[i] * force,
+                           track="n_infection")
+        builder.transition(P[i], E[i],
+                           (1 - vaccine["partial_efficacy"]) * P[i] * force,
+                           track="n_infection")
+        builder.transition(E[i], I[i], kappa * E[i])
+        builder.transition(I[i], R[i], (1 - mus[i]) * gamma * I[i])
+        builder.transition(I[i], D[i], mus[i] * gamma * I[i],
+                           track="n_death")
+        builder.transition(R[i], S[i], ksi * R[i])
+        vaccination_rate = Addition.create(*[group[i] * rate for group, rate
+                                             in zip(in_group, rates)])
+        builder.transition(S[i], V[i], vaccination_rate * S[i],
+                           track="n_vaccination")
+        builder.transition(V[i], P[i], vaccine["waning"] * V[i])
+        builder.transition(P[i], S[i], vaccine["partial_waning"] * P[i])
+
+    builder.reproduction_number(beta / gamma)
+    return builder
+
+
+class VaccinationModel(CompartmentalModel):
+    """
+    Base class of the models generated by `vaccination_model`. The daily
+    capacity of the `rollout` is a schedule of the simulator.
+    """
+    strata = ()
+
+    @classmethod
+    def factory(cls, initial_state, virus, population, resolution=0.1,
+                backend=None, vaccine=None, rollout=None):
+        """
+        As `Model.factory`, with a `Vaccine` (default: `Vaccine()`) and a
+        `Rollout` (default: none)
+        """
+        t = cls.compute_parameters(virus, population)
+        model = cls(*t, resolution=resolution, vaccine=vaccine,
+                    rollout=rollout)
+        return model.set_backend(backend).start_from(initial_state)
+
+    def __init__(self, *parameters, resolution=0.1, vaccine=None,
+                 rollout=None):
+        super().__init__(*parameters, resolution=resolution)
+        self.vaccine = Vaccine() if vaccine is None else vaccine
+        self.rollout = Rollout(0.) if rollout is None else rollout
+        self.parameters = self.rollout_parameters(self.rollout, self.vaccine)
+        index = self.parameter_names.index("capacity")
+        self.simulator = KernelSimulator(
+            self.kernel, self.parameters, step_size=resolution,
+            schedule={index: self.rollout.capacity})
+        self.start_date = None
+
+    def rollout_parameters(self, rollout, vaccine=None):
+        """The parameters of the kernel for `rollout` (before its start)"""
+        values = dict(zip(self.parameter_names, self.parameters))
+        values.update((vaccine or self.vaccine).parameters())
+        values["capacity"] = 0.
+        for stratum, rank in zip(self.strata, rollout.ranks(self.strata)):
+            for r in range(len(self.strata)):
+                values["rank_{:d}_{}".format(r, stratum.name)] = \
+                    float(r == rank)
+        return tuple(values[name] for name in self.parameter_names)
+
+    def set_state(self, state):
+        super().set_state(state)
+        if self.start_date is None:
+            self.start_date = state.date
+        return self
+
+    def _integrate(self, variables, state, n_steps):
+        day = self.rollout.day(state.date, self.start_date)
+        return self.simulator(*variables, dt=n_steps, day=day)
+
+    def _susceptible(self, query):
+        return query("susceptible") + \
+            (1 - self.vaccine.efficacy) * query("vaccinated") + \
+            (1 - self.vaccine.partial_efficacy) * query("partially_immune")
+
+    def _state2variables(self, state):
+        """
+        The compartments of the strata; the entries of `state` which are
+        not detailed by stratum are divided according to the shares of the
+        strata
+        """
+        values = []
+        compartments = [(c, s) for s in self.strata for c in COMPARTMENTS]
+        for name, (entry, stratum) in zip(self.compartments, compartments):
+            value = getattr(state, name)
+            if value is None:
+                total = getattr(state, entry)
+                value = 0 if total is None else stratum.share * total
+            values.append(value)
+        return tuple(values)
+
+
+def vaccination_model(strata, name="Vaccination"):
+    """
+    `VaccinationModel` class over `strata` (sequence of `Stratum`). The
+    compartments are the leaves of `Ontology.vaccination_ontology`.
+    """
+    cls = vaccination_builder(strata).build(name, base=VaccinationModel)
+    cls.strata = tuple(strata)
+    return cls
+
+
+@profiling.timed("compare_rollouts")
+def compare_rollouts(model, rollouts, n_days):
+    """
+    Simulate `n_days` from the current state of `model` for each rollout,
+    all the rollouts being integrated together (one column per rollout).
+
+    Return
+    ------
+    outcomes: list of `Outcome`
+        One per rollout (named after it), stored column-wise
+    """
+    n = len(rollouts)
+    initial = model.current_state
+    simulator = model.simulator
+    kernel = simulator.kernel
+    h = simulator.step_size
+    n_steps = int(1. / h)
+
+    # Parameters [n] per rollout, daily capacities [n_days, n]
+    p = np.array([model.rollout_parameters(r) for r in rollouts]).T
+    days = np.array([r.day(initial.date, model.start_date) for r in rollouts])
+    capacity = np.zeros((n_days, n))
+    for j, rollout in enumerate(rollouts):
+        day = days[j] + np.arange(n_days)
+        values = rollout.capacity[np.clip(day, 0, len(rollout.capacity) - 1)]
+        capacity[:, j] = np.where(day >= 0, values, 0.)
+    index = model.parameter_names.index("capacity")
+
+    n_vars = len(model.compartments)
+    counters = model.counter_names
+    to_counters = np.zeros((len(counters), kernel.n_flows))
+    for j, attribute in model.tracked:
+        to_counters[counters.index(attribute), j] = 1
+    fields = list(model.compartments) + counters
+    record = np.empty((n_days + 1, len(fields), n))
+    record[0, :n_vars] = np.array(model._state2variables(initial),
+                                  dtype=float)[:, np.newaxis]
+    record[0, n_vars:] = np.array([getattr(initial, c) or 0.
+                                   for c in counters])[:, np.newaxis]
+
+    x = tuple(np.array(record[0, i]) for i in range(n_vars))
+    zeros = (0.,) * kernel.n_flows
+    for day in range(n_days):
+        p[index] = capacity[day]
+        x, acc = kernel.integrate(x, zeros, tuple(p), h, n_steps)
+        record[day + 1, :n_vars] = x
+        record[day + 1, n_vars:] = record[day, n_vars:] + \
+            to_counters.dot(np.array(acc))
+    profiling.count("KernelSimulator.steps", n_days * n_steps)
+
+    dates = [initial.date + datetime.timedelta(days=d)
+             for d in range(n_days + 1)]
+    outcomes = []
+    for j, rollout in enumerate(rollouts):
+        history = ArrayHistory(record[:, :, j], fields, dates)
+        susceptible = model._susceptible(
+            lambda name: history.column(name, model.ontology))
+        R = model._compute_reproduction_number(
+            susceptible, history.column("population", model.ontology))
+        history = ArrayHistory(np.column_stack([record[:, :, j], R]),
+                               fields + ["reproduction_number"], dates)
+        outcome = Outcome(history, initial.date, "", model.ontology)
+        outcome.name = rollout.name
+        outcomes.append(outcome)
+    return outcomes
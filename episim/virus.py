@@ -101,6 +101,18 @@ class SARSCoV2Th(Virus):
         immunity_duration = 4.5 * 30  # 3 to 6 months x days
         immunity_drop_rate = p_no_immunity + p_lose_immunity / immunity_duration
 
+        ## CLINICAL COURSE (only used by models detailing the infectious stage)
+        # Proportion of infections without symptoms  [6]
+        self._asymptomatic_ratio = 0.4
+        # Relative infectiousness of asymptomatic cases  [7]
+        self._asymptomatic_infectiousness = 0.75
+        # Infectious before the symptoms (see exposed_duration)  [2]
+        self._presymptomatic_duration = 3
+        # Infection fatality ratio ~0.6%  [8], concentrated on symptomatic
+        # cases: 0.006 / (1 - 0.4)
+        self._symptomatic_fatality_rate = 0.01
+        self._asymptomatic_fatality_rate = 0
+
 
         ## SOURCES
         # [1] https://fr.wikipedia.org/wiki/Maladie_%C3%A0_coronavirus_2019#Incubation 12/11/2020
@@ -108,6 +120,29 @@ class SARSCoV2Th(Virus):
         # [3] https://en.wikipedia.org/wiki/Transmission_of_COVID-19#Reproduction_number 12/11/2020
         # [4] Del Valle, S. Y., Hyman, J. M., Hethcote, H. W., & Eubank, S. G. (2007). Mixing patterns between age groups in social networks. Social Networks, 29(4), 539-554.
         # [5] https://www.youtube.com/watch?v=OAYZr1WbePk ~ 20min. (TODO lookup better source)
+        # [6] Oran, D. P., & Topol, E. J. (2020). Prevalence of asymptomatic SARS-CoV-2 infection: a narrative review. Annals of internal medicine, 173(5), 362-367.
+        # [7] https://www.cdc.gov/coronavirus/2019-ncov/hcp/planning-scenarios.html 10/09/2020
+        # [8] Meyerowitz-Katz, G., & Merone, L. (2020). A systematic review and meta-analysis of published research data on COVID-19 infection fatality rates. International Journal of Infectious Diseases, 101, 138-148.
 
         super().__init__(airborne_tr, droplet_tr, exposed_duration,
                          infectious_duration, immunity_drop_rate)
+
+    @property
+    def asymptomatic_ratio(self):
+        return self._asymptomatic_ratio
+
+    @property
+    def asymptomatic_infectiousness(self):
+        return self._asymptomatic_infectiousness
+
+    @property
+    def presymptomatic_duration(self):
+        return self._presymptomatic_duration
+
+    @property
+    def symptomatic_fatality_rate(self):
+        return self._symptomatic_fatality_rate
+
+    @property
+    def asymptomatic_fatality_rate(self):
+        return self._asymptomatic_fatality_rate
@@ -0,0 +1,100 @@
+import argparse, sys
+import datetime
+import time
+
+import numpy as np
+
+from episim.data import State
+from episim.emulator import ConfinementRuns, Emulator, QUANTITIES
+from episim.model import SEIRS, SIR
+from episim.parameters import PopulationBehavior
+from episim.profiling import profile
+from episim.virus import SARSCoV2Th
+
+
+def main(argv=sys.argv[1:]):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-N", "--population_size", default=int(7 * 1e6),
+                        type=int)
+    parser.add_argument("-I", "--n_infectious", default=20, type=int)
+    parser.add_argument("--n_days_total", default=243, type=int)
+    parser.add_argument("--confinement_effect", default=[.05, .6],
+                        type=float, nargs=2, help="Bounds")
+    parser.add_argument("--n_days_before_confinement", default=[10, 90],
+                        type=float, nargs=2, help="Bounds")
+    parser.add_argument("--n_days_confinement", default=[15, 120],
+                        type=float, nargs=2, help="Bounds")
+    parser.add_argument("-r", "--solver_resolution", default=0.1, type=float)
+    parser.add_argument("--factory", choices=["SIR", "SEIRS"],
+                        default="SEIRS")
+    parser.add_argument("--n_runs", default=1024, type=int,
+                        help="Number of training runs")
+    parser.add_argument("--n_test", default=500, type=int,
+                        help="Number of runs on which the accuracy is "
+                             "reported")
+    parser.add_argument("-q", "--query", default=[], type=float, nargs=3,
+                        action="append",
+                        metavar=("EFFECT", "N_DAYS_BEFORE", "N_DAYS"),
+                        help="Confinement to emulate (and simulate)")
+    parser.add_argument("--load", default=None,
+                        help="Emulator to load instead of training one")
+    parser.add_argument("--save", default=None,
+                        help="Path (.npz) where to save the emulator")
+    parser.add_argument("--seed", default=None, type=int)
+    parser.add_argument("--profile", action="store_true", default=False,
+                        help="Report timings and counters")
+
+    args = parser.parse_args(argv)
+    print(args)
+
+    N = args.population_size
+    I = args.n_infectious
+    state = State(datetime.date(2020, 1, 1), susceptible=N - I,
+                  infectious=I, n_infection=I)
+    model_cls = SIR if args.factory == "SIR" else SEIRS
+    model = model_cls.factory(state, SARSCoV2Th(), PopulationBehavior(),
+                              args.solver_resolution)
+    runs = ConfinementRuns(model, args.n_days_total)
+    bounds = {"confinement_effect": tuple(args.confinement_effect),
+              "n_days_before_confinement":
+                  tuple(args.n_days_before_confinement),
+              "n_days_confinement": tuple(args.n_days_confinement)}
+
+    random_state = np.random.RandomState(args.seed)
+    with profile(args.profile) as profiler:
+        with profiler.section("Training"):
+            if args.load is None:
+                emulator = Emulator.train(runs, bounds, args.n_runs,
+                                          random_state=random_state)
+            else:
+                emulator = Emulator.load(args.load)
+        if args.save is not None:
+            emulator.save(args.save)
+        for quantity, process in emulator.processes.items():
+            print("{:<12} {}".format(quantity, process))
+
+        with profiler.section("Accuracy"):
+            if args.n_test > 0:
+                print(emulator.accuracy(runs, args.n_test, random_state))
+
+        if len(args.query) > 0:
+            queries = np.array(args.query)
+            simulated = runs(dict(zip(emulator.names, queries.T)))
+            for i, query in enumerate(queries):
+                values = dict(zip(emulator.names, query))
+                print(", ".join("{} = {:g}".format(name, value)
+                                for name, value in values.items()))
+                for quantity in QUANTITIES:
+                    start = time.perf_counter()
+                    emulated = emulator.query(quantity, **values)
+                    elapsed = time.perf_counter() - start
+                    print("  {:<10} {:>14.1f} (model: {:>14.1f}) in {:.1f} us"
+                          "".format(quantity, emulated,
+                                    simulated[quantity][i], elapsed * 1e6))
+
+    if args.profile:
+        print(profiler.report())
+
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,15 @@
 import argparse, sys
-import datetime
-
-from episim.data import Outcome, State
-from episim.ontology import Ontology
-from episim.parameters import PopulationBehavior, Confine, \
-    TransmissionRateMultiplier
-from episim.plot.multi_outcome import ComparatorDashboard
-from episim.scenario import Scenario
+from functools import partial
+
+from episim.profiling import profile
+from episim.plot.batch import BatchRenderer, RenderJob, FORMATS
+from episim.plot.decimation import MinMaxDecimator, LTTBDecimator
+from episim.plot.multi_outcome import ComparatorDashboard, EnsembleDashboard
+from episim.scenario import NoIntervention, SanityMeasure, ConfinementSweep
 from episim.plot import FullDashboard
 from episim.model import SEIRS, SIR
-from episim.virus import SARSCoV2Th
+from episim.renewal import RenewalModel
+from episim.kernel import BACKENDS
 
 
 def main(argv=sys.argv[1:]):
@@ -19,8 +19,10 @@ def main(argv=sys.argv[1:]):
     parser.add_argument("-I", "--n_infectious", default=20, type=int)
     parser.add_argument("--n_days_total", default=243, type=int)
     parser.add_argument("--n_days_before_sanity_measures", default=30, type=int)
-    parser.add_argument("--n_days_before_confinement", default=30, type=int)
-    parser.add_argument("--n_days_confinement_duration", default=60, type=int)
+    parser.add_argument("--n_days_before_confinement", default=[30], type=int,
+                        nargs="+", help="Several values for a sweep")
+    parser.add_argument("--n_days_confinement_duration", default=[60],
+                        type=int, nargs="+", help="Several values for a sweep")
     parser.add_argument("--sanitary_measure_effect", default=.5, type=float,
                         help="Factor by which the transmission rate is "
                              "multiplied (0 < x < 1")
@@ -28,16 +30,37 @@ def main(argv=sys.argv[1:]):
                         help="Factor by which the number of average daily"
                              "contact is multiplied (0 < x < 1)")
     parser.add_argument("-r", "--solver_resolution", default=0.1, type=float)
-    parser.add_argument("--factory", choices=["SIR", "SEIRS"], default="SEIRS")
+    parser.add_argument("--factory", choices=["SIR", "SEIRS", "Renewal"],
+                        default="SEIRS")
+    parser.add_argument("--backend", choices=BACKENDS, default="numpy",
+                        help="Simulator backend (numba falls back to numpy "
+                             "if not installed)")
+    parser.add_argument("--profile", action="store_true", default=False,
+                        help="Report per-scenario timings and counters")
+    parser.add_argument("-o", "--output_dir", default=None,
+                        help="Render the dashboards to files in this "
+                             "directory instead of showing them")
+    parser.add_argument("--formats", nargs="+", choices=FORMATS,
+                        default=["png"])
+    parser.add_argument("--pdf", default=None,
+                        help="Render all the dashboards in this PDF file "
+                             "(one per page) instead of showing them")
+    parser.add_argument("-j", "--n_jobs", default=None, type=int,
+                        help="Number of processes for rendering to files")
+    parser.add_argument("--decimator", choices=["minmax", "lttb"],
+                        default=None,
+                        help="Decimation of the plotted series (default: "
+                             "none, min/max for the ensemble dashboard)")
 
 
     args = parser.parse_args(argv)
     print(args)
 
-    if args.factory == "SIR":
-        factory = SIR.factory
-    else:
-        factory = SEIRS.factory
+    model_cls = {"SIR": SIR, "SEIRS": SEIRS,
+                 "Renewal": RenewalModel}[args.factory]
+    factory = partial(model_cls.factory, backend=args.backend)
+    decimator = {None: None, "minmax": MinMaxDecimator(),
+                 "lttb": LTTBDecimator()}[args.decimator]
 
 
     N = args.population_size
@@ -50,168 +73,62 @@ def main(argv=sys.argv[1:]):
 
     nd_bc = args.n_days_before_confinement
     nd_cd = args.n_days_confinement_duration
-    nd_adc = T - nd_bc - nd_cd
-
 
-    outcomes = []
-    for scenario in NoIntervention(T, N, I, res), \
-                    SanityMeasure(args.sanitary_measure_effect,
-                                  nd_bs, nd_as, N, I, res), \
-                    Confinement(args.confinement_effect,
-                                nd_bc, nd_cd, nd_adc, N, I, res):
-        outcomes.append(scenario.run_model(factory))
 
-    ComparatorDashboard()(*outcomes).show()#.save("comparison.png")
-
-    for i, outcome in enumerate(outcomes):
-        FullDashboard()(outcome).show()#.save("dashboard_{}.png".format(i))
+    with profile(args.profile) as profiler:
+        outcomes = []
+        for scenario in NoIntervention(T, N, I, res), \
+                        SanityMeasure(args.sanitary_measure_effect,
+                                      nd_bs, nd_as, N, I, res):
+            with profiler.section(scenario.title):
+                outcomes.append(scenario.run_model(factory))
+
+        # All the confinement variants share the beginning of their run
+        scenario = ConfinementSweep(args.confinement_effect, nd_bc, nd_cd, T,
+                                    N, I, res)
+        with profiler.section(scenario.title):
+            outcomes.extend(scenario.run_models(factory))
+
+        # The comparator and the full dashboards show the first confinement
+        # variant, the ensemble dashboard all of them
+        compared = outcomes[:3]
+        sweep = outcomes[2:] if len(outcomes) > 3 else []
+        with profiler.section("Plotting"):
+            if args.output_dir is None and args.pdf is None:
+                ComparatorDashboard(decimator=decimator)(*compared).show()
+                if len(sweep) > 0:
+                    EnsembleDashboard(decimator=decimator)(*sweep).show()
+
+                for outcome in compared:
+                    FullDashboard(decimator=decimator)(outcome).show()
+            else:
+                jobs = [RenderJob(ComparatorDashboard, compared,
+                                  "comparison", decimator=decimator)]
+                if len(sweep) > 0:
+                    jobs.append(RenderJob(EnsembleDashboard, sweep,
+                                          "confinement_sweep",
+                                          decimator=decimator))
+                for i, outcome in enumerate(compared):
+                    jobs.append(RenderJob(FullDashboard, [outcome],
+                                          "dashboard_{}".format(i),
+                                          decimator=decimator))
+
+                renderer = BatchRenderer(args.output_dir or ".", args.formats,
+                                         args.n_jobs)
+                if args.output_dir is not None:
+                    renderer(jobs)
+                if args.pdf is not None:
+                    renderer.to_pdf(jobs, args.pdf)
+
+    if args.profile:
+        print(profiler.report())
 
 
     # ComparatorDashboard()(*outcomes[1:]).show()
 
 
-class BaseScenario(Scenario):
-    def __init__(self, population_size, n_infectious, resolution,
-                 virus=None, population=None, initial_date=None):
-        self.resolution = resolution
-        N = population_size
-        I = n_infectious
-        if initial_date is None:
-            initial_date = datetime.date(2020, 1, 1)
-        self.initial_state = State(initial_date, susceptible=N-I, infectious=I,
-                                   n_infection=I)
-        # self.initial_state = State(N-I, 0, I, 0, initial_date, n_infection=I)
-        if virus is None:
-            virus = SARSCoV2Th()
-        self.virus = virus
-        if population is None:
-            population = PopulationBehavior()
-        self.population = population
-
-    def get_model(self, factory, state=None, virus=None, population=None,
-                  resolution=None):
-        if state is None:
-            state = self.initial_state
-        if virus is None:
-            virus = self.virus
-        if population is None:
-            population = self.population
-        if resolution is None:
-            resolution = self.resolution
-        return factory(state, virus, population, resolution)
-
-
-    def starting_description(self, model):
-        ontology = Ontology.default_ontology()
-        state = ontology(self.initial_state)
-        descr_ls = [
-            "Number of infectious    {:d} / {:d}    total population size"
-            "".format(state.infectious,
-                      state.population),
-            "{}".format(self.virus),
-            "Pop.: {}".format(self.population),
-            "Model: {}".format(model)
-        ]
-        return self.multiline(descr_ls)
-
-
-
-class NoIntervention(BaseScenario):
-    def __init__(self, n_days, population_size, n_infectious, resolution):
-        super().__init__(population_size, n_infectious, resolution)
-        self.n_days = n_days
-
-    def run_model(self, model_factory):
-        model = self.get_model(model_factory)
-
-        outcome = Outcome.from_model(model, self.n_days,
-                                     self.starting_description(model))
-        outcome.name = "Do nothing"
-        return outcome
-
-
-class SanityMeasure(BaseScenario):
-    def __init__(self, measure_effect, n_days_before_measures,
-                 n_days_after_measures, population_size, n_infectious,
-                 resolution):
-        super().__init__(population_size, n_infectious, resolution)
-        self.n_days_1 = n_days_before_measures
-        self.n_days_2 = n_days_after_measures
-        self.measure_effect = measure_effect
-
-    def run_model(self, model_factory):
-        model = self.get_model(model_factory)
-        outcome = Outcome.from_model(model, self.n_days_1,
-                                     self.starting_description(model))
-
-
-        virus = TransmissionRateMultiplier(self.virus, 0.5)
-        model = self.get_model(model_factory, virus=virus, state=outcome.last_state)
-        descr_ls = [
-            "Sanity measures: dividing transmission rate by "
-            "{:.2f}".format(1./self.measure_effect),
-            "New model: {}".format(model)
-        ]
-
-        outcome = outcome.concat(
-            Outcome.from_model(model, self.n_days_2,
-                               self.multiline(descr_ls))
-        )
-
-        outcome.name = "Sanity measure (lower transmission rate)"
-        return outcome
-
-
-class Confinement(BaseScenario):
-    def __init__(self, confinement_effect, n_days_before_confinement,
-                 n_days_confinement, n_days_after_confinement,
-                 population_size, n_infectious, resolution):
-        super().__init__(population_size, n_infectious, resolution)
-        self.confinement_efficiency = 1 - confinement_effect
-        self.n_days_1 = n_days_before_confinement
-        self.n_days_2 = n_days_confinement
-        self.n_days_3 = n_days_after_confinement
-
-    def run_model(self, model_factory):
-        model = self.get_model(model_factory)
-
-        outcome = Outcome.from_model(model, self.n_days_1,
-                                     self.starting_description(model))
-
-        population = Confine(self.population, self.confinement_efficiency)
-
-        model = self.get_model(model_factory, state=outcome.last_state,
-                               population=population)
-
-        descr_ls = [
-            "Confinement: {}".format(population),
-            "New model: {}".format(model)
-        ]
-
-        outcome = outcome.concat(
-            Outcome.from_model(model, self.n_days_2,
-                               self.multiline(descr_ls))
-        )
-
-        model = self.get_model(model_factory, state=outcome.last_state)
-
-        descr_ls = [
-            "Deconfinement: {}".format(str(population)),
-            "New model: {}".format(model)
-        ]
-
-        outcome = outcome.concat(
-            Outcome.from_model(model, self.n_days_3,
-                               self.multiline(descr_ls))
-        )
-
-        outcome.name = "Confine/deconfine"
-        return outcome
-
-
 if __name__ == '__main__':
     main()
-    # TODO save in pdf
 
 
 
@@ -0,0 +1,124 @@
+import argparse, sys
+import datetime
+
+import numpy as np
+
+from episim.data import State
+from episim.healthcare import HealthcareLoad
+from episim.profiling import profile
+from episim.plot.batch import BatchRenderer, RenderJob, FORMATS
+from episim.plot.multi_outcome import ComparatorDashboard, EnsembleDashboard
+from episim.parameters import PopulationBehavior
+from episim.vaccination import Stratum, Rollout, Vaccine, vaccination_model, \
+    compare_rollouts
+from episim.virus import SARSCoV2Th
+
+
+# Age groups: share of the population, infection fatality ratio
+STRATA = [
+    Stratum("0-19", .23, .00003),
+    Stratum("20-49", .37, .0005),
+    Stratum("50-64", .19, .005),
+    Stratum("65-79", .14, .03),
+    Stratum("80+", .07, .1),
+]
+
+
+def main(argv=sys.argv[1:]):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-N", "--population_size", default=int(7 * 1e6),
+                        type=int)
+    parser.add_argument("-I", "--n_infectious", default=20, type=int)
+    parser.add_argument("--n_days_total", default=365, type=int)
+    parser.add_argument("--capacities", default=[10000, 30000, 50000, 70000,
+                                                 90000],
+                        type=float, nargs="+", help="Daily doses")
+    parser.add_argument("--ramp_up", default=[0, 30], type=int, nargs="+",
+                        help="Days to reach the capacity")
+    parser.add_argument("--starts", default=[30, 60, 90, 120, 150], type=int,
+                        nargs="+", help="First day of the vaccination")
+    parser.add_argument("--efficacy", default=.9, type=float)
+    parser.add_argument("--protection_duration", default=180, type=float)
+    parser.add_argument("--beds", default=None, type=float,
+                        help="Hospital beds (shown against the occupancy)")
+    parser.add_argument("--icu_beds", default=None, type=float,
+                        help="ICU beds (shown against the occupancy)")
+    parser.add_argument("-r", "--solver_resolution", default=0.1, type=float)
+    parser.add_argument("--profile", action="store_true", default=False,
+                        help="Report timings and counters")
+    parser.add_argument("-o", "--output_dir", default=None,
+                        help="Render the dashboards to files in this "
+                             "directory instead of showing them")
+    parser.add_argument("--formats", nargs="+", choices=FORMATS,
+                        default=["png"])
+    parser.add_argument("--pdf", default=None,
+                        help="Render all the dashboards in this PDF file "
+                             "(one per page) instead of showing them")
+
+    args = parser.parse_args(argv)
+    print(args)
+
+    N = args.population_size
+    I = args.n_infectious
+    start = datetime.date(2020, 1, 1)
+    state = State(start, susceptible=N - I, infectious=I, n_infection=I)
+
+    Vaccination = vaccination_model(STRATA)
+    vaccine = Vaccine(efficacy=args.efficacy,
+                      protection_duration=args.protection_duration)
+    model = Vaccination.factory(state, SARSCoV2Th(), PopulationBehavior(),
+                                args.solver_resolution, vaccine=vaccine)
+
+    names = [s.name for s in STRATA]
+    priorities = {
+        "uniform": (),
+        "oldest first": names[::-1],
+        "youngest first": names,
+        "active first": ["20-49", "50-64"],
+    }
+    rollouts = []
+    for capacity in args.capacities:
+        for ramp_up in args.ramp_up:
+            for day in args.starts:
+                for title, priority in priorities.items():
+                    schedule = np.minimum(np.arange(1, ramp_up + 2) /
+                                          (ramp_up + 1.), 1.) * capacity
+                    rollouts.append(Rollout(
+                        schedule, priority,
+                        start + datetime.timedelta(days=day),
+                        "{:.0f}/day ({:d}d ramp-up) from day {:d}, {}"
+                        "".format(capacity, ramp_up, day, title)))
+
+    with profile(args.profile) as profiler:
+        with profiler.section("{:d} rollouts".format(len(rollouts))):
+            outcomes = compare_rollouts(model, rollouts, args.n_days_total)
+
+        deaths = [outcome.column("deceased")[-1] for outcome in outcomes]
+        ranked = [outcomes[i] for i in np.argsort(deaths)]
+        for outcome in ranked:
+            print("{:>10.0f} deaths {:>12.0f} infections  {}".format(
+                outcome.column("deceased")[-1],
+                outcome.column("n_infection")[-1], outcome.name))
+
+        healthcare = HealthcareLoad(beds=args.beds, icu_beds=args.icu_beds)
+        with profiler.section("Plotting"):
+            if args.output_dir is None and args.pdf is None:
+                ComparatorDashboard(healthcare=healthcare)(*ranked[:3]).show()
+                EnsembleDashboard(healthcare=healthcare)(*outcomes).show()
+            else:
+                jobs = [RenderJob(ComparatorDashboard, ranked[:3],
+                                  "best_rollouts", healthcare=healthcare),
+                        RenderJob(EnsembleDashboard, outcomes, "rollouts",
+                                  healthcare=healthcare)]
+                renderer = BatchRenderer(args.output_dir or ".", args.formats)
+                if args.output_dir is not None:
+                    renderer(jobs)
+                if args.pdf is not None:
+                    renderer.to_pdf(jobs, args.pdf)
+
+    if args.profile:
+        print(profiler.report())
+
+
+if __name__ == '__main__':
+    main()